@@ -14,7 +14,7 @@ from soothsayer_utils import *
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2023.11.30"
+__version__ = "2026.10.18"
 
 # Reads archive
 def get_reads_cmd( input_filepaths, output_filepaths, output_directory, directories, opts):
@@ -40,6 +40,7 @@ def get_reads_cmd( input_filepaths, output_filepaths, output_directory, director
         "-f q=0.25",
         "-o {}".format(os.path.join(output_directory, "forward_reads.position-specific_statistics.tsv")),
         "--length_mode {}".format(opts.length_mode),
+        "--n_jobs {}".format(opts.n_jobs),
         "${FORWARD_READS}",
         "&&",
         "REVERSE_READS=$(tail -n +2 {} | cut -f3 )".format(opts.reads_table),
@@ -48,6 +49,7 @@ def get_reads_cmd( input_filepaths, output_filepaths, output_directory, director
         "-f q=0.25",
         "-o {}".format(os.path.join(output_directory, "reverse_reads.position-specific_statistics.tsv")),
         "--length_mode {}".format(opts.length_mode),
+        "--n_jobs {}".format(opts.n_jobs),
         "${REVERSE_READS}",
         
         ]
@@ -15,7 +15,7 @@ from soothsayer_utils.soothsayer_utils import assert_acceptable_arguments
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.11.15"
+__version__ = "2026.10.18"
 
 DIAMOND_HEADER_FIELDS = "qseqid sseqid stitle pident evalue bitscore qcovhsp scovhsp"
 
@@ -122,6 +122,13 @@ def get_pyhmmsearch_cmd( input_filepaths, output_filepaths, output_directory, di
         "-o {}".format(os.path.join(output_directory, "output.tsv.gz")),
 
     ]    
+    if opts.parquet:
+        cmd += [ 
+            "&&",
+        os.environ["convert_annotation_table_to_parquet.py"],
+        "-i {}".format(os.path.join(output_directory, "output.tsv.gz")),
+        "-o {}".format(os.path.join(output_directory, "output.parquet")),
+        ]
     return cmd
 
 # # KofamScan
@@ -170,6 +177,13 @@ def get_pykofamsearch_cmd( input_filepaths, output_filepaths, output_directory,
         "-o {}".format(os.path.join(output_directory, "output.tsv.gz")),
 
     ]    
+    if opts.parquet:
+        cmd += [ 
+            "&&",
+        os.environ["convert_annotation_table_to_parquet.py"],
+        "-i {}".format(os.path.join(output_directory, "output.tsv.gz")),
+        "-o {}".format(os.path.join(output_directory, "output.parquet")),
+        ]
     return cmd
 
 def get_merge_annotations_cmd( input_filepaths, output_filepaths, output_directory, directories, opts):
@@ -190,7 +204,12 @@ def get_merge_annotations_cmd( input_filepaths, output_filepaths, output_directo
         "--fasta {}".format(opts.proteins),
         "-o {}".format(output_directory),
         '--composite_name_joiner="{}"'.format(opts.composite_name_joiner),
+        "--n_jobs {}".format(opts.n_jobs),
     ]
+    if opts.parquet:
+        cmd += [ 
+            "--parquet",
+        ]
     if opts.identifier_mapping:
         cmd += [ 
             "-i {}".format(opts.identifier_mapping),
@@ -290,6 +309,7 @@ def add_executables_to_environment(opts):
                 # "module_completion_ratios.py",
                 "merge_annotations.py",
                 "compile_custom_humann_database_from_annotations.py",
+                "convert_annotation_table_to_parquet.py",
                 }
 
     required_executables={
@@ -578,6 +598,8 @@ def create_pipeline(opts, directories, f_cmds):
         os.path.join(opts.veba_database, "Annotate", "Pfam", "Pfam-A.hmm.gz"),
         ]
     output_filenames = ["output.tsv.gz"]
+    if opts.parquet:
+        output_filenames += ["output.parquet"]
     output_filepaths = list(map(lambda filename: os.path.join(output_directory, filename), output_filenames))
 
     params = {
@@ -620,6 +642,8 @@ def create_pipeline(opts, directories, f_cmds):
         os.path.join(opts.veba_database, "Annotate", "NCBIfam-AMRFinder", "NCBIfam-AMRFinder.hmm.gz"),
         ]
     output_filenames = ["output.tsv.gz"]
+    if opts.parquet:
+        output_filenames += ["output.parquet"]
     output_filepaths = list(map(lambda filename: os.path.join(output_directory, filename), output_filenames))
 
     params = {
@@ -662,6 +686,8 @@ def create_pipeline(opts, directories, f_cmds):
         os.path.join(opts.veba_database, "Contamination", "AntiFam", "AntiFam.hmm.gz"),
         ]
     output_filenames = ["output.tsv.gz"]
+    if opts.parquet:
+        output_filenames += ["output.parquet"]
     output_filepaths = list(map(lambda filename: os.path.join(output_directory, filename), output_filenames))
 
     params = {
@@ -702,6 +728,8 @@ def create_pipeline(opts, directories, f_cmds):
         os.path.join(opts.veba_database, "Annotate", "KOfam", "database.pkl.gz"),
         ]
     output_filenames = ["output.tsv.gz"]
+    if opts.parquet:
+        output_filenames += ["output.parquet"]
     output_filepaths = list(map(lambda filename: os.path.join(output_directory, filename), output_filenames))
 
     params = {
@@ -739,18 +767,21 @@ def create_pipeline(opts, directories, f_cmds):
     description = "Merging annotation results"
 
     # i/o
+    hmmsearch_filename = "output.parquet" if opts.parquet else "output.tsv.gz"
     input_filepaths = [
         os.path.join(directories[("intermediate",  "1__diamond-uniref")], "output.tsv.gz"),
         os.path.join(directories[("intermediate",  "2__diamond-mibig")], "output.tsv.gz"),
         os.path.join(directories[("intermediate",  "3__diamond-vfdb")], "output.tsv.gz"),
         os.path.join(directories[("intermediate",  "4__diamond-cazy")], "output.tsv.gz"),
-        os.path.join(directories[("intermediate",  "5__pyhmmsearch-pfam")], "output.tsv.gz"),
-        os.path.join(directories[("intermediate",  "6__pyhmmsearch-amr")], "output.tsv.gz"),
-        os.path.join(directories[("intermediate",  "7__pyhmmsearch-antifam")], "output.tsv.gz"),
-        os.path.join(directories[("intermediate",  "8__pykofamsearch")], "output.tsv.gz"),
+        os.path.join(directories[("intermediate",  "5__pyhmmsearch-pfam")], hmmsearch_filename),
+        os.path.join(directories[("intermediate",  "6__pyhmmsearch-amr")], hmmsearch_filename),
+        os.path.join(directories[("intermediate",  "7__pyhmmsearch-antifam")], hmmsearch_filename),
+        os.path.join(directories[("intermediate",  "8__pykofamsearch")], hmmsearch_filename),
         os.path.join(opts.veba_database, "Annotate", "Pfam", "Pfam-A.clans.tsv.gz"),
     ]
     output_filenames = ["annotations.proteins.tsv.gz"]
+    if opts.parquet:
+        output_filenames += ["annotations.proteins.parquet"]
 
     if opts.identifier_mapping:
         output_filenames += ["annotations.protein_clusters.tsv.gz"]
@@ -885,6 +916,7 @@ def main(args=None):
     parser_utility.add_argument("--random_state", type=int, default=0, help = "Random state [Default: 0]")
     parser_utility.add_argument("--restart_from_checkpoint", type=str, default=None, help = "Restart from a particular checkpoint [Default: None]")
     parser_utility.add_argument("--keep_temporary_directory", action="store_true",  help = "Keep temporary directory [Default is to remove]")
+    parser_utility.add_argument("--parquet", action="store_true",  help = "Also write PyHMMSearch/PyKofamSearch intermediates and annotations.proteins as parquet with list-typed columns (requires pyarrow).  The intermediates are converted from the tab-separated outputs so this adds a conversion step rather than removing list parsing.  Tab-separated outputs are still written.")
     parser_utility.add_argument("--no_check_protein_lengths", action="store_true",  help = "Do not check protein sequence lengths.  Not recommended.  Sequences must be < 100k or else PyHMMSearch will fail.")
     parser_utility.add_argument("-v", "--version", action='version', version="{} v{}".format(__program__, __version__))
 
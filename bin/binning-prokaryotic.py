@@ -13,7 +13,7 @@ from soothsayer_utils import *
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2025.2.1"
+__version__ = "2026.10.18"
 
 # Assembly
 def get_coverage_cmd( input_filepaths, output_filepaths, output_directory, directories, opts):
@@ -461,106 +461,40 @@ def get_tiara_cmd(input_filepaths, output_filepaths, output_directory, directori
 
 # barrnap
 def get_barrnap_cmd(input_filepaths, output_filepaths, output_directory, directories, opts):
+    # Genomes are run concurrently and genomes with existing non-empty rRNA fasta are skipped
     cmd = [
-        # "cat",
-        # input_filepaths[0],
-        # ">",
-        # os.path.join(directories["tmp"], "genomes_to_domain.tsv"),
-
-"""
-OUTPUT_DIRECTORY={}
-FP={} 
-for DOMAIN in $(cut -f2 $FP | sort -u); 
-do 
-    DOMAIN_ABBREVIATION=$(echo $DOMAIN | python -c 'import sys; print(sys.stdin.read().lower()[:3])')
-    
-    # Get MAGs for each domain (not all will have passed QC)
-    for ID in $(cat $FP | grep $DOMAIN | cut -f1)
-    do 
-        GENOME_FASTA=$(ls {}) || GENOME_FASTA=""
-        if [ -e "$GENOME_FASTA" ]; then
-            >$OUTPUT_DIRECTORY/$ID.rRNA
-            >$OUTPUT_DIRECTORY/$ID.rRNA.gff
-            {} --kingdom $DOMAIN_ABBREVIATION --threads {} --lencutoff {} --reject {} --evalue {} --outseq $OUTPUT_DIRECTORY/$ID.rRNA $GENOME_FASTA  | {} > $OUTPUT_DIRECTORY/$ID.rRNA.gff
-            #rm $GENOME_FASTA.fai
-        fi
-    done
-done
-""".format(
-        output_directory,
-        input_filepaths[0],
-        os.path.join(os.path.split(input_filepaths[1])[0],"$ID.fa"), # Is this inefficient?
-        os.environ["barrnap"],
-        opts.n_jobs,
-        opts.barrnap_length_cutoff, 
-        opts.barrnap_reject, 
-        opts.barrnap_evalue,
-        os.environ["append_geneid_to_barrnap_gff.py"],
-    ),
+        os.environ["rna_gene_detection_wrapper.py"],
+        "--program barrnap",
+        "--executable {}".format(os.environ["barrnap"]),
+        "--genomes {}".format(input_filepaths[0]),
+        "--genome_directory {}".format(os.path.split(input_filepaths[1])[0]),
+        "--output_directory {}".format(output_directory),
+        "--n_jobs {}".format(opts.n_jobs),
+        "--n_jobs_per_genome {}".format(opts.rna_n_jobs_per_genome),
+        "--options '--lencutoff {} --reject {} --evalue {}'".format(
+            opts.barrnap_length_cutoff, 
+            opts.barrnap_reject, 
+            opts.barrnap_evalue,
+        ),
+        "--barrnap_gff_formatter {}".format(os.environ["append_geneid_to_barrnap_gff.py"]),
     ]
     return cmd
 
 # tRNAscan-SE
-def get_trnascan_cmd(input_filepaths, output_filepaths, output_directory, directories, opts): # Should use GNU parallel
-
-
-            # os.environ["cmsearch"],
-            # "-o {}".format(os.path.join(output_directory, "{}.out".format(id_model))),
-            # "-A {}".format(os.path.join(output_directory, "{}.aln".format(id_model))),
-            # "--tblout {}".format(os.path.join(output_directory, "{}.tblout".format(id_model))),
-            # "--cpu {}".format(opts.n_jobs),
-            # "-g",
-            # "--notrunc",
-            # "--mid",
-            # opts.cmsearch_options,
-            # filepath,
-            # input_filepaths[0],
-
+def get_trnascan_cmd(input_filepaths, output_filepaths, output_directory, directories, opts):
+    # Genomes are run concurrently and genomes with existing non-empty tRNA fasta are skipped
     cmd = [
-        # "cat",
-        # input_filepaths[0],
-        # ">",
-        # os.path.join(directories["tmp"], "genomes_to_domain.tsv"),
-
-
-"""
-OUTPUT_DIRECTORY={}
-FP={} 
-for DOMAIN in $(cut -f2 $FP | sort -u); 
-do 
-    DOMAIN_ABBREVIATION=$(echo $DOMAIN | python -c 'import sys; print(sys.stdin.read().upper()[:1])')
-    
-    # Get MAGs for each domain (not all will have passed QC)
-    for ID in $(cat $FP | grep $DOMAIN | cut -f1)
-    do 
-        GENOME_FASTA=$(ls {}) || GENOME_FASTA=""
-        if [ -e "$GENOME_FASTA" ]; then
-            >$OUTPUT_DIRECTORY/$ID.tRNA
-            >$OUTPUT_DIRECTORY/$ID.tRNA.gff
-            >$OUTPUT_DIRECTORY/$ID.tRNA.struct
-            >$OUTPUT_DIRECTORY/$ID.tRNA.txt
-            
-            TRNA_FASTA=$OUTPUT_DIRECTORY/$ID.tRNA
-
-            if [[ -s "$TRNA_FASTA" ]]; 
-                then
-                    echo "[Skipping] [tRNAscan-SE] $GENOME_FASTA because tRNA fasta exists and is not empty"
-                else
-                    echo "[Running] [tRNAscan-SE] $GENOME_FASTA"
-                    {} -$DOMAIN_ABBREVIATION --forceow --progress --threads {} --fasta $OUTPUT_DIRECTORY/$ID.tRNA --gff $OUTPUT_DIRECTORY/$ID.tRNA.gff --struct $OUTPUT_DIRECTORY/$ID.tRNA.struct {} $GENOME_FASTA > $OUTPUT_DIRECTORY/$ID.tRNA.txt
-            fi    
-        fi  
-    done
-done
-""".format(
-        output_directory,
-        input_filepaths[0],
-        os.path.join(os.path.split(input_filepaths[1])[0],"$ID.fa"),
-        os.environ["tRNAscan-SE"],
-        opts.n_jobs,
-        opts.trnascan_options,
-    )
+        os.environ["rna_gene_detection_wrapper.py"],
+        "--program tRNAscan-SE",
+        "--executable {}".format(os.environ["tRNAscan-SE"]),
+        "--genomes {}".format(input_filepaths[0]),
+        "--genome_directory {}".format(os.path.split(input_filepaths[1])[0]),
+        "--output_directory {}".format(output_directory),
+        "--n_jobs {}".format(opts.n_jobs),
+        "--n_jobs_per_genome {}".format(opts.rna_n_jobs_per_genome),
     ]
+    if opts.trnascan_options:
+        cmd += ["--options '{}'".format(opts.trnascan_options)]
     return cmd
 
 
@@ -1540,6 +1474,7 @@ def add_executables_to_environment(opts):
                 "partition_gene_models.py",
                 "append_geneid_to_prodigal_gff.py",
                 "append_geneid_to_barrnap_gff.py",
+                "rna_gene_detection_wrapper.py",
                 "consensus_domain_classification.py",
                 "concatenate_dataframes.py",
                 "subset_table.py",
@@ -1693,6 +1628,9 @@ def main(args=None):
     # parser_evaluation.add_argument("--checkm2_options", type=str, default="", help="CheckM lineage_wf | More options (e.g. --arg 1 ) [Default: '']")
 
     # rRNA
+    parser_rna = parser.add_argument_group('RNA gene detection arguments')
+    parser_rna.add_argument("--rna_n_jobs_per_genome", type=int, default=1,  help="barrnap and tRNAscan-SE | Number of threads for each genome.  Genomes are run concurrently with --n_jobs // --rna_n_jobs_per_genome genomes at a time [Default: 1]")
+
     parser_barrnap = parser.add_argument_group('barrnap arguments')
     parser_barrnap.add_argument("--barrnap_length_cutoff", type=float, default=0.8,  help="barrnap | Proportional length threshold to label as partial [Default: 0.8]")
     parser_barrnap.add_argument("--barrnap_reject", type=float, default=0.25,  help="barrnap | Proportional length threshold to reject prediction [Default: 0.25]")
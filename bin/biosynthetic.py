@@ -13,23 +13,29 @@ from soothsayer_utils import *
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.3.5"
+__version__ = "2026.10.18"
 
 # antiSMASH
 def get_antismash_from_genomes_cmd( input_filepaths, output_filepaths, output_directory, directories, opts):
+    # Genomes are run concurrently with a fixed thread budget per antiSMASH job
+    n_jobs_per_genome = min(opts.antismash_n_jobs, opts.n_jobs)
+
     # Command
     cmd = [
 """
 OUTPUT_DIRECTORY=%s
 INTERMEDIATE_DIRECTORY=%s
 TMP=%s
+N_JOBS_PER_GENOME=%d
+N_GENOMES_PARALLEL=%d
 mkdir -p ${INTERMEDIATE_DIRECTORY}
-n=1
-while IFS= read -r LINE
-do read -r -a ARRAY <<< $LINE
-    ID=${ARRAY[0]}
-    GENOME=${ARRAY[1]}
-    GENE_MODELS=${ARRAY[2]}
+export OUTPUT_DIRECTORY INTERMEDIATE_DIRECTORY TMP N_JOBS_PER_GENOME
+
+# Run a single genome (called concurrently by xargs below)
+function run_antismash {
+    ID=$1
+    GENOME=$2
+    GENE_MODELS=$3
 
     CHECKPOINT="${INTERMEDIATE_DIRECTORY}/${ID}/ANTISMASH_CHECKPOINT"
 
@@ -43,11 +49,11 @@ do read -r -a ARRAY <<< $LINE
         START_TIME=${SECONDS}
 
         # Extract CDS records (or else antiSMASH will fail)
-        GENE_MODELS_CDS_ONLY=${TMP}/gene_models.cds.gff
+        GENE_MODELS_CDS_ONLY=${TMP}/${ID}.gene_models.cds.gff
         grep "CDS" ${GENE_MODELS} > ${GENE_MODELS_CDS_ONLY}
 
         # Run antiSMASH
-        %s --allow-long-headers --verbose --skip-zip-file -c %d --output-dir ${INTERMEDIATE_DIRECTORY}/${ID} --html-title ${ID} --taxon %s --minlength %d --databases %s --hmmdetection-strictness %s --logfile ${INTERMEDIATE_DIRECTORY}/${ID}/log.txt --genefinding-gff3 ${GENE_MODELS_CDS_ONLY} ${GENOME} || (echo "antiSMASH for ${ID} failed" && exit 1)
+        %s --allow-long-headers --verbose --skip-zip-file -c ${N_JOBS_PER_GENOME} --output-dir ${INTERMEDIATE_DIRECTORY}/${ID} --html-title ${ID} --taxon %s --minlength %d --databases %s --hmmdetection-strictness %s --logfile ${INTERMEDIATE_DIRECTORY}/${ID}/log.txt --genefinding-gff3 ${GENE_MODELS_CDS_ONLY} ${GENOME} || (echo "antiSMASH for ${ID} failed" && exit 1)
         rm ${GENE_MODELS_CDS_ONLY}
 
         # Genbanks to table
@@ -103,15 +109,26 @@ do read -r -a ARRAY <<< $LINE
 
         END_TIME=${SECONDS}
         RUN_TIME=$((END_TIME-START_TIME))
-        echo "*** n=${n} // ${ID} // Duration: ${RUN_TIME} seconds ***"
-
-        n=$(($n+1))
+        echo "*** ${ID} // Duration: ${RUN_TIME} seconds ***"
 
     else
         echo "[Skipping ${ID}] Found the following file: ${CHECKPOINT}"
-    fi  
+    fi
+}
+export -f run_antismash
 
-done < %s
+# Queue genomes from largest to smallest so the longest antiSMASH runs are not left until the end
+QUEUE=${TMP}/antismash_queue.tsv
+while IFS= read -r LINE
+do read -r -a ARRAY <<< $LINE
+    if [ -n "${ARRAY[0]}" ]; then
+        echo -e "$(stat -L -c %%s ${ARRAY[1]})\t${ARRAY[0]}\t${ARRAY[1]}\t${ARRAY[2]}"
+    fi
+done < %s | sort -t $'\t' -k1,1nr | cut -f2- > ${QUEUE}
+
+echo "[Running antiSMASH on $(wc -l < ${QUEUE}) genomes] ${N_GENOMES_PARALLEL} genome(s) in parallel with ${N_JOBS_PER_GENOME} thread(s) each"
+xargs -P ${N_GENOMES_PARALLEL} -L 1 bash -c 'run_antismash "$@"' _ < ${QUEUE}
+rm ${QUEUE}
 
 # Concatenate tables
 %s -a 0 -e ${INTERMEDIATE_DIRECTORY}/*/veba_formatted_output/identifier_mapping.components.tsv.gz | gzip > ${OUTPUT_DIRECTORY}/identifier_mapping.components.tsv.gz
@@ -130,9 +147,11 @@ done < %s
     output_directory,
     directories["tmp"],
 
+    n_jobs_per_genome,
+    max(1, opts.n_jobs // n_jobs_per_genome),
+
     # antiSMASH
     os.environ["antismash"],
-    opts.n_jobs,
     opts.taxon,
     opts.minimum_contig_length,
     opts.antismash_database,
@@ -1026,6 +1045,7 @@ def main(args=None):
     # antiSMASH
     parser_antismash = parser.add_argument_group('antiSMASH arguments')
     parser_antismash.add_argument("-t", "--taxon", type=str, default="bacteria", help="Taxonomic classification of input sequence {bacteria,fungi} [Default: bacteria]")
+    parser_antismash.add_argument("--antismash_n_jobs", type=int, default=4, help="antiSMASH | Number of threads per genome.  Genomes are run concurrently (largest first) with --n_jobs // --antismash_n_jobs antiSMASH jobs at a time [Default: 4]")
     parser_antismash.add_argument("--minimum_contig_length", type=int, default=1, help="Minimum contig length.  [Default: 1] ")
     parser_antismash.add_argument("-d", "--antismash_database", type=str, default=os.path.join(site.getsitepackages()[0], "antismash", "databases"), help="antiSMASH | Database directory path [Default: {}]".format(os.path.join(site.getsitepackages()[0], "antismash", "databases")))
     parser_antismash.add_argument("-s", "--hmmdetection_strictness", type=str, default="relaxed", help="antiSMASH | Defines which level of strictness to use for HMM-based cluster detection {strict,relaxed,loose}  [Default: relaxed] ")
@@ -1079,6 +1099,7 @@ def main(args=None):
         from multiprocessing import cpu_count 
         opts.n_jobs = cpu_count()
     assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1.  To select all available threads, use -1."
+    assert opts.antismash_n_jobs >= 1, "--antismash_n_jobs must be ≥ 1"
 
     # Database
     if opts.veba_database is None:
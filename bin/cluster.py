@@ -13,7 +13,7 @@ from soothsayer_utils import *
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.11.18"
+__version__ = "2026.10.18"
 
 # Global clustering
 def get_global_clustering_cmd( input_filepaths, output_filepaths, output_directory, directories, opts):
@@ -59,6 +59,7 @@ def get_global_clustering_cmd( input_filepaths, output_filepaths, output_directo
         "--protein_cluster_prefix_zfill {}".format(opts.protein_cluster_prefix_zfill) if bool(opts.protein_cluster_prefix_zfill) else "",
         "--mmseqs2_options {}".format(opts.mmseqs2_options) if bool(opts.mmseqs2_options) else "",
         "--diamond_options {}".format(opts.diamond_options) if bool(opts.diamond_options) else "",
+        "--proteins_per_thread {}".format(opts.proteins_per_thread),
         "--minimum_core_prevalence {}".format(opts.minimum_core_prevalence),
 
             "&&",
@@ -116,6 +117,7 @@ def get_local_clustering_cmd( input_filepaths, output_filepaths, output_director
         "--protein_cluster_prefix_zfill {}".format(opts.protein_cluster_prefix_zfill) if bool(opts.protein_cluster_prefix_zfill) else "",
         "--mmseqs2_options {}".format(opts.mmseqs2_options) if bool(opts.mmseqs2_options) else "",
         "--diamond_options {}".format(opts.diamond_options) if bool(opts.diamond_options) else "",
+        "--proteins_per_thread {}".format(opts.proteins_per_thread),
         "--minimum_core_prevalence {}".format(opts.minimum_core_prevalence),
 
             "&&",
@@ -391,6 +393,7 @@ def main(args=None):
     parser_protein_clustering.add_argument("--protein_cluster_prefix_zfill", type=int, default=0, help="Cluster prefix zfill. Use 7 to match identifiers from OrthoFinder.  Use 0 to add no zfill. [Default: 0]") #7
     parser_protein_clustering.add_argument("--mmseqs2_options", type=str, default="", help="MMSEQS2 | More options (e.g. --arg 1 ) [Default: '']")
     parser_protein_clustering.add_argument("--diamond_options", type=str, default="", help="Diamond | More options (e.g. --arg 1 ) [Default: '']")
+    parser_protein_clustering.add_argument("--proteins_per_thread", type=int, default=10000, help="Protein clustering jobs for each genome cluster run concurrently with a thread budget of ceil(number_of_proteins/proteins_per_thread) capped at --n_jobs.  Genome clusters with at least n_jobs * proteins_per_thread proteins use all threads.  Use 0 to run genome clusters one at a time with --n_jobs threads each [Default: 10000]")
 
     # Pangenome
     parser_pangenome = parser.add_argument_group('Pangenome arguments')
@@ -13,7 +13,7 @@ from soothsayer_utils import *
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.4.29"
+__version__ = "2026.10.18"
 
 # .............................................................................
 # Notes
@@ -127,7 +127,7 @@ def get_alignment_cmd(input_filepaths, output_filepaths, output_directory, direc
     # Command
     cmd = [
 
-# MAKE THIS A FOR LOOP WITH MAX THREADS FOR EACH ONE. THE REASON FOR THIS IS THAT IF THERE IS A SMALL SAMPLE IT WILL BE DONE QUICK BUT THE LARGER SAMPLES ARE GOING TO BE STUCK WITH ONE THREAD STILL
+# Bowtie2 runs on one sample at a time but sorting and indexing of each sample runs in the background while the next sample is aligned
 """
  # Clear temporary directory just in case
 rm -rf %s
@@ -135,6 +135,7 @@ rm -rf %s
 # Read lines
 READ_TABLE=%s
 
+PREVIOUS_PID=""
 while IFS= read -r LINE
 do echo $LINE
     # Split fields
@@ -146,16 +147,43 @@ do echo $LINE
     mkdir -p %s
 
     OUTPUT_BAM="%s"
+    ALIGNMENT_RETURNCODE="%s"
 
     # Bowtie2
     if [[ -e "$OUTPUT_BAM" && -s "$OUTPUT_BAM" ]]; then
         echo "[Skipping (Exists)] [Bowtie2] [$ID_SAMPLE]"
     else
         echo "[Running] [Bowtie2] [$ID_SAMPLE]"
-        %s -x %s -1 $R1 -2 $R2 --threads %d --seed %d --no-unal %s | %s sort --threads %d --reference %s -T %s > $OUTPUT_BAM && %s index -@ %d $OUTPUT_BAM
+        rm -f $ALIGNMENT_RETURNCODE
+        ( ( %s -x %s -1 $R1 -2 $R2 --threads %d --seed %d --no-unal %s; echo $? > $ALIGNMENT_RETURNCODE ) | %s sort --threads %d --reference %s -T %s > $OUTPUT_BAM && %s index -@ %d $OUTPUT_BAM ) < /dev/null &
+        CURRENT_PID=$!
+
+        # Wait for the alignment to finish before starting the next sample
+        while [[ ! -s $ALIGNMENT_RETURNCODE ]]; do
+            if ! kill -0 $CURRENT_PID 2> /dev/null; then break; fi
+            sleep 1
+        done
+        if [[ $(cat $ALIGNMENT_RETURNCODE 2> /dev/null) != "0" ]]; then
+            echo "[Failed] [Bowtie2] [$ID_SAMPLE]"
+            wait
+            rm -f $OUTPUT_BAM
+            exit 1
+        fi
+
+        # Sorting of the previous sample has been running during this alignment
+        if [[ -n "$PREVIOUS_PID" ]]; then
+            wait $PREVIOUS_PID || { echo "[Failed] [samtools sort/index] [$PREVIOUS_SAMPLE]"; rm -f $PREVIOUS_BAM; exit 1; }
+        fi
+        PREVIOUS_PID=$CURRENT_PID
+        PREVIOUS_SAMPLE=$ID_SAMPLE
+        PREVIOUS_BAM=$OUTPUT_BAM
     fi
 done < $READ_TABLE
 
+if [[ -n "$PREVIOUS_PID" ]]; then
+    wait $PREVIOUS_PID || { echo "[Failed] [samtools sort/index] [$PREVIOUS_SAMPLE]"; rm -f $PREVIOUS_BAM; exit 1; }
+fi
+
 """%( 
     # Clear temporary directory just in case
     os.path.join(directories["tmp"], "*"),
@@ -169,6 +197,8 @@ done < $READ_TABLE
     # Output BAM
     os.path.join(output_directory, "${ID_SAMPLE}", "mapped.sorted.bam"),
 
+    # Alignment return code
+    os.path.join(directories["tmp"], "bowtie2_${ID_SAMPLE}.returncode"),
 
     # Bowtie2
     os.environ["bowtie2"],
@@ -493,6 +523,11 @@ def configure_parameters(opts, directories):
     df = pd.read_csv(opts.reads, sep="\t", header=None)
     n, m = df.shape
     assert m == 3, "--reads must be a 3 column table seperated by tabs and no header. Currently there are {} columns".format(m)
+
+    # Memory-mapped index
+    if not opts.no_memory_mapped_index and "--mm" not in opts.bowtie2_options.split():
+        opts.bowtie2_options = "--mm {}".format(opts.bowtie2_options).strip()
+
     # Set environment variables
     add_executables_to_environment(opts=opts)
 
@@ -517,7 +552,7 @@ def main(args=None):
     # Utility
     parser_utility = parser.add_argument_group('Utility arguments')
     parser_utility.add_argument("--path_config", type=str,  default="CONDA_PREFIX", help="path/to/config.tsv [Default: CONDA_PREFIX]")  #site-packges in future
-    parser_utility.add_argument("-p", "--n_jobs", type=int, default=1, help = "Number of threads [Default: 1]")
+    parser_utility.add_argument("-p", "--n_jobs", type=int, default=1, help = "Number of threads.  Sorting and indexing of each sample (--n_jobs threads) runs while the next sample is aligned (--n_jobs threads)\nso up to 2 × --n_jobs threads are in use while they overlap [Default: 1]")
     parser_utility.add_argument("--random_state", type=int, default=0, help = "Random state [Default: 0]")
     parser_utility.add_argument("--restart_from_checkpoint", type=str, default=None, help = "Restart from a particular checkpoint [Default: None]")
     parser_utility.add_argument("-v", "--version", action='version', version="{} v{}".format(__program__, __version__))
@@ -534,6 +569,7 @@ def main(args=None):
     parser_aligner.add_argument("--bowtie2_index_options", type=str, default="", help="bowtie2-build | More options (e.g. --arg 1 ) [Default: '']")
     parser_aligner.add_argument("--one_task_per_cpu", action="store_true", help="Use GNU parallel to run GNU parallel with 1 task per CPU.  Useful if all samples are roughly the same size but inefficient if depth varies.")
     parser_aligner.add_argument("--bowtie2_options", type=str, default="", help="bowtie2 | More options (e.g. --arg 1 ) [Default: '']")
+    parser_aligner.add_argument("--no_memory_mapped_index", action="store_true", help="bowtie2 | Do not use a memory-mapped index (--mm) which keeps the index in the page cache between samples and shares it across concurrent Bowtie2 processes")
 
     # featureCounts
     parser_featurecounts = parser.add_argument_group('featureCounts arguments')
@@ -7,7 +7,7 @@ from genopype import __version__ as genopype_version
 from soothsayer_utils import *
 
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2023.12.12"
+__version__ = "2026.10.18"
 
 # ==============
 # Agostic commands
@@ -25,19 +25,7 @@ def get_concatenate_fasta_cmd( input_filepaths, output_filepaths, output_directo
         "-x {}".format("fa.gz" if opts.reference_gzipped else "fa"),
         "-b reference",
         "-M {}".format(opts.mode),
-
-        "&&",
-
-        "cat",
-        os.path.join(output_directory, "reference.fa.gz" if opts.reference_gzipped else "reference.fa"),
-        "|",
-        os.environ["seqkit"],
-        "fx2tab",
-        "-i",
-        "-s",
-        "-n",
-        ">",
-        os.path.join(output_directory, "reference.id_to_hash.tsv"),
+        "-p {}".format(opts.n_jobs),
     ]
     return cmd
 
@@ -62,24 +50,24 @@ def get_concatenate_gff_cmd( input_filepaths, output_filepaths, output_directory
 def get_bowtie2_local_cmd(input_filepaths, output_filepaths, output_directory, directories, opts):
     os.environ["TMPDIR"] = directories["tmp"]
     # Command 
-
     cmd = [
-"""
-OUTPUT_DIRECTORY=%s
-FASTA_FILENAME=%s
-for ID_SAMPLE in $(cut -f1 %s); 
-    do %s --threads %d --seed %d ${OUTPUT_DIRECTORY}/${ID_SAMPLE}/${FASTA_FILENAME} ${OUTPUT_DIRECTORY}/${ID_SAMPLE}/${FASTA_FILENAME}
-    done
-"""%(
-    output_directory,
-    "reference.fa.gz" if opts.reference_gzipped else "reference.fa",
-    opts.references,
-    os.environ["bowtie2-build"],
-    opts.n_jobs,
-    opts.random_state,
-    ),
+        os.environ["bowtie2_build_wrapper.py"],
+        "--samples {}".format(opts.references),
+        "--reference_directory {}".format(output_directory),
+        "--reference_filename {}".format("reference.fa.gz" if opts.reference_gzipped else "reference.fa"),
+        "--n_jobs {}".format(opts.n_jobs),
+        "--n_jobs_per_sample {}".format(opts.bowtie2_n_jobs_per_sample),
+        "--executable {}".format(os.environ["bowtie2-build"]),
+        "--random_state {}".format(opts.random_state),
     ]
-
+    if opts.bowtie2_build_options:
+        cmd += [ 
+            "--options='{}'".format(opts.bowtie2_build_options),
+        ]
+    if opts.overwrite_indexes:
+        cmd += [ 
+            "--overwrite",
+        ]
 
     return cmd
 
@@ -438,12 +426,12 @@ def add_executables_to_environment(opts):
     accessory_scripts = set([ 
         "concatenate_fasta.py",
         "concatenate_gff.py",
+        "bowtie2_build_wrapper.py",
         # "fasta_to_saf.py",
     ])
 
     
     required_executables = set([ 
-        "seqkit",
         "bowtie2-build",
     ])| accessory_scripts
 
@@ -553,6 +541,8 @@ def main(args=None):
     # Utility
     parser_bowtie2 = parser.add_argument_group('Bowtie2 Index arguments')
     parser_bowtie2.add_argument("--bowtie2_build_options", type=str, default="", help="bowtie2-build | More options (e.g. --arg 1 ) [Default: '']")
+    parser_bowtie2.add_argument("--bowtie2_n_jobs_per_sample", type=int, default=4, help="bowtie2-build | Local mode: Number of threads for each sample index.  Samples are indexed concurrently with --n_jobs // --bowtie2_n_jobs_per_sample samples at a time [Default: 4]")
+    parser_bowtie2.add_argument("--overwrite_indexes", action="store_true", help="bowtie2-build | Local mode: Rebuild every sample index.  By default, samples are skipped if their reference hash (and bowtie2-build options) have not changed since the last build\nso new samples can be added to a project with --restart_from_checkpoint 1")
 
     # parser_star = parser.add_argument_group('STAR arguments')
     # parser_star.add_argument("--read_length", type=int, default=151, help = "Read length [Default: 151]")
@@ -568,6 +558,7 @@ def main(args=None):
         from multiprocessing import cpu_count 
         opts.n_jobs = cpu_count()
     assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1.  To select all available threads, use -1."
+    assert opts.bowtie2_n_jobs_per_sample >= 1, "--bowtie2_n_jobs_per_sample must be ≥ 1"
 
     # Directories
     directories = dict()
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 from __future__ import print_function, division
-import sys, os, argparse, glob
+import sys, os, argparse, glob, copy
 from collections import OrderedDict, defaultdict
 
 import pandas as pd
@@ -13,7 +13,7 @@ from soothsayer_utils import *
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.8.29"
+__version__ = "2026.10.18"
 
 
 # Bowtie2
@@ -32,6 +32,9 @@ def get_bowtie2_cmd(input_filepaths, output_filepaths, output_directory, directo
     
     # Command
     cmd = [
+    # TMPDIR is set for each command because counting of the previous sample runs in the same process in batch mode
+    "export TMPDIR={}".format(directories["tmp"]),
+    "&&",
     # Clear temporary directory just in case
     "rm -rf {}".format(os.path.join(directories["tmp"], "*")),
     "&&",
@@ -83,32 +86,36 @@ def get_bowtie2_cmd(input_filepaths, output_filepaths, output_directory, directo
         opts.n_jobs,
         output_filepaths[0],
         ")",
-
-        # Calculate coverage
-        "&&",
-        "(",
-        os.environ["samtools"],
-        "coverage",
-        output_filepaths[0],
-        "|",
-        "gzip",
-        ">",
-        "{}.coverage.tsv.gz".format(output_filepaths[0]),
-        ")",
     ]
 
-    if opts.scaffolds_to_bins:
-        cmd += [ 
+    # Coverage is calculated in the same pass as the counts with --counting_engine single_pass
+    if opts.counting_engine == "featurecounts":
+        cmd += [
+            # Calculate coverage
             "&&",
             "(",
-            os.environ["genome_spatial_coverage.py"],
-            "-i {}".format(opts.scaffolds_to_bins),
-            "-f {}".format(opts.reference_fasta),
-            "-o {}".format(os.path.join(output_directory, "genome_spatial_coverage.tsv.gz")),
+            os.environ["samtools"],
+            "coverage",
+            output_filepaths[0],
+            "|",
+            "gzip",
+            ">",
             "{}.coverage.tsv.gz".format(output_filepaths[0]),
             ")",
         ]
 
+        if opts.scaffolds_to_bins:
+            cmd += [ 
+                "&&",
+                "(",
+                os.environ["genome_spatial_coverage.py"],
+                "-i {}".format(opts.scaffolds_to_bins),
+                "-f {}".format(opts.reference_fasta),
+                "-o {}".format(os.path.join(output_directory, "genome_spatial_coverage.tsv.gz")),
+                "{}.coverage.tsv.gz".format(output_filepaths[0]),
+                ")",
+            ]
+
     cmd += [ 
         "&&",
         "gzip {}".format(os.path.join(output_directory, "metrics.txt")),
@@ -124,6 +131,8 @@ def get_featurecounts_cmd(input_filepaths, output_filepaths, output_directory, d
 
     # ORF-Level Counts
     cmd = [
+    "export TMPDIR={}".format(directories["tmp"]),
+    "&&",
     "mkdir -p {}".format(os.path.join(directories["tmp"], "featurecounts")),
     "&&",
     "(",
@@ -187,6 +196,52 @@ def get_featurecounts_cmd(input_filepaths, output_filepaths, output_directory, d
         "rm -rf {}".format(os.path.join(output_directory, "featurecounts.*.tsv")),
         ]
 
+    cmd += get_groupby_cmd(output_directory, opts)
+
+    return cmd
+
+# Single-pass counting
+def get_single_pass_counts_cmd(input_filepaths, output_filepaths, output_directory, directories, opts):
+
+    # Command
+
+    # ORF-Level Counts, Scaffold-Level Counts, and Coverage from a single pass through the BAM
+    cmd = [
+    "export TMPDIR={}".format(directories["tmp"]),
+    "&&",
+    "(",
+        os.environ["bam_to_counts.py"],
+        "-b {}".format(input_filepaths[0]),
+        "-a {}".format(opts.reference_gff),
+        "-s {}".format(opts.reference_saf),
+        "-g {}".format(opts.attribute_type),
+        "-t {}".format(opts.feature_type),
+        "-p {}".format(opts.n_jobs),
+        "--orf_counts {}".format(os.path.join(output_directory, "counts.orfs.tsv.gz")),
+        "--scaffold_counts {}".format(os.path.join(output_directory, "counts.scaffolds.tsv.gz")),
+        "--coverage {}".format(os.path.join(output_directory, "mapped.sorted.bam.coverage.tsv.gz")),
+    ")",
+    ]
+
+    if opts.scaffolds_to_bins:
+        cmd += [ 
+            "&&",
+            "(",
+            os.environ["genome_spatial_coverage.py"],
+            "-i {}".format(opts.scaffolds_to_bins),
+            "-f {}".format(opts.reference_fasta),
+            "-o {}".format(os.path.join(output_directory, "genome_spatial_coverage.tsv.gz")),
+            os.path.join(output_directory, "mapped.sorted.bam.coverage.tsv.gz"),
+            ")",
+        ]
+
+    cmd += get_groupby_cmd(output_directory, opts)
+
+    return cmd
+
+# Groupby
+def get_groupby_cmd(output_directory, opts):
+    cmd = list()
     if opts.proteins_to_orthogroups:
         cmd += [ 
             "&&",
@@ -236,14 +291,16 @@ def add_executables_to_environment(opts):
     Adapted from Soothsayer: https://github.com/jolespin/soothsayer
     """
 
-    accessory_scripts = {"groupby_table.py", "genome_spatial_coverage.py"}
+    accessory_scripts = {"groupby_table.py", "genome_spatial_coverage.py", "bam_to_counts.py"}
 
     required_executables={
                 "bowtie2",
-                "featureCounts",
                 "samtools",
      } | accessory_scripts
 
+    if opts.counting_engine == "featurecounts":
+        required_executables.add("featureCounts")
+
     if opts.path_config == "CONDA_PREFIX":
         executables = dict()
         for name in required_executables:
@@ -297,9 +354,11 @@ def create_pipeline(opts, directories, f_cmds):
     # i/o
     input_filepaths = [opts.forward_reads, opts.reverse_reads]
 
-    output_filenames = ["mapped.sorted.bam", "mapped.sorted.bam.bai", "mapped.sorted.bam.coverage.tsv.gz"]
-    if opts.scaffolds_to_bins:
-        output_filenames += ["genome_spatial_coverage.tsv.gz"]
+    output_filenames = ["mapped.sorted.bam", "mapped.sorted.bam.bai"]
+    if opts.counting_engine == "featurecounts":
+        output_filenames += ["mapped.sorted.bam.coverage.tsv.gz"]
+        if opts.scaffolds_to_bins:
+            output_filenames += ["genome_spatial_coverage.tsv.gz"]
     output_filepaths = list(map(lambda filename: os.path.join(output_directory, filename), output_filenames))
 
     params = {
@@ -328,8 +387,9 @@ def create_pipeline(opts, directories, f_cmds):
     step = 2
 
     # Info
-    program = "featurecounts"
-    program_label = "{}__{}".format(step, program)
+    program = {"single_pass":"bam_to_counts", "featurecounts":"featurecounts"}[opts.counting_engine]
+    # Both counting engines write to 2__featurecounts so existing projects can be restarted
+    program_label = "{}__{}".format(step, "featurecounts")
     description = "Counting reads"
 
     # Add to directories
@@ -339,6 +399,10 @@ def create_pipeline(opts, directories, f_cmds):
     input_filepaths = output_filepaths
 
     output_filenames = ["counts.orfs.tsv.gz", "counts.scaffolds.tsv.gz"]
+    if opts.counting_engine == "single_pass":
+        output_filenames.append("mapped.sorted.bam.coverage.tsv.gz")
+        if opts.scaffolds_to_bins:
+            output_filenames.append("genome_spatial_coverage.tsv.gz")
     if opts.proteins_to_orthogroups:
         output_filenames.append("counts.orthogroups.tsv.gz")
     if opts.scaffolds_to_bins:
@@ -355,7 +419,10 @@ def create_pipeline(opts, directories, f_cmds):
         "directories":directories,
     }
 
-    cmd = get_featurecounts_cmd(**params)
+    if opts.counting_engine == "single_pass":
+        cmd = get_single_pass_counts_cmd(**params)
+    if opts.counting_engine == "featurecounts":
+        cmd = get_featurecounts_cmd(**params)
     pipeline.add_step(
                 id=program,
                 description = description,
@@ -380,11 +447,14 @@ def create_pipeline(opts, directories, f_cmds):
     # Add to directories
     output_directory = directories["output"]
 
+    # Coverage tables are written by the counting step with --counting_engine single_pass
+    coverage_directory = directories[("intermediate", "2__featurecounts")] if opts.counting_engine == "single_pass" else directories[("intermediate", "1__bowtie2")]
+
     # i/o
     input_filepaths = [
         os.path.join(directories[("intermediate", "1__bowtie2")], "mapped.sorted.bam"),
         os.path.join(directories[("intermediate", "1__bowtie2")], "mapped.sorted.bam.bai"),
-        os.path.join(directories[("intermediate", "1__bowtie2")], "mapped.sorted.bam.coverage.tsv.gz"),
+        os.path.join(coverage_directory, "mapped.sorted.bam.coverage.tsv.gz"),
     ]
     if opts.retain_unmapped_reads:
          input_filepaths += [
@@ -404,7 +474,7 @@ def create_pipeline(opts, directories, f_cmds):
     if opts.scaffolds_to_bins:
         input_filepaths += [ 
              
-            os.path.join(directories[("intermediate", "1__bowtie2")], "genome_spatial_coverage.tsv.gz"),
+            os.path.join(coverage_directory, "genome_spatial_coverage.tsv.gz"),
             os.path.join(directories[("intermediate", "2__featurecounts")], "counts.mags.tsv.gz"),
         ]   
 
@@ -471,9 +541,82 @@ def configure_parameters(opts, directories):
     if opts.scaffolds_to_clusters is not None:
         assert os.path.exists(opts.scaffolds_to_clusters)
 
+    if opts.counting_engine == "single_pass":
+        assert not opts.featurecounts_options, "--featurecounts_options requires --counting_engine featurecounts"
+        assert not opts.retain_featurecounts, "--retain_featurecounts requires --counting_engine featurecounts"
+
     # Set environment variables
     add_executables_to_environment(opts=opts)
 
+# Samples
+def read_samples(filepath):
+    """
+    Read [id_sample]<tab>[path/to/reads_1.fastq]<tab>[path/to/reads_2.fastq] (No header)
+    """
+    samples = OrderedDict()
+    with open(filepath, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                fields = line.split("\t")
+                assert len(fields) == 3, "--samples must be a 3 column table separated by tabs and no header: {}".format(line)
+                id_sample, forward_reads, reverse_reads = fields
+                assert id_sample not in samples, "--samples has duplicate sample identifiers: {}".format(id_sample)
+                samples[id_sample] = (forward_reads, reverse_reads)
+    assert samples, "--samples is empty: {}".format(filepath)
+    return samples
+
+def get_sample_directories(project_directory, name):
+    directories = dict()
+    directories["sample"] = create_directory(os.path.join(project_directory, name))
+    directories["output"] = create_directory(os.path.join(directories["sample"], "output"))
+    directories["log"] = create_directory(os.path.join(directories["sample"], "log"))
+    directories["tmp"] = create_directory(os.path.join(directories["sample"], "tmp"))
+    directories["checkpoints"] = create_directory(os.path.join(directories["sample"], "checkpoints"))
+    directories["intermediate"] = create_directory(os.path.join(directories["sample"], "intermediate"))
+    return directories
+
+def run_batch(opts, samples, directories, f_cmds):
+    """
+    Run the pipeline for each sample where counting (steps 2-3) of sample N runs in the background while sample N+1 is aligned (step 1)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def get_restart_from_checkpoint(steps):
+        if opts.restart_from_checkpoint in steps:
+            return opts.restart_from_checkpoint
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = None
+        for i, (id_sample, (forward_reads, reverse_reads)) in enumerate(samples.items(), start=1):
+            print(format_header("[{}/{}] Sample: {}".format(i, len(samples), id_sample), "-"), file=sys.stdout)
+
+            opts_sample = copy.copy(opts)
+            opts_sample.name = id_sample
+            opts_sample.forward_reads = forward_reads
+            opts_sample.reverse_reads = reverse_reads
+
+            directories_sample = dict(directories)
+            directories_sample.update(get_sample_directories(directories["project"], id_sample))
+
+            pipeline = create_pipeline(
+                         opts=opts_sample,
+                         directories=directories_sample,
+                         f_cmds=f_cmds,
+            )
+            pipeline.compile()
+
+            # Alignment
+            pipeline.execute(steps=[1], restart_from_checkpoint=get_restart_from_checkpoint([1]))
+
+            # Counting the previous sample has been running during this alignment
+            if future is not None:
+                future.result()
+            future = executor.submit(pipeline.execute, steps=[2,3], restart_from_checkpoint=get_restart_from_checkpoint([2,3]))
+
+        if future is not None:
+            future.result()
+
 def main(args=None):
     # Path info
     script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
@@ -481,16 +624,17 @@ def main(args=None):
     # Path info
     description = """
     Running: {} v{} via Python v{} | {}""".format(__program__, __version__, sys.version.split(" ")[0], sys.executable)
-    usage = "{} -1 <reads_1.fq> -2 <reads_2.fq> -n <name> -o <output_directory> -x <reference_directory>"    .format(__program__)
+    usage = "{} -1 <reads_1.fq> -2 <reads_2.fq> -n <name> -o <output_directory> -x <reference_directory> | -i <samples.tsv> -o <output_directory> -x <reference_directory>"    .format(__program__)
     epilog = "Copyright 2022 Josh L. Espinoza (jespinoz@jcvi.org)"
 
     # Parser
     parser = argparse.ArgumentParser(description=description, usage=usage, epilog=epilog, formatter_class=argparse.RawTextHelpFormatter)
     # Pipeline
     parser_io = parser.add_argument_group('Required I/O arguments')
-    parser_io.add_argument("-1","--forward_reads", type=str, help = "path/to/reads_1.fastq", required=True)
-    parser_io.add_argument("-2","--reverse_reads", type=str, help = "path/to/reads_2.fastq", required=True)
-    parser_io.add_argument("-n", "--name", type=str, help="Name of sample", required=True)
+    parser_io.add_argument("-1","--forward_reads", type=str, help = "path/to/reads_1.fastq [Required unless --samples]")
+    parser_io.add_argument("-2","--reverse_reads", type=str, help = "path/to/reads_2.fastq [Required unless --samples]")
+    parser_io.add_argument("-n", "--name", type=str, help="Name of sample [Required unless --samples]")
+    parser_io.add_argument("-i", "--samples", type=str, help="Batch mode | path/to/samples.tsv with [id_sample]<tab>[path/to/reads_1.fastq]<tab>[path/to/reads_2.fastq], No header.\nSamples are written to [project_directory]/[id_sample]/ as in single sample mode.  Bowtie2 uses a memory-mapped index (--mm)\nand counting of each sample runs while the next sample is aligned.  Cannot be used with -1/-2/-n")
     parser_io.add_argument("-o","--project_directory", type=str, default="veba_output/mapping", help = "path/to/project_directory [Default: veba_output/mapping]")
 
     parser_reference = parser.add_argument_group('Reference arguments')
@@ -506,24 +650,26 @@ def main(args=None):
     # Utility
     parser_utility = parser.add_argument_group('Utility arguments')
     parser_utility.add_argument("--path_config", type=str,  default="CONDA_PREFIX", help="path/to/config.tsv. Must have at least 2 columns [name, executable] [Default: CONDA_PREFIX]")  #site-packges in future
-    parser_utility.add_argument("-p", "--n_jobs", type=int, default=1, help = "Number of threads [Default: 1]")
+    parser_utility.add_argument("-p", "--n_jobs", type=int, default=1, help = "Number of threads.  In batch mode (--samples), counting of each sample (--n_jobs threads) runs while the next sample is aligned (--n_jobs threads)\nso up to 2 × --n_jobs threads are in use while they overlap [Default: 1]")
     parser_utility.add_argument("--random_state", type=int, default=0, help = "Random state [Default: 0]")
     parser_utility.add_argument("--restart_from_checkpoint", type=int, help = "Restart from a particular checkpoint")
     parser_utility.add_argument("-v", "--version", action='version', version="{} v{}".format(__program__, __version__))
 
     # Bowtie2
     parser_bowtie2 = parser.add_argument_group('Bowtie2 arguments')
+    parser_bowtie2.add_argument("--no_memory_mapped_index", action="store_true", help = "Batch mode | Do not use a memory-mapped index (--mm) which keeps the index in the page cache between samples and shares it with other Bowtie2 processes")
     parser_bowtie2.add_argument("--retain_unmapped_reads", default=1, type=int, help = "Retain reads that do not map to reference. 0=No, 1=yes [Default: 1]") 
     parser_bowtie2.add_argument("--bowtie2_options", type=str, default="", help="Bowtie2 | More options (e.g. --arg 1 ) [Default: '']\nhttp://bowtie-bio.sourceforge.net/bowtie2/manual.shtml")
 
     # featureCounts
     #! NOT SURE HOW THIS WILL WORK WITH PRODIGAL AND METAEUK. WILL PROBABLY NEED TO POST PROCESS METAEUK
     parser_featurecounts = parser.add_argument_group('featureCounts arguments')
+    parser_featurecounts.add_argument("--counting_engine", type=str, choices={"single_pass", "featurecounts"}, default="featurecounts", help = "Counting engine.  `featurecounts` runs featureCounts for ORFs and scaffolds and samtools coverage separately.\n`single_pass` reads the BAM once for ORF counts, scaffold counts, and coverage (featureCounts -p --countReadPairs and samtools coverage defaults) [Default: featurecounts]")
     parser_featurecounts.add_argument("-g", "--attribute_type", type=str, default="gene_id", help = "Attribute type in GTF/GFF file. [Default: gene_id]")
     parser_featurecounts.add_argument("-t", "--feature_type", type=str, default="CDS", help = "Feature type in GTF/GFF file. [Default: CDS]")
-    parser_featurecounts.add_argument("--retain_featurecounts", default=0, type=int, help = "Retain feature counts output table (a slimmer version is output regardless). 0=No, 1=yes [Default: 0]") 
+    parser_featurecounts.add_argument("--retain_featurecounts", default=0, type=int, help = "Retain feature counts output table (a slimmer version is output regardless).  Requires --counting_engine featurecounts. 0=No, 1=yes [Default: 0]") 
     # parser_featurecounts.add_argument("--long_reads", action="store_true", help="featureCounts | Use this if long reads are being used")
-    parser_featurecounts.add_argument("--featurecounts_options", type=str, default="", help="featureCounts | More options (e.g. --arg 1 ) [Default: ''] | http://bioinf.wehi.edu.au/featureCounts/")
+    parser_featurecounts.add_argument("--featurecounts_options", type=str, default="", help="featureCounts | More options (e.g. --arg 1 ).  Requires --counting_engine featurecounts [Default: ''] | http://bioinf.wehi.edu.au/featureCounts/")
 
     parser_identifiers = parser.add_argument_group('Identifier arguments')
     parser_identifiers.add_argument("--proteins_to_orthogroups", type=str, help = "path/to/protein_to_orthogroup.tsv, [id_orf]<tab>[id_orthogroup], No header")
@@ -541,17 +687,21 @@ def main(args=None):
         opts.n_jobs = cpu_count()
     assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1.  To select all available threads, use -1."
 
+    # Batch mode
+    if opts.samples:
+        assert not any([opts.forward_reads, opts.reverse_reads, opts.name]), "Cannot use -1/-2/-n with --samples"
+        samples = read_samples(opts.samples)
+        if not opts.no_memory_mapped_index and "--mm" not in opts.bowtie2_options.split():
+            opts.bowtie2_options = "--mm {}".format(opts.bowtie2_options).strip()
+    else:
+        assert all([opts.forward_reads, opts.reverse_reads, opts.name]), "Please provide -1/-2/-n for a single sample or -i/--samples for batch mode"
+
     # Directories
     directories = dict()
     directories["project"] = create_directory(opts.project_directory)
-    directories["sample"] = create_directory(os.path.join(directories["project"], opts.name))
-    directories["output"] = create_directory(os.path.join(directories["sample"], "output"))
-    directories["log"] = create_directory(os.path.join(directories["sample"], "log"))
-    directories["tmp"] = create_directory(os.path.join(directories["sample"], "tmp"))
-    directories["checkpoints"] = create_directory(os.path.join(directories["sample"], "checkpoints"))
-    directories["intermediate"] = create_directory(os.path.join(directories["sample"], "intermediate"))
-    os.environ["TMPDIR"] = directories["tmp"]
-
+    if not opts.samples:
+        directories.update(get_sample_directories(directories["project"], opts.name))
+        os.environ["TMPDIR"] = directories["tmp"]
 
     # Info
     print(format_header(__program__, "="), file=sys.stdout)
@@ -571,13 +721,16 @@ def main(args=None):
 
     # Run pipeline
     with open(os.path.join(directories["project"], "commands.sh"), "w") as f_cmds:
-        pipeline = create_pipeline(
-                     opts=opts,
-                     directories=directories,
-                     f_cmds=f_cmds,
-        )
-        pipeline.compile()
-        pipeline.execute(restart_from_checkpoint=opts.restart_from_checkpoint)
+        if not opts.samples:
+            pipeline = create_pipeline(
+                         opts=opts,
+                         directories=directories,
+                         f_cmds=f_cmds,
+            )
+            pipeline.compile()
+            pipeline.execute(restart_from_checkpoint=opts.restart_from_checkpoint)
+        else:
+            run_batch(opts, samples, directories, f_cmds)
 
 if __name__ == "__main__":
     main()
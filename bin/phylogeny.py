@@ -14,7 +14,7 @@ from soothsayer_utils import *
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.11.7"
+__version__ = "2026.10.18"
 
 MARKER_SEPERATOR="|--|"
 
@@ -97,47 +97,34 @@ def get_pyhmmsearch_cmd( input_filepaths, output_filepaths, output_directory, di
 # MUSCLE
 def get_msa_cmd( input_filepaths, output_filepaths, output_directory, directories, opts):
     # Command
-
+    # Each marker is trimmed with ClipKIT as soon as its MUSCLE alignment finishes and large markers are given more threads
     cmd = [
-"""
-# MUSCLE
-cut -f1 %s | %s -j %d 'echo "[MUSCLE] {}" && %s -%s %s/{}.faa -output %s/{}.msa %s -threads 1'
-
-# ClipKIT
-cut -f1 %s | %s -j %d 'echo "[ClipKIT] {}"  &&  %s %s/{}.msa -m %s -o %s/{}.msa.clipkit %s'
-
-# Concatenate
-%s -i %s -x msa.clipkit -o %s/concatenated_alignment.fasta --minimum_genomes_aligned_ratio %f  --minimum_markers_aligned_ratio %f --prefiltered_alignment_table %s --boolean_alignment_table %s
-"""%( 
-    # MUSCLE
-    os.path.join(directories[("intermediate",  "1__pyhmmsearch")], "markers.tsv"),
-    os.environ["parallel"],
-    opts.n_jobs,
-    os.environ["muscle"],
-    opts.alignment_algorithm,
-    directories[("intermediate",  "1__pyhmmsearch")],
-    output_directory,
-    opts.muscle_options,
-
-    # ClipKIT
-    os.path.join(directories[("intermediate",  "1__pyhmmsearch")], "markers.tsv"),
-    os.environ["parallel"],
-    opts.n_jobs,
-    os.environ["clipkit"],
-    output_directory,
-    opts.clipkit_mode,
-    output_directory,
-    opts.clipkit_options,
-
-    # Concatenate
-    os.environ["merge_msa.py"],
-    output_directory,
-    output_directory,
-    opts.minimum_genomes_aligned_ratio,
-    opts.minimum_markers_aligned_ratio,
-    os.path.join(output_directory, "prefiltered_alignment_table.tsv.gz"),
-    os.path.join(output_directory, "alignment_table.boolean.tsv.gz"),
-    )
+        os.environ["msa_wrapper.py"],
+        "-i {}".format(input_filepaths[0]),
+        "-a {}".format(directories[("intermediate",  "1__pyhmmsearch")]),
+        "-o {}".format(output_directory),
+        "-p {}".format(opts.n_jobs),
+        "--muscle_executable {}".format(os.environ["muscle"]),
+        "-A {}".format(opts.alignment_algorithm),
+        "--clipkit_executable {}".format(os.environ["clipkit"]),
+        "--clipkit_mode {}".format(opts.clipkit_mode),
+    ]
+    if opts.muscle_options:
+        cmd += ["--muscle_options='{}'".format(opts.muscle_options)]
+    if opts.clipkit_options:
+        cmd += ["--clipkit_options='{}'".format(opts.clipkit_options)]
+
+    cmd += [ 
+        "&&",
+        os.environ["merge_msa.py"],
+        "-i {}".format(output_directory),
+        "-x msa.clipkit",
+        "-o {}".format(os.path.join(output_directory, "concatenated_alignment.fasta")),
+        "--minimum_genomes_aligned_ratio {}".format(opts.minimum_genomes_aligned_ratio),
+        "--minimum_markers_aligned_ratio {}".format(opts.minimum_markers_aligned_ratio),
+        "--prefiltered_alignment_table {}".format(os.path.join(output_directory, "prefiltered_alignment_table.tsv.gz")),
+        "--boolean_alignment_table {}".format(os.path.join(output_directory, "alignment_table.boolean.tsv.gz")),
+        "--partition {}".format(os.path.join(output_directory, "concatenated_alignment.partitions.txt")),
     ]
 
     return cmd
@@ -227,6 +214,7 @@ def add_executables_to_environment(opts):
     """
     accessory_scripts = set([ 
         "partition_pyhmmsearch.py",
+        "msa_wrapper.py",
         "merge_msa.py",
     ])
 
@@ -236,7 +224,6 @@ def add_executables_to_environment(opts):
                 "pyhmmsearch",
                 "muscle",
                 "clipkit",
-                "parallel",
                 opts.tree_algorithm,
                 "iqtree",
                 "ete3",
@@ -383,7 +370,7 @@ def create_pipeline(opts, directories, f_cmds):
     input_filepaths = [
         os.path.join(directories[("intermediate", "1__pyhmmsearch")], "markers.tsv"),
         ]
-    output_filenames = ["concatenated_alignment.fasta",  "prefiltered_alignment_table.tsv.gz", "alignment_table.boolean.tsv.gz"]
+    output_filenames = ["concatenated_alignment.fasta",  "prefiltered_alignment_table.tsv.gz", "alignment_table.boolean.tsv.gz", "concatenated_alignment.partitions.txt"]
     output_filepaths = list(map(lambda filename: os.path.join(output_directory, filename), output_filenames))
 
     params = {
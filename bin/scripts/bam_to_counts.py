@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys, os, argparse, gzip, time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict
+import numpy as np
+
+__program__ = os.path.split(sys.argv[0])[-1]
+__version__ = "2026.10.18"
+
+# CIGAR operations
+BAM_CMATCH, BAM_CINS, BAM_CDEL, BAM_CREF_SKIP, BAM_CSOFT_CLIP, BAM_CHARD_CLIP, BAM_CPAD, BAM_CEQUAL, BAM_CDIFF = range(9)
+REFERENCE_CONSUMING_OPERATIONS = {BAM_CMATCH, BAM_CDEL, BAM_CEQUAL, BAM_CDIFF}
+ALIGNED_OPERATIONS = {BAM_CMATCH, BAM_CEQUAL, BAM_CDIFF}
+
+# SAM flags
+FLAG_PAIRED = 0x1
+FLAG_UNMAPPED = 0x4
+FLAG_MATE_UNMAPPED = 0x8
+FLAG_SECONDARY = 0x100
+FLAG_QCFAIL = 0x200
+FLAG_DUPLICATE = 0x400
+FLAG_SUPPLEMENTARY = 0x800
+
+# samtools coverage default filters: UNMAP,SECONDARY,QCFAIL,DUP
+COVERAGE_EXCLUDE_FLAGS = FLAG_UNMAPPED | FLAG_SECONDARY | FLAG_QCFAIL | FLAG_DUPLICATE
+
+def parse_attribute(attributes:str, attribute_type:str):
+    """
+    Get an attribute value from GTF (key "value";) or GFF3 (key=value;) formatted attributes
+    """
+    for field in attributes.strip().split(";"):
+        field = field.strip()
+        if field.startswith(attribute_type + "="):
+            return field[len(attribute_type) + 1:]
+        if field.startswith(attribute_type + " "):
+            return field[len(attribute_type) + 1:].strip().strip('"')
+    return None
+
+def read_features(filepath:str, annotation_format:str, attribute_type:str="gene_id", feature_type:str="CDS"):
+    """
+    Read features from GTF/GFF or SAF.  Coordinates are 1-based and inclusive.
+
+    Returns:
+        meta_features: List of meta-feature identifiers in order of first appearance in the annotation (same as featureCounts)
+        contig_to_features: {id_contig:(starts, ends, meta_feature_indices, maximum_feature_length)} sorted by start
+    """
+    meta_feature_to_index = OrderedDict()
+    contig_to_intervals = defaultdict(list)
+
+    f = gzip.open(filepath, "rt") if filepath.endswith(".gz") else open(filepath, "r")
+    with f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            if annotation_format == "GTF":
+                if len(fields) < 9 or fields[2] != feature_type:
+                    continue
+                id_meta_feature = parse_attribute(fields[8], attribute_type)
+                assert id_meta_feature is not None, "Feature is missing attribute `{}`: {}".format(attribute_type, line)
+                id_contig, start, end = fields[0], int(fields[3]), int(fields[4])
+            if annotation_format == "SAF":
+                if fields[0] == "GeneID":
+                    continue
+                id_meta_feature, id_contig, start, end = fields[0], fields[1], int(fields[2]), int(fields[3])
+            if id_meta_feature not in meta_feature_to_index:
+                meta_feature_to_index[id_meta_feature] = len(meta_feature_to_index)
+            contig_to_intervals[id_contig].append((start, end, meta_feature_to_index[id_meta_feature]))
+
+    contig_to_features = dict()
+    for id_contig, intervals in contig_to_intervals.items():
+        intervals = sorted(intervals)
+        starts = [start for start, end, i in intervals]
+        ends = [end for start, end, i in intervals]
+        indices = [i for start, end, i in intervals]
+        maximum_length = max(end - start + 1 for start, end, i in intervals)
+        contig_to_features[id_contig] = (starts, ends, indices, maximum_length)
+
+    return list(meta_feature_to_index), contig_to_features
+
+def get_overlapping_meta_features(features:tuple, sections:list):
+    """
+    Get the meta-feature indices that overlap any of the read sections (1-based, inclusive) by at least 1 bp
+    """
+    starts, ends, indices, maximum_length = features
+    overlapping = set()
+    for section_start, section_end in sections:
+        i_start = bisect_left(starts, section_start - maximum_length + 1)
+        i_end = bisect_right(starts, section_end)
+        for i in range(i_start, i_end):
+            if ends[i] >= section_start:
+                overlapping.add(indices[i])
+    return overlapping
+
+def get_sections(reference_start:int, cigartuples:list):
+    """
+    Split an alignment into reference sections (1-based, inclusive) at skipped regions (N) like featureCounts
+    """
+    sections = list()
+    position = reference_start
+    section_start = position
+    for operation, length in cigartuples:
+        if operation == BAM_CREF_SKIP:
+            if position > section_start:
+                sections.append((section_start + 1, position))
+            position += length
+            section_start = position
+        elif operation in REFERENCE_CONSUMING_OPERATIONS:
+            position += length
+    if position > section_start:
+        sections.append((section_start + 1, position))
+    return sections
+
+def write_counts(filepath:str, meta_features:list, counts:np.ndarray):
+    f = gzip.open(filepath, "wt") if filepath.endswith(".gz") else open(filepath, "w")
+    with f:
+        for id_meta_feature, count in zip(meta_features, counts):
+            print(id_meta_feature, count, sep="\t", file=f)
+
+def format_float(x:float, precision:int=6):
+    # Same as printf("%.6g") and printf("%.3g") used by samtools coverage
+    return "{:.{}g}".format(x, precision)
+
+def get_aligned_blocks(reference_start:int, cigartuples:list):
+    """
+    Aligned (M/=/X) blocks as (query_start, query_end, reference_start, reference_end) in 0-based half-open coordinates
+    """
+    blocks = list()
+    query_position = 0
+    reference_position = reference_start
+    for operation, length in cigartuples:
+        if operation in ALIGNED_OPERATIONS:
+            blocks.append((query_position, query_position + length, reference_position, reference_position + length))
+            query_position += length
+            reference_position += length
+        elif operation == BAM_CINS or operation == BAM_CSOFT_CLIP:
+            query_position += length
+        elif operation == BAM_CDEL or operation == BAM_CREF_SKIP:
+            reference_position += length
+    return blocks
+
+def get_coverage_row(id_contig:str, length:int, depth_difference:np.ndarray=None, number_of_reads:int=0, sum_base_quality:int=0, number_of_bases:int=0, sum_mapping_quality:int=0):
+    """
+    Row of the `samtools coverage` table for a contig where depth is the cumulative sum of the difference array (+1 at block starts, -1 at block ends)
+    """
+    if number_of_reads > 0:
+        depth = np.cumsum(depth_difference[:length])
+        covered_bases = int(np.count_nonzero(depth))
+        mean_depth = depth.sum()/length
+    else:
+        covered_bases = 0
+        mean_depth = 0.0
+    return [
+        id_contig,
+        1,
+        length,
+        number_of_reads,
+        covered_bases,
+        format_float(100*covered_bases/length),
+        format_float(mean_depth),
+        format_float(sum_base_quality/number_of_bases if number_of_bases else 0, 3),
+        format_float(sum_mapping_quality/number_of_reads if number_of_reads else 0, 3),
+    ]
+
+def count_bam(bam_filepath:str, annotations:dict, coverage_filepath:str=None, n_jobs:int=1):
+    """
+    Read a coordinate sorted BAM file once, count fragments for each annotation (featureCounts -p --countReadPairs defaults), and
+    optionally write the `samtools coverage` table (default filters: UNMAP,SECONDARY,QCFAIL,DUP).
+
+    Fragment assignment follows featureCounts defaults:
+        * Secondary and supplementary alignments are not counted
+        * A fragment is assigned if the union of features overlapped (≥ 1 bp) by its mapped mates has exactly 1 meta-feature
+        * Fragments overlapping more than 1 meta-feature are ambiguous and not counted
+        * Fragments with only 1 mapped mate are counted
+    """
+    import pysam
+
+    names = list(annotations)
+    counts = {name:np.zeros(len(annotations[name][0]), dtype=np.int64) for name in names}
+    pending_mates = {name:dict() for name in names}
+    number_of_alignments = 0
+
+    f_coverage = None
+    if coverage_filepath:
+        f_coverage = gzip.open(coverage_filepath, "wt") if coverage_filepath.endswith(".gz") else open(coverage_filepath, "w")
+        print("#rname", "startpos", "endpos", "numreads", "covbases", "coverage", "meandepth", "meanbaseq", "meanmapq", sep="\t", file=f_coverage)
+
+    with pysam.AlignmentFile(bam_filepath, "rb", threads=n_jobs) as f_bam:
+        references = f_bam.references
+        lengths = f_bam.lengths
+
+        # Coverage for the current contig: [depth_difference, number_of_reads, sum_base_quality, number_of_bases, sum_mapping_quality]
+        current_reference_id = -1
+        coverage = None
+        covered_reference_ids = set()
+
+        def write_coverage():
+            if coverage is not None and coverage[1] > 0:
+                print(*get_coverage_row(references[current_reference_id], lengths[current_reference_id], *coverage), sep="\t", file=f_coverage)
+                covered_reference_ids.add(current_reference_id)
+
+        for read in f_bam.fetch(until_eof=True):
+            flag = read.flag
+            if flag & FLAG_UNMAPPED:
+                continue
+            reference_id = read.reference_id
+            cigartuples = read.cigartuples
+
+            # samtools coverage
+            if f_coverage is not None:
+                if reference_id != current_reference_id:
+                    assert reference_id > current_reference_id, "BAM must be sorted by coordinate: {}".format(bam_filepath)
+                    write_coverage()
+                    current_reference_id = reference_id
+                    length = lengths[reference_id]
+                    coverage = [np.zeros(length + 1, dtype=np.int32), 0, 0, 0, 0]
+                if not (flag & COVERAGE_EXCLUDE_FLAGS):
+                    depth_difference = coverage[0]
+                    coverage[1] += 1
+                    coverage[4] += read.mapping_quality
+                    qualities = read.query_qualities
+                    for query_start, query_end, block_start, block_end in get_aligned_blocks(read.reference_start, cigartuples):
+                        # Blocks that run past the end of the contig are clipped
+                        depth_difference[min(block_start, length)] += 1
+                        depth_difference[min(block_end, length)] -= 1
+                        coverage[3] += query_end - query_start
+                        if qualities is not None:
+                            coverage[2] += sum(qualities[query_start:query_end])
+
+            # featureCounts
+            if not names or flag & (FLAG_SECONDARY | FLAG_SUPPLEMENTARY):
+                continue
+            number_of_alignments += 1
+            id_contig = read.reference_name
+            sections = get_sections(read.reference_start, cigartuples)
+            paired = (flag & FLAG_PAIRED) and not (flag & FLAG_MATE_UNMAPPED)
+            for name in names:
+                features = annotations[name][1].get(id_contig)
+                overlapping = get_overlapping_meta_features(features, sections) if features is not None else set()
+                if paired:
+                    # Hold the first mate until the second mate is observed
+                    mate_overlapping = pending_mates[name].pop(read.query_name, None)
+                    if mate_overlapping is None:
+                        pending_mates[name][read.query_name] = overlapping
+                        continue
+                    overlapping |= mate_overlapping
+                if len(overlapping) == 1:
+                    counts[name][next(iter(overlapping))] += 1
+
+        # Like samtools coverage, references without any reads are listed last in header order
+        if f_coverage is not None:
+            write_coverage()
+            for i, (id_contig, length) in enumerate(zip(references, lengths)):
+                if i not in covered_reference_ids:
+                    print(*get_coverage_row(id_contig, length), sep="\t", file=f_coverage)
+            f_coverage.close()
+
+    # Mates that were never observed (e.g., mate is unmapped but flag was not set) are counted as single-end fragments
+    for name in names:
+        for overlapping in pending_mates[name].values():
+            if len(overlapping) == 1:
+                counts[name][next(iter(overlapping))] += 1
+
+    return counts, number_of_alignments
+
+def main(args=None):
+    # Path info
+    script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
+    script_filename = __program__
+    # Path info
+    description = """
+    Running: {} v{} via Python v{} | {}""".format(__program__, __version__, sys.version.split(" ")[0], sys.executable)
+    usage = "{} -b <mapped.sorted.bam> -a <reference.gff> -s <reference.saf> --orf_counts <counts.orfs.tsv.gz> --scaffold_counts <counts.scaffolds.tsv.gz> --coverage <mapped.sorted.bam.coverage.tsv.gz>".format(__program__)
+    epilog = "Copyright 2021 Josh L. Espinoza (jespinoz@jcvi.org)"
+
+    # Parser
+    parser = argparse.ArgumentParser(description=description, usage=usage, epilog=epilog, formatter_class=argparse.RawTextHelpFormatter)
+    # Pipeline
+    parser_io = parser.add_argument_group('Required I/O arguments')
+    parser_io.add_argument("-b","--bam", type=str, required=True, help = "path/to/mapped.sorted.bam (sorted by coordinate)")
+    parser_io.add_argument("-a","--reference_gff", type=str, help = "path/to/reference.gff")
+    parser_io.add_argument("-s","--reference_saf", type=str, help = "path/to/reference.saf")
+    parser_io.add_argument("--orf_counts", type=str, help = "path/to/counts.orfs.tsv[.gz] with [id_orf]<tab>[count] (No header).  Requires --reference_gff")
+    parser_io.add_argument("--scaffold_counts", type=str, help = "path/to/counts.scaffolds.tsv[.gz] with [id_scaffold]<tab>[count] (No header).  Requires --reference_saf")
+    parser_io.add_argument("--coverage", type=str, help = "path/to/coverage.tsv[.gz] in the same format as `samtools coverage`")
+
+    parser_utility = parser.add_argument_group('Utility arguments')
+    parser_utility.add_argument("-p","--n_jobs", type=int, default=1, help = "Number of threads for BAM decompression [Default: 1]")
+
+    parser_annotation = parser.add_argument_group('Annotation arguments')
+    parser_annotation.add_argument("-g", "--attribute_type", type=str, default="gene_id", help = "Attribute type in GTF/GFF file. [Default: gene_id]")
+    parser_annotation.add_argument("-t", "--feature_type", type=str, default="CDS", help = "Feature type in GTF/GFF file. [Default: CDS]")
+
+    # Options
+    opts = parser.parse_args()
+    opts.script_directory  = script_directory
+    opts.script_filename = script_filename
+
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1"
+    if opts.orf_counts:
+        assert opts.reference_gff, "--orf_counts requires --reference_gff"
+    if opts.scaffold_counts:
+        assert opts.reference_saf, "--scaffold_counts requires --reference_saf"
+    assert any([opts.orf_counts, opts.scaffold_counts, opts.coverage]), "Please provide at least one of the following: --orf_counts, --scaffold_counts, --coverage"
+
+    # Annotations
+    annotations = OrderedDict()
+    output_filepaths = OrderedDict()
+    if opts.orf_counts:
+        print(" * Reading features from {}".format(opts.reference_gff), file=sys.stderr)
+        annotations["orfs"] = read_features(opts.reference_gff, "GTF", attribute_type=opts.attribute_type, feature_type=opts.feature_type)
+        output_filepaths["orfs"] = opts.orf_counts
+    if opts.scaffold_counts:
+        print(" * Reading features from {}".format(opts.reference_saf), file=sys.stderr)
+        annotations["scaffolds"] = read_features(opts.reference_saf, "SAF")
+        output_filepaths["scaffolds"] = opts.scaffold_counts
+
+    # Count
+    start_time = time.time()
+    print(" * Counting fragments in {}".format(opts.bam), file=sys.stderr)
+    counts, number_of_alignments = count_bam(opts.bam, annotations, coverage_filepath=opts.coverage, n_jobs=opts.n_jobs)
+    print(" * Processed {} primary alignments in {} seconds".format(number_of_alignments, int(time.time() - start_time)), file=sys.stderr)
+
+    # Write
+    for name, filepath in output_filepaths.items():
+        meta_features = annotations[name][0]
+        print(" * Writing {} counts for {} features ({} assigned fragments) to {}".format(name, len(meta_features), int(counts[name].sum()), filepath), file=sys.stderr)
+        write_counts(filepath, meta_features, counts[name])
+    if opts.coverage:
+        print(" * Wrote coverage to {}".format(opts.coverage), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys, os, argparse, time, subprocess, hashlib, gzip
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing import cpu_count
+
+__program__ = os.path.split(sys.argv[0])[-1]
+__version__ = "2026.10.18"
+
+# bowtie2-build index files (.bt2l for large indexes)
+INDEX_SUFFIXES = ["1", "2", "3", "4", "rev.1", "rev.2"]
+
+def read_samples(filepath:str):
+    """
+    Read unique sample identifiers from the first column of [id_sample]<tab>[path/to/reference.fa] (No header)
+    """
+    samples = OrderedDict()
+    with open(filepath, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                samples[line.split("\t")[0]] = None
+    return list(samples)
+
+def get_reference_hash(filepath:str, opts, buffer_size:int=16777216):
+    """
+    MD5 of the uncompressed reference sequences and the bowtie2-build options used to index them.
+    Gzipped references are hashed after decompression because the gzip header changes each time the file is written.
+    """
+    hasher = hashlib.md5()
+    if filepath.endswith(".gz"):
+        f = gzip.open(filepath, "rb")
+    else:
+        f = open(filepath, "rb")
+    for chunk in iter(lambda: f.read(buffer_size), b""):
+        hasher.update(chunk)
+    f.close()
+    hasher.update("\t".join(["--seed {}".format(opts.random_state), opts.options]).encode())
+    return hasher.hexdigest()
+
+def index_exists(filepath:str):
+    for extension in ["bt2", "bt2l"]:
+        if all(os.path.exists("{}.{}.{}".format(filepath, suffix, extension)) for suffix in INDEX_SUFFIXES):
+            return True
+    return False
+
+def run_sample(id_sample:str, reference_filepath:str, reference_hash:str, opts):
+    """
+    Run bowtie2-build on a single reference and record the reference hash once it succeeds.  Returns (id_sample, returncode, duration).
+    """
+    hash_filepath = "{}.bt2.md5".format(reference_filepath)
+    if os.path.exists(hash_filepath):
+        os.remove(hash_filepath)
+
+    cmd = "{} --threads {} --seed {} {} {} {}".format(
+        opts.executable,
+        opts.n_jobs_per_sample,
+        opts.random_state,
+        opts.options,
+        reference_filepath,
+        reference_filepath,
+    )
+
+    start_time = time.time()
+    with open("{}.bowtie2-build.log".format(reference_filepath), "w") as f_log:
+        print(cmd, file=f_log, flush=True)
+        returncode = subprocess.call(cmd, shell=True, executable="/bin/bash", stdout=f_log, stderr=f_log)
+    duration = time.time() - start_time
+
+    # Only record the hash when the index was built so incomplete indexes are rebuilt on restart
+    if returncode == 0:
+        with open(hash_filepath, "w") as f_hash:
+            print(reference_hash, file=f_hash)
+
+    return id_sample, returncode, duration
+
+def main(args=None):
+    # Path info
+    script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
+    script_filename = __program__
+    # Path info
+    description = """
+    Running: {} v{} via Python v{} | {}""".format(__program__, __version__, sys.version.split(" ")[0], sys.executable)
+    usage = "{} -i <references.tsv> -d <reference_directory> -f <reference.fa> -p <n_jobs>".format(__program__)
+    epilog = "Copyright 2021 Josh L. Espinoza (jespinoz@jcvi.org)"
+
+    # Parser
+    parser = argparse.ArgumentParser(description=description, usage=usage, epilog=epilog, formatter_class=argparse.RawTextHelpFormatter)
+    # Pipeline
+    parser_io = parser.add_argument_group('Required I/O arguments')
+    parser_io.add_argument("-i","--samples", type=str, required=True, help = "path/to/references.tsv with [id_sample] as the first column (No header).  Duplicate samples are indexed once.")
+    parser_io.add_argument("-d","--reference_directory", type=str, required=True, help = "path/to/reference_directory with [id_sample]/[reference_filename] files")
+    parser_io.add_argument("-f","--reference_filename", type=str, default="reference.fa", help = "Reference fasta filename within each sample directory [Default: reference.fa]")
+
+    parser_utility = parser.add_argument_group('Utility arguments')
+    parser_utility.add_argument("-p","--n_jobs", type=int, default=1, help = "Number of threads in total.  Samples are indexed concurrently (largest first) with --n_jobs // --n_jobs_per_sample samples at a time.  Use -1 for all available threads [Default: 1]")
+    parser_utility.add_argument("--n_jobs_per_sample", type=int, default=4, help = "Number of threads for each bowtie2-build [Default: 4]")
+    parser_utility.add_argument("--overwrite", action="store_true", help = "Rebuild indexes even if the reference hash has not changed")
+
+    parser_program = parser.add_argument_group('bowtie2-build arguments')
+    parser_program.add_argument("-e","--executable", type=str, default="bowtie2-build", help = "bowtie2-build executable [Default: bowtie2-build]")
+    parser_program.add_argument("--random_state", type=int, default=0, help = "bowtie2-build --seed [Default: 0]")
+    parser_program.add_argument("--options", type=str, default="", help = "More options for bowtie2-build (e.g. --arg 1 ) [Default: '']")
+
+    # Options
+    opts = parser.parse_args()
+    opts.script_directory  = script_directory
+    opts.script_filename = script_filename
+
+    if opts.n_jobs == -1:
+        opts.n_jobs = cpu_count()
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1 (or -1 to use all available threads)"
+    assert opts.n_jobs_per_sample >= 1, "--n_jobs_per_sample must be ≥ 1"
+    opts.n_jobs_per_sample = min(opts.n_jobs_per_sample, opts.n_jobs)
+
+    # Samples whose reference (or bowtie2-build options) changed since the last build
+    samples = list()
+    for id_sample in read_samples(opts.samples):
+        reference_filepath = os.path.join(opts.reference_directory, id_sample, opts.reference_filename)
+        assert os.path.exists(reference_filepath), "Reference does not exist for {}: {}".format(id_sample, reference_filepath)
+        reference_hash = get_reference_hash(reference_filepath, opts)
+        hash_filepath = "{}.bt2.md5".format(reference_filepath)
+        if not opts.overwrite and os.path.exists(hash_filepath) and index_exists(reference_filepath):
+            with open(hash_filepath, "r") as f_hash:
+                if f_hash.read().strip() == reference_hash:
+                    print("[Skipping] [bowtie2-build] {} because the reference has not changed since {} was built".format(id_sample, hash_filepath), file=sys.stdout)
+                    continue
+        samples.append((id_sample, reference_filepath, reference_hash))
+
+    # Largest references first so the longest builds are not left until the end
+    samples = sorted(samples, key=lambda x: os.stat(x[1]).st_size, reverse=True)
+    n_samples_parallel = max(1, opts.n_jobs // opts.n_jobs_per_sample)
+    print(" * Running bowtie2-build on {} samples ({} samples in parallel with {} threads each)".format(len(samples), n_samples_parallel, opts.n_jobs_per_sample), file=sys.stdout)
+
+    failed = list()
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=n_samples_parallel) as executor:
+        futures = [executor.submit(run_sample, id_sample, reference_filepath, reference_hash, opts) for id_sample, reference_filepath, reference_hash in samples]
+        for future in as_completed(futures):
+            id_sample, returncode, duration = future.result()
+            if returncode == 0:
+                print("[Completed] [bowtie2-build] {} ({} seconds)".format(id_sample, int(duration)), file=sys.stdout, flush=True)
+            else:
+                print("[Failed] [bowtie2-build] {} (returncode={}) See log: {}".format(id_sample, returncode, os.path.join(opts.reference_directory, id_sample, "{}.bowtie2-build.log".format(opts.reference_filename))), file=sys.stdout, flush=True)
+                failed.append(id_sample)
+    print(" * Completed {} samples in {} seconds".format(len(samples) - len(failed), int(time.time() - start_time)), file=sys.stdout)
+
+    if failed:
+        print(" * bowtie2-build failed for the following {} samples: {}".format(len(failed), ", ".join(failed)), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
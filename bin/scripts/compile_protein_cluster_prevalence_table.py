@@ -3,11 +3,25 @@ from __future__ import print_function, division
 import sys, os, argparse, glob
 import numpy as np
 import pandas as pd
-from tqdm import tqdm 
+
+from sparse_utils import iter_dense_chunks, write_sparse_npz
 
 pd.options.display.max_colwidth = 100
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2023.9.15"
+__version__ = "2026.10.18"
+
+def get_protein_cluster_prevalence_coo(df_input:pd.DataFrame):
+    """
+    Prevalence counts of protein clusters per genome in COO format from a single vectorized pass.
+    Genomes and clusters are categorical-encoded (sorted) and duplicate (genome, cluster) pairs are summed.
+    Returns (rows, columns, data, genomes, clusters)
+    """
+    genome_codes, genomes = pd.factorize(df_input.iloc[:,0], sort=True)
+    cluster_codes, clusters = pd.factorize(df_input.iloc[:,2], sort=True)
+    number_of_clusters = max(len(clusters), 1)
+    linear_index = genome_codes.astype(np.int64) * number_of_clusters + cluster_codes
+    linear_index_unique, counts = np.unique(linear_index, return_counts=True)
+    return linear_index_unique // number_of_clusters, linear_index_unique % number_of_clusters, counts, pd.Index(genomes), pd.Index(clusters)
 
 
 def main(args=None):
@@ -37,6 +51,9 @@ def main(args=None):
     parser.add_argument("--dtype", type=str, default="bool", help = "Dtype for boolean output {bool, int} [Default: bool]")
     parser.add_argument("-c", "--columns_name", type=str, default="id_protein-cluster", help = "Columns name [Default: id_protein-cluster]")
     parser.add_argument("-r", "--rows_name", type=str, default="id_genome", help = "Rows name [Default: id_genome]")
+    parser.add_argument("--npz", type=str, help = "path/to/sparse_prevalence.npz output.  COO format readable with `scipy.sparse.load_npz` with genome and cluster labels in the `index` and `columns` arrays")
+    parser.add_argument("--no_dense_output", action="store_true", help = "Do not write dense --output table (e.g., only write --npz for large inputs)")
+    parser.add_argument("--chunksize", type=int, default=100, help = "Number of genomes per dense chunk written to --output [Default: 100]")
 
     # Options
     opts = parser.parse_args()
@@ -53,35 +70,27 @@ def main(args=None):
 
     # Read Input
     df_input = pd.read_csv(opts.input, sep="\t", index_col=None, header=None)
-    genomes = sorted(df_input.iloc[:,0].unique())
-    clusters = sorted(df_input.iloc[:,2].unique())
-
-    # Create array
-    A = np.zeros((len(genomes), len(clusters)), dtype=int)
 
-    for _, (id_genome, id_protein, id_cluster) in tqdm(df_input.iterrows(), total=df_input.shape[0]):
-        i = genomes.index(id_genome)
-        j = clusters.index(id_cluster)
-        A[i,j] += 1
-
-    # Create output
-    df_output = pd.DataFrame(A, index=genomes, columns=clusters)
-    df_output.index.name = opts.rows_name
-    df_output.columns.name = opts.columns_name
+    # Create sparse prevalence
+    rows, columns, data, genomes, clusters = get_protein_cluster_prevalence_coo(df_input)
+    genomes.name = opts.rows_name
+    clusters.name = opts.columns_name
 
     if opts.boolean:
-        df_output = df_output > 0
+        data = np.ones_like(data, dtype=bool)
         if opts.dtype == "int":
-            df_output = df_output.astype(int)
-
-    df_output.to_csv(opts.output, sep="\t")
+            data = data.astype(int)
 
+    print(" * Genomes: {}, Clusters: {}, Non-zero entries: {} ({:.3f}% dense)".format(len(genomes), len(clusters), data.size, 100 * data.size / max(len(genomes) * len(clusters), 1)), file=sys.stderr)
 
+    if opts.npz:
+        print(" * Writing sparse prevalence: {}".format(opts.npz), file=sys.stderr)
+        write_sparse_npz(opts.npz, rows=rows, columns=columns, data=data, index=genomes, features=clusters)
 
-
-
-
-  
+    # Create output
+    if not opts.no_dense_output:
+        for i, df_output in enumerate(iter_dense_chunks(rows, columns, data, index=genomes, features=clusters, fill_value=False if data.dtype == bool else 0, chunksize=opts.chunksize)):
+            df_output.to_csv(opts.output, sep="\t", header=i == 0, mode="w" if i == 0 else "a")
 
 if __name__ == "__main__":
     main()
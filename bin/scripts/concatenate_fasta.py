@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 from __future__ import print_function, division
 import sys, os, argparse, hashlib
+from multiprocessing import Pool
 import pandas as pd
 from Bio.SeqIO.FastaIO import SimpleFastaParser
 
@@ -12,7 +13,59 @@ from soothsayer_utils import get_file_object, pv, assert_acceptable_arguments
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2023.12.13"
+__version__ = "2026.10.18"
+
+def concatenate_fasta(filepaths:list, output_prefix:str, extension:str, minimum_contig_length:int, remove_duplicates:bool=True):
+    """
+    Concatenate fasta files and optionally remove duplicate sequences (case insensitive) in a single pass.  The following are written as records are read:
+        * [output_prefix].[extension]
+        * [output_prefix].saf
+        * [output_prefix].id_to_hash.tsv - [id_record]<tab>[md5 of sequence (case sensitive)] (No header). Same as `seqkit fx2tab -i -s -n`
+        * [output_prefix].duplicates_removed.list
+    """
+    f_out = get_file_object(
+        path="{}.{}".format(output_prefix, extension),
+        mode="write", 
+        safe_mode=False, 
+        verbose=False,
+    )
+    f_saf = open("{}.saf".format(output_prefix), "w")
+    f_hashes = open("{}.id_to_hash.tsv".format(output_prefix), "w")
+    f_duplicates = open("{}.duplicates_removed.list".format(output_prefix), "w")
+    print("GeneID", "Chr", "Start", "End", "Strand", sep="\t", file=f_saf)
+
+    # Read input fasta, filter out short sequences, and write to concatenated file.  
+    # Raw 16 byte digests are used for duplicates instead of 32 character hex strings
+    sequence_hashes = set()
+    number_of_records = 0
+    number_of_duplicates = 0
+    for fp in filepaths:
+        f_query = get_file_object(fp, mode="read", verbose=False)
+        for id, seq in SimpleFastaParser(f_query):
+            if len(seq) >= minimum_contig_length:
+                seq_upper = seq.upper()
+                id_hash = hashlib.md5(seq_upper.encode()).digest()
+                id_record = id.split(" ")[0]
+                if (not remove_duplicates) or (id_hash not in sequence_hashes):
+                    print(">{}\n{}".format(id, seq), file=f_out)
+                    print(id_record, id_record, 1, len(seq), "+", sep="\t", file=f_saf)
+                    print(id_record, id_hash.hex() if seq == seq_upper else hashlib.md5(seq.encode()).hexdigest(), sep="\t", file=f_hashes)
+                    if remove_duplicates:
+                        sequence_hashes.add(id_hash)
+                    number_of_records += 1
+                else:
+                    print(id_record, file=f_duplicates)
+                    number_of_duplicates += 1
+        f_query.close()
+
+    f_out.close()
+    f_saf.close()
+    f_hashes.close()
+    f_duplicates.close()
+    return output_prefix, len(filepaths), number_of_records, number_of_duplicates
+
+def concatenate_fasta_star(args):
+    return concatenate_fasta(*args)
 
 def main(args=None):
     # Path info
@@ -36,6 +89,7 @@ def main(args=None):
     parser.add_argument("-M", "--mode", type=str, default="infer", help="Concatenate all references with global and build index or build index for each reference {global, local, infer}")
     parser.add_argument("--no_sort", action="store_true", help = "Don't sort the grouped filepaths")
     parser.add_argument("--no_subdirectory", action="store_true", help = "Don't create a nested directory structure")
+    parser.add_argument("-p", "--n_jobs", type=int, default=1, help = "Number of samples to concatenate in parallel (local mode) [Default: 1]")
 
 
     # Options
@@ -51,8 +105,10 @@ def main(args=None):
     # Output
     os.makedirs(opts.output_directory, exist_ok=True)
 
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1"
+
     # Read table
-    df = pd.read_csv(f_in, sep="\t", index_col=0, header=None)
+    df = pd.read_csv(f_in, sep="\t", index_col=0, header=None, dtype=str)
     m = df.shape[1]
 
     if opts.mode == "infer":
@@ -66,6 +122,7 @@ def main(args=None):
     
     assert_acceptable_arguments(opts.mode, {"local", "global"})
 
+    jobs = list()
     if opts.mode == "local":
         # GroupBy and parse
         for id_sample, filepaths in df.groupby(df.index):
@@ -74,127 +131,33 @@ def main(args=None):
             if not opts.no_sort:
                 filepaths = sorted(filepaths)
                 
-            # Create output files (and directories)
+            # Output prefix (and directories)
             if opts.no_subdirectory:
-                f_out = get_file_object(
-                    path=os.path.join(opts.output_directory, "{}.{}".format(id_sample, opts.extension)),
-                    mode="write", 
-                    safe_mode=False, 
-                    verbose=False,
-                )
-
-                saf_filepath = os.path.join(opts.output_directory, "{}.saf".format(id_sample))
-
-                f_duplicates = get_file_object(
-                    path=os.path.join(opts.output_directory, "{}.duplicates_removed.list".format(id_sample)),
-                    mode="write", 
-                    safe_mode=False, 
-                    verbose=False,
-                )
+                output_prefix = os.path.join(opts.output_directory, id_sample)
             else:
                 os.makedirs(os.path.join(opts.output_directory, id_sample), exist_ok=True)
-
-                f_out = get_file_object(
-                    path=os.path.join(opts.output_directory, id_sample, "{}.{}".format(opts.basename, opts.extension)),
-                    mode="write", 
-                    safe_mode=False, 
-                    verbose=False,
-                )
-
-                saf_filepath = os.path.join(opts.output_directory, id_sample, "{}.saf".format(opts.basename))
-
-                f_duplicates = get_file_object(
-                    path=os.path.join(opts.output_directory, id_sample, "{}.duplicates_removed.list".format(opts.basename)),
-                    mode="write", 
-                    safe_mode=False, 
-                    verbose=False,
-                )
-            
-            # Read input fasta, filter out short sequences, and write to concatenated file
-            sequence_hashes = set()
-            saf_data = list()
-            for fp in pv(filepaths, description=id_sample, unit= " files"):
-                f_query = get_file_object(fp, mode="read", verbose=False)
-                for id, seq in SimpleFastaParser(f_query):
-                    if len(seq) >= opts.minimum_contig_length:
-                        id_hash = hashlib.md5(seq.upper().encode()).hexdigest()
-                        id_record = id.split(" ")[0]
-                        if id_hash not in sequence_hashes:
-                            print(">{}\n{}".format(id, seq), file=f_out)
-                            fields = [
-                                id_record, 
-                                id_record, 
-                                1, 
-                                len(seq),
-                                "+",
-                            ]
-                            saf_data.append(fields)
-                            sequence_hashes.add(id_hash)
-                        else:
-                            print(id_record, file=f_duplicates)
-
-                f_query.close()
-
-            f_out.close()
-            f_duplicates.close()
-
-            df_saf = pd.DataFrame(saf_data, columns=["GeneID", "Chr", "Start", "End", "Strand"])
-            df_saf.to_csv(saf_filepath, sep="\t", index=None)
+                output_prefix = os.path.join(opts.output_directory, id_sample, opts.basename)
+            jobs.append((filepaths, output_prefix, opts.extension, opts.minimum_contig_length, True))
 
     if opts.mode == "global":
-        # GroupBy and parse
-        filepaths = df.index 
+        filepaths = list(df.index)
         if not opts.no_sort:
             filepaths = sorted(filepaths)
-
-        # Create output files (and directories)
-        f_out = get_file_object(
-            path=os.path.join(opts.output_directory, "{}.{}".format(opts.basename, opts.extension)),
-            mode="write", 
-            safe_mode=False, 
-            verbose=False,
-        )
-
-        saf_filepath = os.path.join(opts.output_directory, "{}.saf".format(opts.basename))
-
-        f_duplicates = get_file_object(
-            path=os.path.join(opts.output_directory, "{}.duplicates_removed.list".format(opts.basename)),
-            mode="write", 
-            safe_mode=False, 
-            verbose=False,
-        )
-
-        # Read input fasta, filter out short sequences, and write to concatenated file
-        sequence_hashes = set()
-        saf_data = list()
-        for fp in pv(filepaths, unit= " files"):
-            f_query = get_file_object(fp, mode="read", verbose=False)
-            for id, seq in SimpleFastaParser(f_query):
-                if len(seq) >= opts.minimum_contig_length:
-                    id_hash = hashlib.md5(seq.upper().encode()).hexdigest()
-                    id_record = id.split(" ")[0]
-                    if id_hash not in sequence_hashes:
-                        print(">{}\n{}".format(id, seq), file=f_out)
-                        fields = [
-                            id_record, 
-                            id_record, 
-                            1, 
-                            len(seq),
-                            "+",
-                        ]
-                        saf_data.append(fields)
-                    else:
-                        print(id_record, file=f_duplicates)
-            f_query.close()
-
-        f_out.close()
-        f_duplicates.close()
-
-        df_saf = pd.DataFrame(saf_data, columns=["GeneID", "Chr", "Start", "End", "Strand"])
-        df_saf.to_csv(saf_filepath, sep="\t", index=None)
-
-
-
+        # Duplicates are not removed in global mode so all scaffolds from the input genomes remain in the reference
+        jobs.append((filepaths, os.path.join(opts.output_directory, opts.basename), opts.extension, opts.minimum_contig_length, False))
+
+    # Sample groups are independent so they are concatenated in parallel
+    if min(opts.n_jobs, len(jobs)) > 1:
+        pool = Pool(min(opts.n_jobs, len(jobs)))
+        results = pool.imap_unordered(concatenate_fasta_star, jobs)
+    else:
+        pool = None
+        results = map(concatenate_fasta_star, jobs)
+    for output_prefix, number_of_files, number_of_records, number_of_duplicates in pv(results, description="Concatenating fasta files", total=len(jobs), unit=" groups"):
+        print(" * {}.{}: {} sequences from {} files ({} duplicates removed)".format(output_prefix, opts.extension, number_of_records, number_of_files, number_of_duplicates), file=sys.stderr)
+    if pool is not None:
+        pool.close()
+        pool.join()
 
 if __name__ == "__main__":
     main()
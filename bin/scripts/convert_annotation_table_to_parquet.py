@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys, os, argparse, ast
+import pandas as pd
+from soothsayer_utils import check_packages
+
+# from tqdm import tqdm
+__program__ = os.path.split(sys.argv[0])[-1]
+__version__ = "2026.10.18"
+
+LIST_FIELDS = ["ids", "names", "evalues", "scores", "enzyme_commissions"]
+FLOAT_LIST_FIELDS = {"evalues", "scores"}
+
+@check_packages(["pyarrow"])
+def write_parquet_with_lists(df, list_fields, output):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    for field in list_fields:
+        dtype = pa.list_(pa.float64()) if field in FLOAT_LIST_FIELDS else pa.list_(pa.string())
+        i = table.schema.get_field_index(field)
+        table = table.set_column(i, field, pa.array(df[field].tolist(), type=dtype))
+    pq.write_table(table, output)
+
+def main(args=None):
+    # Path info
+    script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
+    script_filename = __program__
+    # Path info
+    description = """
+    Running: {} v{} via Python v{} | {}""".format(__program__, __version__, sys.version.split(" ")[0], sys.executable)
+    usage = "{} -i <pyhmmsearch_output.tsv.gz> -o <pyhmmsearch_output.parquet>".format(__program__)
+    epilog = "Copyright 2021 Josh L. Espinoza (jespinoz@jcvi.org)"
+
+    # Parser
+    parser = argparse.ArgumentParser(description=description, usage=usage, epilog=epilog, formatter_class=argparse.RawTextHelpFormatter)
+    # Pipeline
+    parser.add_argument("-i","--input", default="stdin", type=str, help = "path/to/pyhmmsearch_output.tsv[.gz] or pykofamsearch_output.tsv[.gz] with header and list literals (e.g., ['PF00001.1']) [Default: stdin]")
+    parser.add_argument("-o","--output", required=True, type=str, help = "path/to/output.parquet")
+    parser.add_argument("-l","--list_fields", type=str, default=",".join(LIST_FIELDS), help = "Comma-separated fields with list literals.  Fields not in --input are ignored.  evalues and scores are stored as list<float64> and all other fields as list<string> [Default: {}]".format(",".join(LIST_FIELDS)))
+
+    # Options
+    opts = parser.parse_args()
+    opts.script_directory  = script_directory
+    opts.script_filename = script_filename
+
+    if opts.input == "stdin":
+        opts.input = sys.stdin
+
+    # List literals are parsed once here so parquet outputs are typed (list<string>/list<float64>) for downstream use
+    df = pd.read_csv(opts.input, sep="\t", index_col=0)
+
+    list_fields = list(filter(lambda field: field in df.columns, opts.list_fields.split(",")))
+    for field in list_fields:
+        df[field] = df[field].map(ast.literal_eval, na_action="ignore").map(lambda x: x if isinstance(x, list) else [])
+
+    print(" * Writing {} rows with list-typed fields {} to {}".format(df.shape[0], list_fields, opts.output), file=sys.stderr)
+    write_parquet_with_lists(df=df, list_fields=list_fields, output=opts.output)
+
+if __name__ == "__main__":
+    main()
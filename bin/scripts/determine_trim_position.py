@@ -1,41 +1,24 @@
 #!/usr/bin/env python
 from __future__ import print_function, division
 import sys, os, argparse
+from multiprocessing import cpu_count
 import numpy as np
 import pandas as pd
 from collections import OrderedDict
 
 pd.options.display.max_colwidth = 100
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2022.8.11"
-
-def statistics(fp, retain_index):
-    # Build table
-    quality_table = list()
-    failed_reads = list()
-    
-    for read in tqdm(pyfastx.Fastq(fp), desc="Reading fastq filepath: {}".format(fp), unit=" read"):
-        try:
-            quality = np.asarray(read.quali).astype(int)
-            quality_table.append(quality)
-        except UnicodeDecodeError as e:
-            failed_reads.append(read.name)
-    if not retain_index:
-        os.remove("{}.fxi".format(fp))
-
-    quality_table = np.stack(quality_table)
-
-    df_minmeanmax = pd.DataFrame([
-        pd.Series(np.min(quality_table, axis=0), name="min"),
-        pd.Series(np.mean(quality_table, axis=0), name="mean"),
-        pd.Series(np.max(quality_table, axis=0), name="max"),
-    ]).T
-    df_quantiles = pd.DataFrame(np.quantile(quality_table, q=[0.25,0.5,0.75], axis=0).T, columns = ["q=0.25", "q=0.5", "q=0.75"])
-    df_output = pd.concat([df_minmeanmax, df_quantiles], axis=1)
-    df_output.index = df_output.index.values + 1
-    df_output.index.name = "position"
-
-    return df_output
+__version__ = "2026.10.18"
+
+def get_window_loss(number_of_samples_above_quality_threshold_per_position:pd.Series, n_samples:int, window_size:int):
+    """
+    Average number of samples below the quality threshold for each window of positions (computed as a single convolution)
+    """
+    loss = n_samples - number_of_samples_above_quality_threshold_per_position.values
+    average_loss = np.convolve(loss, np.ones(window_size)/window_size, mode="valid")
+    positions = number_of_samples_above_quality_threshold_per_position.index
+    window_to_loss = pd.Series(average_loss, index=pd.MultiIndex.from_arrays([positions[:average_loss.size], positions[window_size - 1:]], names=["start", "end"]))
+    return window_to_loss
 
 def main(args=None):
     # Path info
@@ -55,6 +38,7 @@ def main(args=None):
     parser = argparse.ArgumentParser(description=description, usage=usage, epilog=epilog, formatter_class=argparse.RawTextHelpFormatter)
     # Pipeline
     parser.add_argument("-i", "--fastq_statistics",  type=str, default="stdin", help = "path/to/fastq_statistics.tsv. Rows=Positions (starting at 1), Columns=Samples. [Default: stdin])")
+    parser.add_argument("--fastq",  type=str, nargs="+", help = "path/to/fastq[.gz] file(s) (one per sample) to compute statistics directly using `fastq_position_statistics.py` instead of --fastq_statistics")
     parser.add_argument("-o","--output_directory", required=False, type=str, help = "Output directory [Required if you did not select --stdout]")
     parser.add_argument("-q","--minimum_quality",  default=30.0,type=float, help = "Minimum quality value")
     parser.add_argument("-m","--minimum_length",  default=100,type=int, help = "Minimum length.  If minimum quality value makes length shorter than this then an error will yield with which samples are responsible [Default: 100]")
@@ -65,6 +49,13 @@ def main(args=None):
     parser.add_argument("--plot_title",  default="--fastq_statistics", type=str, help = "Title for plots [Default: Filename of --fastq_statistics]")
     parser.add_argument("-s", "--stdout",  action="store_true",  help = "Don't include any plots and just output the position to stdout")
 
+    parser_fastq = parser.add_argument_group('--fastq arguments')
+    parser_fastq.add_argument("-f", "--field",  type=str, default="q=0.25", choices={"min", "mean", "max", "q=0.25", "q=0.5", "q=0.75"}, help = "Field to use from fastq statistics [Default: q=0.25]")
+    parser_fastq.add_argument("--length_mode", default="longest", type=str, choices={"longest", "shortest"}, help = "{shortest, longest} [Default: longest]")
+    parser_fastq.add_argument("--phred",  type=int, default=33, help = "Phred offset [Default: 33]")
+    parser_fastq.add_argument("-p", "--n_jobs",  type=int, default=1, help = "Number of fastq files to process in parallel.  Use -1 for all available threads [Default: 1]")
+    parser_fastq.add_argument("--subsample",  type=int, help = "Use a uniform random subsample (reservoir) of this many reads per fastq file instead of all reads")
+
     # parser.add_argument("--no_plots",  action="store_true", help = "Don't produce any plots")
     # parser.add_argument("-s","--sep",  default="\t",type=str, help = "Separator for output values")
 
@@ -79,16 +70,29 @@ def main(args=None):
     if opts.maximum_average_loss is None:
         opts.maximum_average_loss = opts.window_size
         
-    if opts.fastq_statistics == "stdin":
-        opts.fastq_statistics = sys.stdin
+    if opts.fastq:
+        from fastq_position_statistics import statistics_for_filepaths
+
+        if opts.n_jobs == -1:
+            opts.n_jobs = cpu_count()
+        assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1 (or -1 to use all available threads)"
         if opts.plot_title == "--fastq_statistics":
-            opts.plot_title = "Fastq Statistics [stdin]"
+            opts.plot_title = "Fastq Statistics [{} samples]".format(len(opts.fastq))
+
+        print("* Computing fastq statistics ({}) for {} fastq files".format(opts.field, len(opts.fastq)), file=sys.stderr)
+        dataframes = statistics_for_filepaths(opts.fastq, phred=opts.phred, length_mode=opts.length_mode, subsample=opts.subsample, n_jobs=opts.n_jobs)
+        df_fastq_statistics = pd.DataFrame(OrderedDict(zip(opts.fastq, map(lambda df: df[opts.field], dataframes))))
     else:
-        if opts.plot_title == "--fastq_statistics":
-            opts.plot_title = opts.fastq_statistics
-        
-    print("* Reading in fastq statistics: {}".format(opts.fastq_statistics), file=sys.stderr)
-    df_fastq_statistics = pd.read_csv(opts.fastq_statistics, sep="\t", index_col=0)
+        if opts.fastq_statistics == "stdin":
+            opts.fastq_statistics = sys.stdin
+            if opts.plot_title == "--fastq_statistics":
+                opts.plot_title = "Fastq Statistics [stdin]"
+        else:
+            if opts.plot_title == "--fastq_statistics":
+                opts.plot_title = opts.fastq_statistics
+            
+        print("* Reading in fastq statistics: {}".format(opts.fastq_statistics), file=sys.stderr)
+        df_fastq_statistics = pd.read_csv(opts.fastq_statistics, sep="\t", index_col=0)
     n_positions, n_samples = df_fastq_statistics.shape
 
     # If no --stdout, then create directory and load matplotlib
@@ -109,13 +113,7 @@ def main(args=None):
     number_of_samples_above_quality_threshold_per_position.index = number_of_samples_above_quality_threshold_per_position.index.astype(int)
 
     # Calculate loss per window
-    window_to_loss = OrderedDict()
-    for i in range(0, n_positions - opts.window_size + 1, 1):
-        window = number_of_samples_above_quality_threshold_per_position.iloc[i:i + opts.window_size]
-        loss = [n_samples]*opts.window_size - window
-        window_to_loss[(window.index[0], window.index[-1])] = loss.mean()
-    window_to_loss = pd.Series(window_to_loss)
-    window_to_loss.index.names = ["start", "end"]
+    window_to_loss = get_window_loss(number_of_samples_above_quality_threshold_per_position, n_samples=n_samples, window_size=opts.window_size)
 
     start_trim_window, end_trim_window = window_to_loss[window_to_loss >= opts.maximum_average_loss].index[0]
     trim_window = number_of_samples_above_quality_threshold_per_position.loc[start_trim_window:end_trim_window]
@@ -8,7 +8,7 @@ from tqdm import tqdm
 from Bio.SeqIO.FastaIO import SimpleFastaParser
 
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.11.8"
+__version__ = "2026.10.18"
 
 def generate_unique_cluster_base_label(nodes:set, mode:str, index:int, cluster_prefix_zfill:int):
     ALPHANUMERIC=list("1234567890abcdefghijklmnopqrstuvwxyz")
@@ -24,6 +24,199 @@ def generate_unique_cluster_base_label(nodes:set, mode:str, index:int, cluster_p
     elif mode == "random":
         return "".join(np.random.choice(ALPHANUMERIC, 32))
 
+def get_basename(x):
+    _, fn = os.path.split(x)
+    if fn.endswith(".gz"):
+        fn = fn[:-3]
+    return ".".join(fn.split(".")[:-1])
+
+# ==================
+# Union-find backend
+# ==================
+def read_edgelist_chunks(path, chunksize):
+    try:
+        for df in pd.read_csv(path, sep="\t", header=None, chunksize=chunksize):
+            yield df
+    except pd.errors.EmptyDataError:
+        return
+
+def compress_disjoint_set(parent):
+    # Pointer jumping until every node points to its root
+    while True:
+        grandparent = parent[parent]
+        if np.array_equal(grandparent, parent):
+            return parent
+        parent = grandparent
+
+def union_disjoint_set(parent, u, v):
+    """
+    Vectorized union of edges (u, v) into an array-backed disjoint set. 
+    Roots are hooked onto the smallest root they are connected to until no edge spans two roots.
+    """
+    while True:
+        parent = compress_disjoint_set(parent)
+        root_u = parent[u]
+        root_v = parent[v]
+        mask = root_u != root_v
+        if not np.any(mask):
+            return parent
+        np.minimum.at(parent, np.maximum(root_u[mask], root_v[mask]), np.minimum(root_u[mask], root_v[mask]))
+
+def build_unionfind_clusters(opts, all_identifiers=None):
+    """
+    Stream the edgelist in chunks, filter edges with vectorized thresholds, and build connected 
+    components with a disjoint set over integer-encoded nodes. Weighted degree (i.e., intra-cluster connectivity) 
+    is computed with bincount after removing duplicate edges (last edge is kept like nx.Graph.add_edge).
+    """
+    node_to_code = dict()
+    parent = np.arange(0, dtype=np.int64)
+    edges = list()
+    number_of_columns = None
+    for df in tqdm(read_edgelist_chunks(opts.input, opts.chunksize), "Streaming edgelist in chunks of {} edges: {}".format(opts.chunksize, opts.input), unit=" chunks"):
+        if number_of_columns is None:
+            number_of_columns = df.shape[1]
+            assert number_of_columns in  {2,3,4, 5}, "Must have 2, 3, 4, or 5 columns.  {} provided.".format(number_of_columns)
+        n = df.shape[0]
+
+        # Integer-encode nodes
+        codes, uniques = pd.factorize(np.concatenate([df[0].values, df[1].values]))
+        uniques = list(uniques)
+        if opts.basename:
+            uniques = list(map(get_basename, uniques))
+        unique_codes = np.fromiter((node_to_code.setdefault(id_node, len(node_to_code)) for id_node in uniques), dtype=np.int64, count=len(uniques))
+        local_codes = codes
+        codes = unique_codes[codes]
+        u = codes[:n]
+        v = codes[n:]
+
+        # Filter
+        mask = np.ones(n, dtype=bool)
+        weights = dict()
+        if number_of_columns == 2:
+            weights["weight"] = np.ones(n, dtype=int)
+        if number_of_columns == 3:
+            weights["weight"] = df[2].values.astype(float)
+            mask &= weights["weight"] >= opts.threshold
+        if number_of_columns == 4:
+            weights["weight"] = df[2].values.astype(float)
+            weights["weight2"] = df[3].values.astype(float)
+            mask &= (weights["weight"] >= opts.threshold) & (weights["weight2"] >= opts.threshold2)
+        if number_of_columns == 5:
+            weights["weight"] = df[2].values.astype(float)
+            weights["alignment_fraction_reference"] = df[3].values.astype(float)
+            weights["alignment_fraction_query"] = df[4].values.astype(float)
+            mask &= weights["weight"] >= opts.threshold
+            if opts.af_mode == "relaxed":
+                mask &= np.maximum(weights["alignment_fraction_reference"], weights["alignment_fraction_query"]) >= opts.minimum_af
+            if opts.af_mode == "strict":
+                mask &= (weights["alignment_fraction_reference"] >= opts.minimum_af) & (weights["alignment_fraction_query"] >= opts.minimum_af)
+        if all_identifiers is not None:
+            unique_mask = np.fromiter((id_node in all_identifiers for id_node in uniques), dtype=bool, count=len(uniques))
+            mask &= unique_mask[local_codes[:n]] & unique_mask[local_codes[n:]]
+
+        # Union
+        parent = np.concatenate([parent, np.arange(parent.size, len(node_to_code), dtype=np.int64)])
+        parent = union_disjoint_set(parent, u[mask], v[mask])
+        edges.append(pd.DataFrame({"u":u[mask], "v":v[mask], **{k:w[mask] for k, w in weights.items()}}))
+
+    if number_of_columns is None:
+        number_of_columns = 2
+        edges.append(pd.DataFrame({"u":np.arange(0, dtype=np.int64), "v":np.arange(0, dtype=np.int64), "weight":np.ones(0)}))
+    df_edges = pd.concat(edges, axis=0, ignore_index=True)
+    del edges
+
+    # Identifiers from edgelist
+    identifiers = set(node_to_code)
+    if all_identifiers is None:
+        all_identifiers = identifiers
+
+    # Order of first appearance in passing edges (this is the node order of nx.Graph)
+    number_of_edges = df_edges.shape[0]
+    node_order = np.full(len(node_to_code), np.inf)
+    np.minimum.at(node_order, df_edges["u"].values, 2*np.arange(number_of_edges))
+    np.minimum.at(node_order, df_edges["v"].values, 2*np.arange(number_of_edges) + 1)
+    included = np.isfinite(node_order)
+
+    # Singletons
+    singletons = list()
+    if not opts.no_singletons:
+        for id_node in all_identifiers:
+            if (id_node not in node_to_code) or (not included[node_to_code[id_node]]):
+                singletons.append(node_to_code.setdefault(id_node, len(node_to_code)))
+        parent = np.concatenate([parent, np.arange(parent.size, len(node_to_code), dtype=np.int64)])
+        node_order = np.concatenate([node_order, np.full(len(node_to_code) - node_order.size, np.inf)])
+        node_order[singletons] = 2*number_of_edges + np.arange(len(singletons))
+        included = np.isfinite(node_order)
+    parent = compress_disjoint_set(parent)
+
+    # Weighted degree (self-loops are counted twice like nx.degree)
+    df_edges[["u", "v"]] = np.sort(df_edges[["u", "v"]].values, axis=1)
+    df_edges = df_edges.drop_duplicates(["u", "v"], keep="last")
+    weighted_degree = np.bincount(df_edges["u"].values, weights=df_edges["weight"].values, minlength=len(node_to_code)) + np.bincount(df_edges["v"].values, weights=df_edges["weight"].values, minlength=len(node_to_code))
+    if number_of_columns == 2:
+        weighted_degree = weighted_degree.astype(int)
+
+    # Order clusters by size (descending) and then order of first appearance
+    nodes = np.flatnonzero(included)
+    nodes = nodes[np.argsort(node_order[nodes], kind="stable")]
+    roots = parent[nodes]
+    _, first_index, root_codes, cluster_sizes = np.unique(roots, return_index=True, return_inverse=True, return_counts=True)
+    cluster_rank = np.empty(cluster_sizes.size, dtype=np.int64)
+    cluster_rank[np.lexsort((first_index, -cluster_sizes))] = np.arange(cluster_sizes.size)
+    node_cluster_rank = cluster_rank[root_codes]
+    nodes = nodes[np.argsort(node_cluster_rank, kind="stable")]
+    node_cluster_rank = np.sort(node_cluster_rank, kind="stable")
+    boundaries = np.flatnonzero(np.diff(node_cluster_rank)) + 1
+
+    code_to_node = np.empty(len(node_to_code), dtype=object)
+    code_to_node[:] = list(node_to_code)
+
+    # Organize clusters
+    node_to_cluster = dict()
+    cluster_to_nodes = dict()
+    node_metadata = dict()
+    for i, cluster_nodes in tqdm(enumerate(np.split(nodes, boundaries) if nodes.size else list(), start=1), "Organizing clusters", unit=" clusters"):
+        nodes_set = set(code_to_node[cluster_nodes])
+        id_cluster = generate_unique_cluster_base_label(nodes=nodes_set, mode=opts.cluster_label_mode, index=i, cluster_prefix_zfill=opts.cluster_prefix_zfill)
+
+        # Add cluster prefix and suffix
+        if bool(opts.cluster_prefix):
+            id_cluster =  "{}{}".format(opts.cluster_prefix, id_cluster)
+        if bool(opts.cluster_suffix):
+            id_cluster =  "{}{}".format(id_cluster, opts.cluster_suffix)
+
+        if cluster_nodes.size > 1:
+            connectivity = weighted_degree[cluster_nodes]
+            representative = cluster_nodes[np.argmax(connectivity)]
+        else:
+            connectivity = [np.nan]
+            representative = cluster_nodes[0]
+
+        for id_code, k in zip(cluster_nodes, connectivity):
+            id_node = code_to_node[id_code]
+            node_to_cluster[id_node] = id_cluster
+            node_metadata[id_node] = {"id_cluster":id_cluster, "intra-cluster_connectivity":k, "representative":id_code == representative}
+        cluster_to_nodes[id_cluster] = nodes_set
+
+    # Only materialize graph when it is exported
+    graph = None
+    if opts.export_graph is not None:
+        graph = nx.Graph()
+        attributes = list(filter(lambda x: x not in {"u", "v"}, df_edges.columns))
+        for row in tqdm(df_edges.itertuples(index=False), "Building graph", total=df_edges.shape[0]):
+            graph.add_edge(code_to_node[row[0]], code_to_node[row[1]], **dict(zip(attributes, row[2:])))
+        singleton_attributes = {"weight":np.nan}
+        if number_of_columns == 4:
+            singleton_attributes["weight2"] = np.nan
+        if number_of_columns == 5:
+            singleton_attributes["alignment_fraction"] = 100.0
+        for id_code in singletons:
+            graph.add_edge(code_to_node[id_code], code_to_node[id_code], **singleton_attributes)
+        for id_node, metadata in node_metadata.items():
+            graph.nodes[id_node].update(metadata)
+
+    return identifiers, node_to_cluster, cluster_to_nodes, node_metadata, graph
+
 def main(args=None):
     # Path info
     script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
@@ -54,6 +247,10 @@ def main(args=None):
     parser.add_argument("-b", "--basename", action="store_true", help = "Removes filepath prefix and extension.  Support for gzipped filepaths.")
     parser.add_argument("--identifiers", type=str, help = "Identifiers to include.  If missing identifiers and singletons are allowed, then they will be included as singleton clusters with weight of np.nan")
 
+    parser_backend = parser.add_argument_group('Backend arguments')
+    parser_backend.add_argument("--backend", type=str, default="networkx", choices={"networkx", "unionfind"}, help="Clustering backend.  `networkx` loads the edgelist and builds an nx.Graph.  `unionfind` streams the edgelist in chunks and builds connected components with a disjoint set over integer-encoded nodes. The graph is only built when --export_graph is used. [Default: networkx]")
+    parser_backend.add_argument("--chunksize", type=int, default=1000000, help="Number of edges per chunk for --backend unionfind [Default: 1000000]")
+
     parser_labels = parser.add_argument_group('Label arguments')
     parser_labels.add_argument("-p", "--cluster_prefix", type=str, default="c-", help="Cluster prefix [Default: 'c-']")
     parser_labels.add_argument("-z", "--cluster_prefix_zfill", type=int, default=0, help="Cluster prefix zfill. Use 7 to match identifiers from OrthoFinder.  Use 0 to add no zfill. Only applicable when --cluster_label_mode numeric. [Default: 0]") #7
@@ -86,41 +283,139 @@ def main(args=None):
     if opts.output == "stdout":
         opts.output = sys.stdout 
 
-    # Edge list
-    try:
-        df_edgelist = pd.read_csv(opts.input, sep="\t", header=None)
-    except pd.errors.EmptyDataError:
-        df_edgelist = pd.DataFrame(columns=["query", "reference"])
-
-    assert df_edgelist.shape[1] in  {2,3,4, 5}, "Must have 2, 3, 4, or 5 columns.  {} provided.".format(df_edgelist.shape[1])
-    if opts.basename:
-        def get_basename(x):
-            _, fn = os.path.split(x)
-            if fn.endswith(".gz"):
-                fn = fn[:-3]
-            return ".".join(fn.split(".")[:-1])
-        
-        # Support for .map superceding .applymap
-        if hasattr(df_edgelist, "map"):
-            df_edgelist.iloc[:,:2] = df_edgelist.iloc[:,:2].map(get_basename)
-        else:
-            df_edgelist.iloc[:,:2] = df_edgelist.iloc[:,:2].applymap(get_basename)
-
-    # Identifiers from edgelist
-    if not df_edgelist.empty:
-        edgelist = df_edgelist.iloc[:,:2].values.tolist()
-        identifiers = set.union(*map(set, edgelist))
-    else:
-        edgelist = list()
-        identifiers = set()
-
-    all_identifiers = identifiers
+    # Identifiers
+    identifiers_from_file = None
     if opts.identifiers:
-        all_identifiers = set()
+        identifiers_from_file = set()
         with open(opts.identifiers, "r") as f:
             for line in f.readlines():
                 id = line.strip()
-                all_identifiers.add(id)
+                identifiers_from_file.add(id)
+
+    if opts.backend == "unionfind":
+        identifiers, node_to_cluster, cluster_to_nodes, node_metadata, graph = build_unionfind_clusters(opts, all_identifiers=identifiers_from_file)
+
+    if opts.backend == "networkx":
+        # Edge list
+        try:
+            df_edgelist = pd.read_csv(opts.input, sep="\t", header=None)
+        except pd.errors.EmptyDataError:
+            df_edgelist = pd.DataFrame(columns=["query", "reference"])
+
+        assert df_edgelist.shape[1] in  {2,3,4, 5}, "Must have 2, 3, 4, or 5 columns.  {} provided.".format(df_edgelist.shape[1])
+        if opts.basename:
+            # Support for .map superceding .applymap
+            if hasattr(df_edgelist, "map"):
+                df_edgelist.iloc[:,:2] = df_edgelist.iloc[:,:2].map(get_basename)
+            else:
+                df_edgelist.iloc[:,:2] = df_edgelist.iloc[:,:2].applymap(get_basename)
+
+        # Identifiers from edgelist
+        if not df_edgelist.empty:
+            edgelist = df_edgelist.iloc[:,:2].values.tolist()
+            identifiers = set.union(*map(set, edgelist))
+        else:
+            edgelist = list()
+            identifiers = set()
+
+        all_identifiers = identifiers
+        if opts.identifiers:
+            all_identifiers = identifiers_from_file
+
+        # Construct graph
+        graph = nx.Graph()
+
+        # Unweighted
+        if df_edgelist.shape[1] == 2:
+            for i, (id_query, id_target) in tqdm(df_edgelist.iterrows(), "Reading edgelist: {}".format(opts.input), total=df_edgelist.shape[0]):
+                if {id_query, id_target}.issubset(all_identifiers):
+                    graph.add_edge(id_query, id_target, weight=1)
+            if not opts.no_singletons:
+                for id in all_identifiers:
+                    if id not in graph.nodes():
+                        graph.add_edge(id, id, weight=np.nan)
+
+        # Weighted
+        if df_edgelist.shape[1] == 3:
+            for i, (id_query, id_target, w) in tqdm(df_edgelist.iterrows(), "Reading edgelist with weights (≥ {}): {}".format(opts.threshold, opts.input), total=df_edgelist.shape[0]):
+                if w >= opts.threshold:
+                    if {id_query, id_target}.issubset(all_identifiers):
+                        graph.add_edge(id_query, id_target, weight=w)
+            if not opts.no_singletons:
+                for id in all_identifiers:
+                    if id not in graph.nodes():
+                        graph.add_edge(id, id, weight=np.nan)
+
+        # Weighted with alignment fraction
+        if df_edgelist.shape[1] == 4:
+            for i, (id_query, id_target, w1, w2) in tqdm(df_edgelist.iterrows(), "Reading edgelist with weights (≥ {}) and weights2 (≥ {}): {}".format(opts.threshold, opts.threshold2, opts.input), total=df_edgelist.shape[0]):
+                if all([
+                    w1 >= opts.threshold,
+                    w2 >= opts.threshold2,
+                    ]):
+                    if {id_query, id_target}.issubset(all_identifiers):
+                        graph.add_edge(id_query, id_target, weight=w1, weight2=w2)
+            if not opts.no_singletons:
+                for id in all_identifiers:
+                    if id not in graph.nodes():
+                        graph.add_edge(id, id, weight=np.nan, weight2=np.nan)
+                    
+        # Weighted with alignment fraction
+        if df_edgelist.shape[1] == 5:
+            if opts.af_mode == "relaxed":
+                for i, (id_query, id_target, w, af_ref, af_query) in tqdm(df_edgelist.iterrows(), "Reading edgelist with weights (≥ {}) and alignment fractions (≥ {}) using {} mode: {}".format(opts.threshold, opts.minimum_af, opts.af_mode, opts.input), total=df_edgelist.shape[0]):
+                    if all([
+                        w >= opts.threshold,
+                        max([af_ref, af_query]) >= opts.minimum_af,
+                        ]):
+                        if {id_query, id_target}.issubset(all_identifiers):
+                            graph.add_edge(id_query, id_target, weight=w, alignment_fraction_reference=af_ref, alignment_fraction_query=af_query)
+                        
+            if opts.af_mode == "strict":
+                for i, (id_query, id_target, w, af_ref, af_query) in tqdm(df_edgelist.iterrows(), "Reading edgelist with weights (≥ {}) and alignment fractions (≥ {}) using {} mode: {}".format(opts.threshold, opts.minimum_af, opts.af_mode, opts.input), total=df_edgelist.shape[0]):
+                    if all([
+                        w >= opts.threshold,
+                        af_ref >= opts.minimum_af,
+                        af_query >= opts.minimum_af,
+                        ]):
+                        if {id_query, id_target}.issubset(all_identifiers):
+                            graph.add_edge(id_query, id_target, weight=w, alignment_fraction_reference=af_ref, alignment_fraction_query=af_query)
+                        
+            if not opts.no_singletons:
+                for id in all_identifiers:
+                    if id not in graph.nodes():
+                        graph.add_edge(id, id, weight=np.nan, alignment_fraction=100.0)
+            
+        # Get connected components
+        node_to_cluster = dict()
+        cluster_to_nodes = dict()
+
+        for i, nodes in tqdm(enumerate(sorted(nx.connected_components(graph), key=len, reverse=True), start=1), "Organizing clusters", unit=" clusters"):
+            id_cluster = generate_unique_cluster_base_label(nodes=nodes, mode=opts.cluster_label_mode, index=i, cluster_prefix_zfill=opts.cluster_prefix_zfill)
+
+            # Add cluster prefix and suffix
+            if bool(opts.cluster_prefix):
+                id_cluster =  "{}{}".format(opts.cluster_prefix, id_cluster)
+            if bool(opts.cluster_suffix):
+                id_cluster =  "{}{}".format(id_cluster, opts.cluster_suffix)
+                    
+            # Get subgraph
+            if len(nodes) > 1:
+                subgraph = graph.subgraph(nodes)
+                node_to_degree = dict(nx.degree(subgraph, weight="weight"))
+                representative = max(node_to_degree, key=node_to_degree.get)
+            else:
+                node_to_degree = dict(zip(nodes, [np.nan]))
+                representative = list(nodes)[0]
+
+            for id_node in nodes:
+                node_to_cluster[id_node] = id_cluster
+                graph.nodes[id_node]["id_cluster"] = id_cluster
+                graph.nodes[id_node]["intra-cluster_connectivity"] = node_to_degree[id_node]
+                graph.nodes[id_node]["representative"] = id_node == representative
+
+            cluster_to_nodes[id_cluster] = set(nodes)
+        node_metadata = dict(graph.nodes(data=True))
 
     # Read in fasta
     if opts.fasta:
@@ -137,99 +432,6 @@ def main(args=None):
         assert set(id_to_sequence.keys()) >= identifiers, "Not all of the sequences in --input are available in --fasta.  Either add the sequences to --fasta file or remove --fasta argument."
         os.makedirs(opts.output_fasta_directory, exist_ok=True)
 
-    # Construct graph
-    graph = nx.Graph()
-
-    # Unweighted
-    if df_edgelist.shape[1] == 2:
-        for i, (id_query, id_target) in tqdm(df_edgelist.iterrows(), "Reading edgelist: {}".format(opts.input), total=df_edgelist.shape[0]):
-            if {id_query, id_target}.issubset(all_identifiers):
-                graph.add_edge(id_query, id_target, weight=1)
-        if not opts.no_singletons:
-            for id in all_identifiers:
-                if id not in graph.nodes():
-                    graph.add_edge(id, id, weight=np.nan)
-
-    # Weighted
-    if df_edgelist.shape[1] == 3:
-        for i, (id_query, id_target, w) in tqdm(df_edgelist.iterrows(), "Reading edgelist with weights (≥ {}): {}".format(opts.threshold, opts.input), total=df_edgelist.shape[0]):
-            if w >= opts.threshold:
-                if {id_query, id_target}.issubset(all_identifiers):
-                    graph.add_edge(id_query, id_target, weight=w)
-        if not opts.no_singletons:
-            for id in all_identifiers:
-                if id not in graph.nodes():
-                    graph.add_edge(id, id, weight=np.nan)
-
-    # Weighted with alignment fraction
-    if df_edgelist.shape[1] == 4:
-        for i, (id_query, id_target, w1, w2) in tqdm(df_edgelist.iterrows(), "Reading edgelist with weights (≥ {}) and weights2 (≥ {}): {}".format(opts.threshold, opts.threshold2, opts.input), total=df_edgelist.shape[0]):
-            if all([
-                w1 >= opts.threshold,
-                w2 >= opts.threshold2,
-                ]):
-                if {id_query, id_target}.issubset(all_identifiers):
-                    graph.add_edge(id_query, id_target, weight=w1, weight2=w2)
-        if not opts.no_singletons:
-            for id in all_identifiers:
-                if id not in graph.nodes():
-                    graph.add_edge(id, id, weight=np.nan, weight2=np.nan)
-                    
-    # Weighted with alignment fraction
-    if df_edgelist.shape[1] == 5:
-        if opts.af_mode == "relaxed":
-            for i, (id_query, id_target, w, af_ref, af_query) in tqdm(df_edgelist.iterrows(), "Reading edgelist with weights (≥ {}) and alignment fractions (≥ {}) using {} mode: {}".format(opts.threshold, opts.minimum_af, opts.af_mode, opts.input), total=df_edgelist.shape[0]):
-                if all([
-                    w >= opts.threshold,
-                    max([af_ref, af_query]) >= opts.minimum_af,
-                    ]):
-                    if {id_query, id_target}.issubset(all_identifiers):
-                        graph.add_edge(id_query, id_target, weight=w, alignment_fraction_reference=af_ref, alignment_fraction_query=af_query)
-                        
-        if opts.af_mode == "strict":
-            for i, (id_query, id_target, w, af_ref, af_query) in tqdm(df_edgelist.iterrows(), "Reading edgelist with weights (≥ {}) and alignment fractions (≥ {}) using {} mode: {}".format(opts.threshold, opts.minimum_af, opts.af_mode, opts.input), total=df_edgelist.shape[0]):
-                if all([
-                    w >= opts.threshold,
-                    af_ref >= opts.minimum_af,
-                    af_query >= opts.minimum_af,
-                    ]):
-                    if {id_query, id_target}.issubset(all_identifiers):
-                        graph.add_edge(id_query, id_target, weight=w, alignment_fraction_reference=af_ref, alignment_fraction_query=af_query)
-                        
-        if not opts.no_singletons:
-            for id in all_identifiers:
-                if id not in graph.nodes():
-                    graph.add_edge(id, id, weight=np.nan, alignment_fraction=100.0)
-            
-    # Get connected components
-    node_to_cluster = dict()
-    cluster_to_nodes = dict()
-
-    for i, nodes in tqdm(enumerate(sorted(nx.connected_components(graph), key=len, reverse=True), start=1), "Organizing clusters", unit=" clusters"):
-        id_cluster = generate_unique_cluster_base_label(nodes=nodes, mode=opts.cluster_label_mode, index=i, cluster_prefix_zfill=opts.cluster_prefix_zfill)
-
-        # Add cluster prefix and suffix
-        if bool(opts.cluster_prefix):
-            id_cluster =  "{}{}".format(opts.cluster_prefix, id_cluster)
-        if bool(opts.cluster_suffix):
-            id_cluster =  "{}{}".format(id_cluster, opts.cluster_suffix)
-                    
-        # Get subgraph
-        if len(nodes) > 1:
-            subgraph = graph.subgraph(nodes)
-            node_to_degree = dict(nx.degree(subgraph, weight="weight"))
-            representative = max(node_to_degree, key=node_to_degree.get)
-        else:
-            node_to_degree = dict(zip(nodes, [np.nan]))
-            representative = list(nodes)[0]
-
-        for id_node in nodes:
-            node_to_cluster[id_node] = id_cluster
-            graph.nodes[id_node]["id_cluster"] = id_cluster
-            graph.nodes[id_node]["intra-cluster_connectivity"] = node_to_degree[id_node]
-            graph.nodes[id_node]["representative"] = id_node == representative
-
-        cluster_to_nodes[id_cluster] = set(nodes)
     node_to_cluster = pd.Series(node_to_cluster, name="Clusters")
     node_to_cluster.to_frame().to_csv(opts.output, sep="\t", header=None)
 
@@ -250,13 +452,13 @@ def main(args=None):
             f_representatives = open("{}".format(opts.export_representatives), "w")
 
         print("id_node", "id_cluster", "intra-cluster_connectivity", "representative", sep="\t", file=f_representatives)
-        for id_node, node_metadata in graph.nodes(data=True):
-            k = node_metadata["intra-cluster_connectivity"]
+        for id_node, metadata in node_metadata.items():
+            k = metadata["intra-cluster_connectivity"]
             print(
                 id_node, 
-                node_metadata["id_cluster"], 
+                metadata["id_cluster"], 
                 k if pd.notnull(k) else "", 
-                node_metadata["representative"], 
+                metadata["representative"], 
                 sep="\t", 
                 file=f_representatives,
             )
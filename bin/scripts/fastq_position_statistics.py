@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 from __future__ import print_function, division
 import sys, os, argparse, glob, gzip
+from multiprocessing import Pool, cpu_count
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
@@ -9,54 +10,130 @@ from Bio.SeqIO.QualityIO import FastqGeneralIterator
 
 pd.options.display.max_colwidth = 100
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2023.5.23"
-
-def statistics(fp, phred, length_mode):
-    # Build table
-    quality_table = list()
-    failed_reads = list()
-    
-    lengths = list()
-    # for id,seq,quality in tqdm(pyfastx.Fastq(fp, build_index=False), desc="Reading fastq filepath: {}".format(fp), unit=" read"):
+__version__ = "2026.10.18"
+
+# Quality characters are binned over the printable Phred alphabet (! to ~)
+MINIMUM_QUALITY_CHARACTER = 33
+NUMBER_OF_QUALITY_CHARACTERS = 94
+
+def update_quality_histogram(histogram:np.ndarray, qualities:list):
+    """
+    Add a chunk of quality strings to a (positions, 94) histogram of counts.
+    Qualities are decoded as bytes in a single vectorized pass per chunk.
+    Returns the histogram (reallocated if a longer read was observed).
+    """
+    if not qualities:
+        return histogram
+    lengths = np.fromiter(map(len, qualities), dtype=np.int64, count=len(qualities))
+    values = np.frombuffer("".join(qualities).encode("ascii"), dtype=np.uint8).astype(np.int64) - MINIMUM_QUALITY_CHARACTER
+    if values.size and ((values.min() < 0) or (values.max() >= NUMBER_OF_QUALITY_CHARACTERS)):
+        raise ValueError("Quality characters must be in the printable Phred range [!-~]")
+
+    # Position of each character within its read
+    starts = np.cumsum(lengths) - lengths
+    positions = np.arange(values.size, dtype=np.int64) - np.repeat(starts, lengths)
+
+    maximum_length = max(histogram.shape[0], int(lengths.max()))
+    if maximum_length > histogram.shape[0]:
+        histogram = np.vstack([histogram, np.zeros((maximum_length - histogram.shape[0], NUMBER_OF_QUALITY_CHARACTERS), dtype=np.int64)])
+    histogram += np.bincount(positions * NUMBER_OF_QUALITY_CHARACTERS + values, minlength=maximum_length * NUMBER_OF_QUALITY_CHARACTERS).reshape(maximum_length, NUMBER_OF_QUALITY_CHARACTERS)
+    return histogram
+
+def get_quality_histogram(fp, subsample:int=None, random_state:int=0, chunksize:int=100000, progress:bool=True):
+    """
+    Stream a fastq[.gz] file into a per-position histogram over the Phred alphabet.
+    If `subsample` is set, a reservoir of that many reads (Algorithm R) is used instead of all reads.
+    Returns (histogram, minimum_length, number_of_reads)
+    """
+    histogram = np.zeros((0, NUMBER_OF_QUALITY_CHARACTERS), dtype=np.int64)
+    minimum_length = None
+    number_of_reads = 0
+
+    chunk = list()
+    random_state = np.random.RandomState(random_state)
     file_open_function = {True:gzip.open, False:open}[fp.endswith(".gz")]
     with file_open_function(fp, "rt") as f:
-        for id,seq,quality in tqdm(FastqGeneralIterator(f), desc="Reading fastq filepath: {}".format(fp), unit=" read"):
-            try:
-                quality = np.asarray(list(map(lambda q: ord(q) - phred, quality)))#.astype(int)
-                quality_table.append(quality)
-                lengths.append(len(seq))
-            except UnicodeDecodeError as e:
-                failed_reads.append(id)
-
-    n = len(quality_table)
-    if length_mode == "longest":
-        m = max(lengths)
-        A = np.empty((n, m))
-        A[:] = np.nan
-
-        for i, row in enumerate(quality_table):
-            A[i,:len(row)] = row
+        for id, seq, quality in tqdm(FastqGeneralIterator(f), desc="Reading fastq filepath: {}".format(fp), unit=" read", disable=not progress):
+            if subsample:
+                if number_of_reads < subsample:
+                    chunk.append(quality)
+                else:
+                    j = random_state.randint(0, number_of_reads + 1)
+                    if j < subsample:
+                        chunk[j] = quality
+            else:
+                chunk.append(quality)
+                if len(chunk) >= chunksize:
+                    histogram = update_quality_histogram(histogram, chunk)
+                    chunk = list()
+            number_of_reads += 1
+            if subsample is None:
+                length = len(quality)
+                if (minimum_length is None) or (length < minimum_length):
+                    minimum_length = length
+
+    if subsample:
+        number_of_reads = len(chunk)
+        if chunk:
+            minimum_length = min(map(len, chunk))
+        for i in range(0, len(chunk), chunksize):
+            histogram = update_quality_histogram(histogram, chunk[i:i + chunksize])
+    else:
+        histogram = update_quality_histogram(histogram, chunk)
 
+    return histogram, minimum_length, number_of_reads
+
+def get_histogram_quantiles(histogram:np.ndarray, values:np.ndarray, q:float):
+    """
+    Exact quantiles (linear interpolation as in np.quantile) for each position of a histogram
+    """
+    counts = histogram.sum(axis=1)
+    cumulative_counts = np.cumsum(histogram, axis=1)
+    h = (counts - 1) * q
+    lower = np.floor(h).astype(np.int64)
+    upper = np.ceil(h).astype(np.int64)
+    # Value of the k-th (0-indexed) order statistic is the first bin where the cumulative count exceeds k
+    lower_values = values[(cumulative_counts > lower[:,np.newaxis]).argmax(axis=1)]
+    upper_values = values[(cumulative_counts > upper[:,np.newaxis]).argmax(axis=1)]
+    quantiles = lower_values + (h - lower) * (upper_values - lower_values)
+    quantiles[counts == 0] = np.nan
+    return quantiles
+
+def statistics_from_histogram(histogram:np.ndarray, phred:int, length_mode:str, minimum_length:int=None):
     if length_mode == "shortest":
-        m =  min(lengths)
-        A = np.empty((n,m))
-        A[:] = np.nan
-
-        for i, row in enumerate(quality_table):
-            A[i,:m] = row[:m]
-
-    df_minmeanmax = pd.DataFrame([
-        pd.Series(np.nanmin(A, axis=0), name="min"),
-        pd.Series(np.nanmean(A, axis=0), name="mean"),
-        pd.Series(np.nanmax(A, axis=0), name="max"),
-    ]).T
-    df_quantiles = pd.DataFrame(np.quantile(A, q=[0.25,0.5,0.75], axis=0).T, columns = ["q=0.25", "q=0.5", "q=0.75"])
-    df_output = pd.concat([df_minmeanmax, df_quantiles], axis=1)
+        histogram = histogram[:minimum_length or 0]
+
+    values = np.arange(NUMBER_OF_QUALITY_CHARACTERS) + MINIMUM_QUALITY_CHARACTER - phred
+    counts = histogram.sum(axis=1)
+    detected = histogram > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        df_output = pd.DataFrame({
+            "min":np.where(counts > 0, values[detected.argmax(axis=1)], np.nan),
+            "mean":(histogram * values).sum(axis=1)/counts,
+            "max":np.where(counts > 0, values[NUMBER_OF_QUALITY_CHARACTERS - 1 - detected[:,::-1].argmax(axis=1)], np.nan),
+            "q=0.25":get_histogram_quantiles(histogram, values, 0.25),
+            "q=0.5":get_histogram_quantiles(histogram, values, 0.5),
+            "q=0.75":get_histogram_quantiles(histogram, values, 0.75),
+        })
     df_output.index = df_output.index.values + 1
     df_output.index.name = "position"
 
     return df_output
 
+def statistics(fp, phred, length_mode, subsample=None, random_state=0, chunksize=100000, progress=True):
+    histogram, minimum_length, number_of_reads = get_quality_histogram(fp, subsample=subsample, random_state=random_state, chunksize=chunksize, progress=progress)
+    return statistics_from_histogram(histogram, phred=phred, length_mode=length_mode, minimum_length=minimum_length)
+
+def statistics_for_filepaths(filepaths:list, phred:int, length_mode:str, subsample:int=None, random_state:int=0, chunksize:int=100000, n_jobs:int=1):
+    """
+    Statistics for each fastq file (in input order) using a process pool when n_jobs > 1
+    """
+    args = [(fp, phred, length_mode, subsample, random_state, chunksize, n_jobs == 1) for fp in filepaths]
+    if n_jobs > 1:
+        with Pool(min(n_jobs, len(filepaths))) as pool:
+            return pool.starmap(statistics, args)
+    return [statistics(*a) for a in args]
+
 def main(args=None):
     # Path info
     script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
@@ -80,6 +157,10 @@ def main(args=None):
     parser.add_argument("-b","--basename",  action="store_true", help = "Output basename for multiple fastq files")
     parser.add_argument("--length_mode", default="longest", type=str, help = "{shortest, longest} [Default: longest]")
     parser.add_argument("-p", "--phred",  type=int, default=33, help = "Phred offset [Default: 33]")
+    parser.add_argument("-j", "--n_jobs",  type=int, default=1, help = "Number of fastq files to process in parallel.  Use -1 for all available threads [Default: 1]")
+    parser.add_argument("-s", "--subsample",  type=int, help = "Use a uniform random subsample (reservoir) of this many reads per fastq file instead of all reads")
+    parser.add_argument("--random_state",  type=int, default=0, help = "Random state for --subsample [Default: 0]")
+    parser.add_argument("--chunksize",  type=int, default=100000, help = "Number of reads decoded per vectorized chunk [Default: 100000]")
 
     # parser.add_argument("-r","--retain_index",  action="store_true", help = "Keep fastq index created by `pyfastx`")
 
@@ -91,29 +172,37 @@ def main(args=None):
     # Checks 
     assert opts.phred in {33,64}, "--phred must be either 33 or 64. The following is invalid: {}".format(opts.phred)
     assert opts.length_mode in {"longest", "shortest"}, "--length_mode must be either longest or shortest"
+    if opts.n_jobs == -1:
+        opts.n_jobs = cpu_count()
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1 (or -1 to use all available threads)"
+    if opts.subsample is not None:
+        assert opts.subsample > 0, "--subsample must be > 0"
+
+    # Build stats tables
+    statistics_kws = dict(phred=opts.phred, length_mode=opts.length_mode, subsample=opts.subsample, random_state=opts.random_state, chunksize=opts.chunksize, n_jobs=opts.n_jobs)
+
     # Build stats table for single fastq file
     if len(opts.fastq_filepath) == 1:
-        df_output = statistics(opts.fastq_filepath[0], phred=opts.phred)
+        df_output = statistics_for_filepaths(opts.fastq_filepath, **statistics_kws)[0]
     else:
         # Build stats table for multiple fastq files but just pull out one column
         if opts.field:
             assert opts.field in {"min", "mean", "max", "q=0.25", "q=0.5", "q=0.75"}, "--field value is not supported.  Please choose between [min, mean, max, q=0.25, q=0.5, q=0.75] or none at all."
             field_table = dict()
-            for fp in opts.fastq_filepath:
+            for fp, df in zip(opts.fastq_filepath, statistics_for_filepaths(opts.fastq_filepath, **statistics_kws)):
                 name = fp
                 if opts.basename:
                     name = fp.split("/")[-1]
-                field_table[name] = statistics(fp, phred=opts.phred, length_mode=opts.length_mode)[opts.field]
+                field_table[name] = df[opts.field]
             df_output = pd.DataFrame(field_table)
 
         # Build stats table for multiple fastq files but include all columns (results in multiindex)
         else:
             dataframes = list()
-            for fp in opts.fastq_filepath:
+            for fp, df in zip(opts.fastq_filepath, statistics_for_filepaths(opts.fastq_filepath, **statistics_kws)):
                 name = fp
                 if opts.basename:
                     name = fp.split("/")[-1]
-                df = statistics(fp, phred=opts.phred, length_mode=opts.length_mode)
                 df.columns = df.columns.map(lambda x: (name, x))
                 dataframes.append(df)
             df_output = pd.concat(dataframes, axis=1)
@@ -1,11 +1,59 @@
 #!/usr/bin/env python
 import sys, os, glob, argparse, gzip
-from collections import defaultdict
 import pandas as pd
 from soothsayer_utils import pv, get_file_object, read_hmmer, assert_acceptable_arguments
 
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2023.4.18"
+__version__ = "2026.10.18"
+
+TBLOUT_COLUMNS = pd.MultiIndex.from_tuples(
+    list(map(lambda field: ("identifier", field), ["target_name", "target_accession", "query_name", "query_accession"])) \
+    + list(map(lambda field: ("full_sequence", field), ["e-value", "score", "bias"])) \
+    + list(map(lambda field: ("best_domain", field), ["e-value", "score", "bias"])) \
+    + list(map(lambda field: ("domain_number_estimation", field), ["exp", "reg", "clu",  "ov", "env", "dom", "rep", "inc"])) \
+    + list(map(lambda field: ("identifier", field), ["query_description"]))
+)
+
+def read_hmmer_tblout_chunks(path:str, chunksize:int):
+    """
+    Yield hmmsearch tblout records in DataFrames of `chunksize` rows with the same columns as soothsayer_utils.read_hmmer
+    """
+    if path.endswith(".gz"):
+        f = gzip.open(path, "rt")
+    else:
+        f = open(path, "r")
+    data = list()
+    number_of_chunks = 0
+    for line in f:
+        if not line.startswith("#"):
+            row = line.split()
+            data.append(row[:18] + [" ".join(row[18:])])
+            if len(data) == chunksize:
+                yield pd.DataFrame(data, columns=TBLOUT_COLUMNS)
+                number_of_chunks += 1
+                data = list()
+    f.close()
+    if data or (number_of_chunks == 0):
+        yield pd.DataFrame(data, columns=TBLOUT_COLUMNS)
+
+def filter_scores(df_tblout:pd.DataFrame, hmm_to_cutoff:pd.Series, hmm_marker_field:str, region:str):
+    """
+    Keep hits with scores ≥ the cutoff of their HMM by mapping cutoffs onto the HMM column
+    """
+    hmms = df_tblout[("identifier", "query_{}".format(hmm_marker_field))]
+    cutoffs = hmms.map(hmm_to_cutoff)
+    missing_hmms = hmms[cutoffs.isnull()]
+    assert missing_hmms.empty, "The following HMMs are missing from --scores_cutoff: {}".format(", ".join(sorted(set(missing_hmms))))
+    scores = df_tblout[(region, "score")].astype(float)
+    return df_tblout.loc[scores >= cutoffs]
+
+def get_synopsis(df_hits:pd.DataFrame):
+    """
+    Group [id_protein, id_hmm, score, e-value] hits by protein in order of first appearance
+    """
+    df_hits = df_hits.set_axis(["id_protein", "id_hmms", "scores", "e-values"], axis=1).astype({"scores":float, "e-values":float})
+    df_synopsis = df_hits.groupby("id_protein", sort=False).agg(lambda x: x.tolist())
+    return df_synopsis
 
 def main(args=None):
     # Path info
@@ -28,6 +76,7 @@ def main(args=None):
     parser.add_argument("--synopsis",  type=str, help="path/to/synopsis.tsv [id_protein]<tab>[markers]<tab>[scores]<tab>[e-values]")
     parser.add_argument("--region",  default="full_sequence", type=str, help="{full_sequence, best_domain} [Default: full_sequence]")
     parser.add_argument("--identifiers_only", action="store_true", help="Output query identifiers only")
+    parser.add_argument("--chunksize", type=int, help="Stream --hmmsearch_tblout in chunks of this many hits instead of loading the entire table into memory")
 
     # parser.add_argument("--use_hmmsearch_header", action="store_true", help="Use the original hmmsearch header instead of the multiindex version")
 
@@ -42,41 +91,51 @@ def main(args=None):
     if opts.output == "stdout":
         opts.output = sys.stdout
 
-    # Read HMMER
-    df_tblout = read_hmmer(opts.hmmsearch_tblout, program="hmmsearch", format="tblout", add_header_as_index=False)
+    if opts.chunksize is not None:
+        assert opts.chunksize > 0, "--chunksize must be > 0"
+
+    # Score cutoffs
+    hmm_to_cutoff = None
     if opts.scores_cutoff:
         hmm_to_cutoff = pd.read_csv(opts.scores_cutoff, sep="\t", index_col=0, header=None).iloc[:,0]
-        hmmsearch_filtered = list()
-        for i, row in df_tblout.iterrows():
-            id_hmm = row[("identifier", {"name":"query_name", "accession":"query_accession"}[opts.hmm_marker_field])]
-            score = float(row[(opts.region, "score")])
-            if score >= hmm_to_cutoff[id_hmm]:
-                hmmsearch_filtered.append(row)
-        df_tblout = pd.DataFrame(hmmsearch_filtered)
 
-    if opts.identifiers_only:
-        if opts.output == sys.stdout:
-            for id_hmm in sorted(set(df_tblout[("identifier", "target_name")])):
-                print(id_hmm, file=sys.stdout)
-        else:
-            with open(opts.output, "w") as f_out:
-                for id_hmm in sorted(set(df_tblout[("identifier", "target_name")])):
-                    print(id_hmm, file=f_out)
+    # Read HMMER
+    if opts.chunksize is None:
+        chunks = [read_hmmer(opts.hmmsearch_tblout, program="hmmsearch", format="tblout", add_header_as_index=False)]
     else:
-        df_tblout.to_csv(opts.output, sep="\t", index=None)
+        chunks = pv(read_hmmer_tblout_chunks(opts.hmmsearch_tblout, opts.chunksize), "Filtering hits in chunks of {}".format(opts.chunksize), unit=" chunks")
+
+    # Filter each chunk and write as they are completed
+    synopsis_fields = [("identifier", "target_name"), ("identifier", "query_{}".format(opts.hmm_marker_field)), (opts.region, "score"), (opts.region, "e-value")]
+    identifiers = set()
+    synopsis_hits = list()
+    f_out = opts.output
+    if f_out != sys.stdout:
+        f_out = open(f_out, "w")
+    for i, df_tblout in enumerate(chunks):
+        if df_tblout.empty:
+            df_tblout = pd.DataFrame(columns=TBLOUT_COLUMNS)
+        if hmm_to_cutoff is not None:
+            df_tblout = filter_scores(df_tblout, hmm_to_cutoff, opts.hmm_marker_field, opts.region)
+
+        if opts.identifiers_only:
+            identifiers.update(df_tblout[("identifier", "target_name")])
+        else:
+            df_tblout.to_csv(f_out, sep="\t", index=None, header=(i == 0))
+
+        if opts.synopsis:
+            synopsis_hits.append(df_tblout.loc[:,synopsis_fields])
+
+    if opts.identifiers_only:
+        for id_protein in sorted(identifiers):
+            print(id_protein, file=f_out)
+    if f_out != sys.stdout:
+        f_out.close()
 
     if opts.synopsis:
-        synopsis = defaultdict(lambda: defaultdict(list))
-        for i, (id_protein, id_hmm, score, e) in pv(df_tblout.loc[:,[("identifier", "target_name"), ("identifier", "query_{}".format(opts.hmm_marker_field)), (opts.region, "score"), (opts.region, "e-value")]].iterrows(), "Compiling synopsis"):
-            synopsis[id_protein]["id_hmms"].append(id_hmm)
-            synopsis[id_protein]["scores"].append(float(score))
-            synopsis[id_protein]["e-values"].append(float(e))
-        df_synopsis = pd.DataFrame(synopsis).T
-        df_synopsis.index.name = "id_protein"
+        df_synopsis = get_synopsis(pd.concat(synopsis_hits, ignore_index=True))
         df_synopsis.to_csv(opts.synopsis, sep="\t")
 
-
-    
 if __name__ == "__main__":
     main()
     
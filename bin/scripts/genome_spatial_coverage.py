@@ -2,15 +2,87 @@
 from __future__ import print_function, division
 import sys, os, argparse, glob, gzip
 from collections import OrderedDict, defaultdict
+from multiprocessing import Pool
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from Bio.SeqIO.FastaIO import SimpleFastaParser
 
 pd.options.display.max_colwidth = 100
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2022.08.17"
+__version__ = "2026.10.18"
+
+# Contig and MAG codes shared with worker processes
+_CONTIGS = None
+_CONTIG_TO_MAG_CODE = None
+_NUMBER_OF_MAGS = None
+
+def read_contig_lengths(filepath:str):
+    """
+    Read contig lengths from a .fai index or a [id_contig]<tab>[length] table (No header)
+    """
+    df = pd.read_csv(filepath, sep="\t", header=None, index_col=0, usecols=[0,1], dtype={0:str, 1:np.int64})
+    return df.iloc[:,0]
+
+def get_contig_lengths(fasta:str):
+    """
+    Get contig lengths for a fasta file from (in order of preference):
+        1. [fasta].fai index (e.g., samtools faidx)
+        2. [fasta].contig_lengths.tsv cache from a previous run
+        3. Reading the fasta file.  The lengths are then cached as [fasta].contig_lengths.tsv if the directory is writable
+    Indexes that are older than the fasta file are not used.
+    """
+    for filepath in ["{}.fai".format(fasta), "{}.contig_lengths.tsv".format(fasta)]:
+        if os.path.exists(filepath) and os.path.getmtime(filepath) >= os.path.getmtime(fasta):
+            print(" * Reading contig lengths: {}".format(filepath), file=sys.stderr)
+            return read_contig_lengths(filepath)
+
+    from Bio.SeqIO.FastaIO import SimpleFastaParser
+
+    if fasta.endswith(".gz"):
+        f_fasta = gzip.open(fasta, "rt")
+    else:
+        f_fasta = open(fasta, "r")
 
+    contig_to_length = OrderedDict()
+    for id, seq in tqdm(SimpleFastaParser(f_fasta), "Reading fasta file: {}".format(fasta)):
+        id = id.split(" ")[0]
+        contig_to_length[id] = len(seq)
+    f_fasta.close()
+    contig_to_length = pd.Series(contig_to_length, dtype=np.int64)
+
+    # Write to a temporary file in the same directory and then rename so concurrent runs never read a partial cache
+    filepath = "{}.contig_lengths.tsv".format(fasta)
+    tmp_filepath = "{}.{}.tmp".format(filepath, os.getpid())
+    try:
+        contig_to_length.to_csv(tmp_filepath, sep="\t", header=None)
+        os.replace(tmp_filepath, filepath)
+    except OSError:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+    return contig_to_length
+
+def initialize_worker(contigs:pd.Index, contig_to_mag_code:np.ndarray, number_of_mags:int):
+    global _CONTIGS, _CONTIG_TO_MAG_CODE, _NUMBER_OF_MAGS
+    _CONTIGS = contigs
+    _CONTIG_TO_MAG_CODE = contig_to_mag_code
+    _NUMBER_OF_MAGS = number_of_mags
+
+def get_mag_coverage(filepath:str):
+    """
+    Read covered bases from a samtools coverage table and sum w.r.t. MAG
+    """
+    try:
+        df = pd.read_csv(filepath, sep="\t", index_col=0, usecols=[0, 4])
+    except UnicodeDecodeError as e:
+        return filepath, "\nUnicodeDecodeError: {}\n\nDid you accidentally use a bam file instead of samtools coverage table?\n\t{}".format(e, filepath)
+    if df.columns[0] != "covbases":
+        return filepath, "\n{} is not a samtools coverage table".format(filepath)
+    indices = _CONTIGS.get_indexer(df.index.astype(str))
+    mag_codes = np.where(indices >= 0, _CONTIG_TO_MAG_CODE[indices], -1)
+    mask = mag_codes >= 0
+    mag_coverage = np.bincount(mag_codes[mask], weights=df.iloc[:,0].values[mask], minlength=_NUMBER_OF_MAGS)
+    return filepath, mag_coverage
 
 def main(args=None):
     # Path info
@@ -27,10 +99,12 @@ def main(args=None):
     # Pipeline
     parser.add_argument("coverage", type=str, nargs="+", help = "path/to/coverage[s]. One or more samtools coverage files of reads mapped to contigs.  Assumes mapped to same reference. [Required]")
     parser.add_argument("-i","--scaffolds_to_bins", type=str, required=True, help = "path/to/scaffolds_to_bins.tsv [id_scaffold]<tab>[id_bin] [Required]")
-    parser.add_argument("-f","--fasta", type=str, required=True, help = "path/to/reference.fasta.  Must contain all contigs from --scaffolds_to_bins [Required]")
+    parser.add_argument("-f","--fasta", type=str, help = "path/to/reference.fasta.  Must contain all contigs from --scaffolds_to_bins.  Lengths are read from [fasta].fai if available\nor cached in [fasta].contig_lengths.tsv after the first read [Required unless --contig_lengths]")
+    parser.add_argument("-l","--contig_lengths", type=str, help = "path/to/contig_lengths.tsv or reference.fasta.fai with [id_contig]<tab>[length] as the first 2 columns (No header).  Cannot be used with --fasta")
     parser.add_argument("-o","--output", type=str, default="stdout", help = "path/to/output [Default: stdout]")
     parser.add_argument("-b","--basename",  action="store_true", help = "Output basename for multiple bam files. Equivalent to --index_split_position -1.  Cannot use with --index_split_position [Default: path]")
     parser.add_argument("-s", "--index_split_position",  type=int, help = "Filename index split (e.g., output_directory/[id_name]/mapped.sorted.bam.cov you would choose either 1 or -2 for [id_name].   Cannot use with basename.")
+    parser.add_argument("-p", "--n_jobs", type=int, default=1, help = "Number of coverage files to read in parallel [Default: 1]")
 
     # Options
     opts = parser.parse_args()
@@ -41,72 +115,67 @@ def main(args=None):
     if opts.basename:
         assert opts.index_split_position is None, "Cannot use --basename and --index_split_position."
         opts.index_split_position = -1
+    assert bool(opts.fasta) != bool(opts.contig_lengths), "Please provide either --fasta or --contig_lengths"
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1"
 
     # Output
     if opts.output == "stdout":
-        opts.output = sys.stdout 
+        opts.output = sys.stdout
 
     # Read scaffolds to bins
-    contig_to_mag = pd.read_csv(opts.scaffolds_to_bins, sep="\t", index_col=0, header=None).iloc[:,0]
-
-    # Read fasta file
-    if opts.fasta.endswith(".gz"):
-        f_fasta = gzip.open(opts.fasta, "rt")
-    else:
-        f_fasta = open(opts.fasta, "r")
-
-    contig_to_length = dict()
-    for id, seq in tqdm(SimpleFastaParser(f_fasta), "Reading fasta file: {}".format(opts.fasta)):
-        id = id.split(" ")[0]
-        contig_to_length[id] = len(seq)
-    f_fasta.close()
+    contig_to_mag = pd.read_csv(opts.scaffolds_to_bins, sep="\t", index_col=0, header=None, dtype=str).iloc[:,0]
 
     # Contig lengths
-    contig_to_length = pd.Series(contig_to_length)
+    if opts.contig_lengths:
+        contig_to_length = read_contig_lengths(opts.contig_lengths)
+    else:
+        contig_to_length = get_contig_lengths(opts.fasta)
     assert set(contig_to_mag.index) <= set(contig_to_length.index), "Please ensure all contigs from --scaffolds_to_bins are available in --fasta"
 
-    # MAG lengths
-    mag_to_length = contig_to_length.groupby(contig_to_mag).sum()
-
-    # Read coverage files
-    if len(opts.coverage) == 1:
-        fp = opts.coverage[0]
-        # Load in covered bases
-        try:
-            contig_to_coverage = pd.read_csv(fp, sep="\t", index_col=0)["covbases"]
-        except UnicodeDecodeError as e:
-            print("\nUnicodeDecodeError: {}\nDid you accidentally use a bam file ({}) instead of samtools coverage table?".format(e, fp), file=sys.stderr)
-            sys.exit(1)
-        # Aggregate w.r.t MAG
-        mag_to_coverage = contig_to_coverage.groupby(contig_to_mag).sum()
-        # Get ratio of covered bases w.r.t MAG
-        spatial_coverage = mag_to_coverage/mag_to_length[mag_to_coverage.index]
-        # Output
-        spatial_coverage.to_csv(opts.output, sep="\t", header=None)
+    # MAG lengths with MAGs as sorted integer codes
+    mag_codes, mags = pd.factorize(contig_to_mag.values, sort=True)
+    mag_to_length = np.bincount(mag_codes, weights=contig_to_length[contig_to_mag.index].values, minlength=len(mags))
+
+    # Sample identifiers
+    filepath_to_id = OrderedDict()
+    ids = set()
+    for fp in opts.coverage:
+        if  opts.index_split_position is not None:
+            id = fp.split("/")[opts.index_split_position]
+        else:
+            id = fp
+        assert id not in ids, "{} is a duplicate.  Please ensure that there are no duplicates filenames.  Try excluding the --basename option.".format(id)
+        filepath_to_id[fp] = id
+        ids.add(id)
+
+    # Read coverage files and aggregate w.r.t MAG
+    initargs = (pd.Index(contig_to_mag.index), mag_codes, len(mags))
+    if opts.n_jobs == 1:
+        initialize_worker(*initargs)
+        results = map(get_mag_coverage, opts.coverage)
     else:
-        # Load in covered bases
-        id_to_cov = dict()
-        for fp in tqdm(opts.coverage, "Reading coverage files"):
-            if  opts.index_split_position is not None:
-                id = fp.split("/")[opts.index_split_position]
-            else:
-                id = fp
-            assert id not in id_to_cov, "{} is a duplicate.  Please ensure that there are no duplicates filenames.  Try excluding the --basename option.".format(id)
-            try:
-                id_to_cov[id] = pd.read_csv(fp, sep="\t", index_col=0)["covbases"]
-            except UnicodeDecodeError as e:
-                print("\nUnicodeDecodeError: {}\n\nDid you accidentally use a bam file instead of samtools coverage table?\n\t{}".format(e, fp), file=sys.stderr)
-                sys.exit(1)
-        df_contig_coverage = pd.DataFrame(id_to_cov).T
-
-        # Aggregate w.r.t MAG
-        df_mag_coverage = df_contig_coverage.groupby(contig_to_mag, axis=1).sum()
-
+        pool = Pool(opts.n_jobs, initializer=initialize_worker, initargs=initargs)
+        results = pool.imap(get_mag_coverage, opts.coverage)
+
+    # Rows are written as they are completed so memory is bounded by the number of MAGs instead of the number of samples
+    f_output = opts.output
+    if isinstance(f_output, str):
+        f_output = gzip.open(f_output, "wt") if f_output.endswith(".gz") else open(f_output, "w")
+    for i, (fp, mag_coverage) in enumerate(tqdm(results, "Reading coverage files", total=len(opts.coverage))):
+        if isinstance(mag_coverage, str):
+            print(mag_coverage, file=sys.stderr)
+            sys.exit(1)
         # Get ratio of covered bases w.r.t MAG
-        df_spatial_coverage = df_mag_coverage/mag_to_length[df_mag_coverage.columns].values
-
-        # Output
-        df_spatial_coverage.to_csv(opts.output, sep="\t")
+        spatial_coverage = mag_coverage/mag_to_length
+        if len(opts.coverage) == 1:
+            pd.Series(spatial_coverage, index=mags).to_csv(f_output, sep="\t", header=None)
+        else:
+            pd.DataFrame([spatial_coverage], index=[filepath_to_id[fp]], columns=mags).to_csv(f_output, sep="\t", header=(i == 0))
+    if opts.n_jobs > 1:
+        pool.close()
+        pool.join()
+    if f_output is not sys.stdout:
+        f_output.close()
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 from __future__ import print_function, division
-import sys, os, argparse, glob, shutil, time, gzip, warnings
+import sys, os, argparse, glob, shutil, time, gzip, warnings, threading, mmap
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import cpu_count
 from collections import OrderedDict, defaultdict
 
@@ -15,7 +17,7 @@ from soothsayer_utils import *
 
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.11.18"
+__version__ = "2026.10.18"
 
 def get_basename(x):
     _, fn = os.path.split(x)
@@ -25,16 +27,12 @@ def get_basename(x):
 
 def get_protein_cluster_prevalence(df_input:pd.DataFrame):
     # Read Input
-    genomes = sorted(df_input.iloc[:,0].unique())
-    clusters = sorted(df_input.iloc[:,2].unique())
+    genome_codes, genomes = pd.factorize(df_input.iloc[:,0], sort=True)
+    cluster_codes, clusters = pd.factorize(df_input.iloc[:,2], sort=True)
 
     # Create array
     A = np.zeros((len(genomes), len(clusters)), dtype=int)
-
-    for _, (id_genome, id_protein, id_cluster) in df_input.iterrows():
-        i = genomes.index(id_genome)
-        j = clusters.index(id_cluster)
-        A[i,j] += 1
+    np.add.at(A, (genome_codes, cluster_codes), 1)
 
     # Create output
     df_output = pd.DataFrame(A, index=genomes, columns=clusters)
@@ -43,6 +41,137 @@ def get_protein_cluster_prevalence(df_input:pd.DataFrame):
 
     return df_output
 
+def write_to_sequence_store(f_store, seq:str):
+    """
+    Append a sequence to a packed on-disk sequence store and return its (offset, length)
+    """
+    data = seq.encode()
+    offset = f_store.tell()
+    f_store.write(data)
+    return offset, len(data)
+
+def open_sequence_store(filepath, identifiers:pd.Index, offsets:array, lengths:array):
+    """
+    faidx-style lookup of packed sequences by identifier or position using a read-only mmap.
+    A length of -1 denotes a missing sequence.
+    """
+    data = b""
+    if os.path.getsize(filepath) > 0:
+        with open(filepath, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return {
+        "identifiers":pd.Index(identifiers),
+        "offsets":np.frombuffer(offsets, dtype=np.int64),
+        "lengths":np.frombuffer(lengths, dtype=np.int64),
+        "data":data,
+        }
+
+def remove_sequence_store(sequence_store:dict, filepath):
+    """
+    Close the mmap and delete the sequence store file once it is no longer needed
+    """
+    if isinstance(sequence_store["data"], mmap.mmap):
+        sequence_store["data"].close()
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+def get_sequence_from_store(sequence_store:dict, id_sequence=None, position:int=None):
+    if position is None:
+        position = sequence_store["identifiers"].get_loc(id_sequence)
+    length = sequence_store["lengths"][position]
+    if length < 0:
+        raise KeyError("Sequence not in store: {}".format(sequence_store["identifiers"][position]))
+    offset = sequence_store["offsets"][position]
+    return sequence_store["data"][offset:offset + length].decode()
+
+def build_genome_to_protein_index(protein_to_mag:pd.Series):
+    """
+    Group protein offsets by genome in a single pass so each genome cluster can 
+    be sliced directly instead of rescanning every protein per cluster.
+    Returns a pd.DataFrame (index=id_genome, columns=[start, end]) into the offsets array.
+    """
+    codes, genomes = pd.factorize(protein_to_mag.values)
+    offsets = np.argsort(codes, kind="stable")
+    ends = np.cumsum(np.bincount(codes, minlength=len(genomes)))
+    starts = np.concatenate([[0], ends[:-1]])
+    df_index = pd.DataFrame({"start":starts, "end":ends}, index=genomes)
+    return df_index, offsets
+
+def get_genome_cluster_protein_offsets(genomes, genome_to_protein_index:pd.DataFrame, offsets:np.ndarray):
+    # Genomes without proteins are absent from the index
+    df = genome_to_protein_index.loc[genome_to_protein_index.index.intersection(genomes)]
+    if df.empty:
+        return np.zeros(0, dtype=offsets.dtype)
+    # Sort to preserve the original protein order
+    return np.sort(np.concatenate([offsets[start:end] for start, end in df.values]))
+
+def write_genome_cluster_proteins(protein_identifiers:np.ndarray, protein_store:dict, protein_offsets:np.ndarray, identifiers_filepath, fasta_filepath):
+    # Write identifiers and sequences in a single pass
+    with open(identifiers_filepath, "w") as f_identifiers, open(fasta_filepath, "w") as f_fasta:
+        for i in protein_offsets:
+            id_protein = protein_identifiers[i]
+            print(id_protein, file=f_identifiers)
+            print(">{}\n{}".format(id_protein, get_sequence_from_store(protein_store, position=i)), file=f_fasta)
+    return len(protein_offsets)
+
+def get_protein_clustering_threads(number_of_proteins:int, n_jobs:int, proteins_per_thread:int):
+    """
+    Thread budget for a genome cluster sized to its protein count.  Genome clusters with 
+    at least `n_jobs * proteins_per_thread` proteins get all threads.
+    """
+    if proteins_per_thread <= 0:
+        return n_jobs
+    return int(min(n_jobs, max(1, np.ceil(number_of_proteins/proteins_per_thread))))
+
+def run_protein_clustering_jobs(jobs:list, n_jobs:int, f_cmds, t0:float):
+    """
+    Run genome cluster jobs concurrently without exceeding `n_jobs` threads in total.  
+    Jobs with the largest thread budgets (and most proteins) are launched first.
+    Each job is a dict with keys: [cmd, description, threads, number_of_proteins, commands_filepath, run_kws]
+    Each running job writes its own command to `commands_filepath`.
+    Returns the first failed job or None
+    """
+    condition = threading.Condition()
+    state = {"available_threads":n_jobs, "failed_job":None}
+
+    def run_job(job):
+        cmd = job["cmd"]
+        successful = False
+        try:
+            cmd.f_cmds = open(job["commands_filepath"], "w")
+            cmd.run(
+                checkpoint_message_notexists=None,
+                checkpoint_message_exists=None,
+                close_file=True,
+                **job["run_kws"],
+                )
+            successful = getattr(cmd, "returncode_", 0) == 0
+        finally:
+            with condition:
+                state["available_threads"] += job["threads"]
+                if not successful and state["failed_job"] is None:
+                    state["failed_job"] = job
+                condition.notify_all()
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        for job in sorted(jobs, key=lambda job: (job["threads"], job["number_of_proteins"]), reverse=True):
+            with condition:
+                condition.wait_for(lambda: (state["available_threads"] >= job["threads"]) or (state["failed_job"] is not None))
+                if state["failed_job"] is not None:
+                    break
+                state["available_threads"] -= job["threads"]
+            # Messages and commands.sh are written from the main thread so they are not interleaved
+            if os.path.exists(job["run_kws"]["checkpoint"]):
+                print("[Loading Checkpoint ({})] | {}".format(format_duration(t0), job["description"]), file=sys.stdout)
+            else:
+                print("[Running ({})] | {}".format(format_duration(t0), job["description"]), file=sys.stdout)
+            sys.stdout.flush()
+            print(job["cmd"].cmd, "", sep="\n", file=f_cmds)
+            f_cmds.flush()
+            executor.submit(run_job, job)
+
+    return state["failed_job"]
+
 # Set environment variables
 def add_executables_to_environment(opts):
     """
@@ -187,6 +316,7 @@ def main(args=None):
     parser_protein_clustering.add_argument("--protein_cluster_prefix_zfill", type=int, default=0, help="Cluster prefix zfill. Use 7 to match identifiers from OrthoFinder.  Use 0 to add no zfill. [Default: 0]") #7
     parser_protein_clustering.add_argument("--mmseqs2_options", type=str, default="", help="MMSEQS2 | More options (e.g. --arg 1 ) [Default: '']")
     parser_protein_clustering.add_argument("--diamond_options", type=str, default="", help="Diamond | More options (e.g. --arg 1 ) [Default: '']")
+    parser_protein_clustering.add_argument("--proteins_per_thread", type=int, default=10000, help="Protein clustering jobs for each genome cluster run concurrently with a thread budget of ceil(number_of_proteins/proteins_per_thread) capped at --n_jobs.  Genome clusters with at least n_jobs * proteins_per_thread proteins use all threads.  Use 0 to run genome clusters one at a time with --n_jobs threads each [Default: 10000]")
 
     # Pangenome
     parser_pangenome = parser.add_argument_group('Pangenome arguments')
@@ -280,11 +410,18 @@ def main(args=None):
     mag_to_sample = dict()
     scaffold_to_mag = dict()
     scaffold_to_sample = dict()
-    protein_to_orthogroup = dict()
     protein_to_mag = dict()
     protein_to_sample = dict()
-    protein_to_sequence = dict()
-    protein_to_cds = dict()
+
+    # Protein and CDS sequences are packed on disk in protein order (instead of held in memory)
+    protein_store_filepath = os.path.join(directories["intermediate"], "proteins.sequence_store")
+    cds_store_filepath = os.path.join(directories["intermediate"], "cds.sequence_store")
+    f_protein_store = open(protein_store_filepath, "wb")
+    f_cds_store = open(cds_store_filepath, "wb")
+    protein_store_offsets = array("q")
+    protein_store_lengths = array("q")
+    cds_store_offsets = array("q")
+    cds_store_lengths = array("q")
 
     for i, row in pv(df_genomes.iterrows(), "Organizing identifiers"):
         id_mag = row["id_mag"]
@@ -298,20 +435,30 @@ def main(args=None):
                 scaffold_to_sample[id_scaffold] = id_sample 
                 mag_to_numberofscaffolds[id_mag] += 1
 
+        protein_to_position = dict()
         with get_file_object(row["proteins"], "read", verbose=False) as f:
             for header, seq in SimpleFastaParser(f):
                 id_protein = header.split(" ")[0]
-                assert id_protein not in protein_to_orthogroup, "Duplicate ORF/protein identifiers are not allowed: {} from {}".format(id_protein, row["proteins"])
+                assert id_protein not in protein_to_mag, "Duplicate ORF/protein identifiers are not allowed: {} from {}".format(id_protein, row["proteins"])
                 protein_to_mag[id_protein] = id_mag
                 protein_to_sample[id_protein] = id_sample 
-                protein_to_sequence[id_protein] = seq
+                protein_to_position[id_protein] = len(protein_store_offsets)
+                offset, length = write_to_sequence_store(f_protein_store, seq)
+                protein_store_offsets.append(offset)
+                protein_store_lengths.append(length)
+                cds_store_offsets.append(-1)
+                cds_store_lengths.append(-1)
                 mag_to_numberofproteins[id_mag] += 1
 
         with get_file_object(row["cds"], "read", verbose=False) as f:
             for header, seq in SimpleFastaParser(f):
                 id_protein = header.split(" ")[0]
-                assert id_protein in protein_to_sequence, "CDS sequence identifier must be in protein fasta: {} from {}".format(id_protein, row["cds"])
-                protein_to_cds[id_protein] = seq
+                assert id_protein in protein_to_position, "CDS sequence identifier must be in protein fasta: {} from {}".format(id_protein, row["cds"])
+                offset, length = write_to_sequence_store(f_cds_store, seq)
+                cds_store_offsets[protein_to_position[id_protein]] = offset
+                cds_store_lengths[protein_to_position[id_protein]] = length
+    f_protein_store.close()
+    f_cds_store.close()
 
     mag_to_numberofscaffolds = pd.Series(mag_to_numberofscaffolds)
     mag_to_numberofproteins = pd.Series(mag_to_numberofproteins)
@@ -321,8 +468,8 @@ def main(args=None):
     scaffold_to_sample = pd.Series(scaffold_to_sample)
     protein_to_mag = pd.Series(protein_to_mag)
     protein_to_sample = pd.Series(protein_to_sample)
-    protein_to_sequence = pd.Series(protein_to_sequence)
-    protein_to_cds = pd.Series(protein_to_cds)
+    protein_store = open_sequence_store(protein_store_filepath, protein_to_mag.index, protein_store_offsets, protein_store_lengths)
+    cds_store = open_sequence_store(cds_store_filepath, protein_to_mag.index, cds_store_offsets, cds_store_lengths)
 
     # Commands
     f_cmds = open(os.path.join(opts.output_directory, "commands.sh"), "w")
@@ -472,29 +619,42 @@ def main(args=None):
     print(format_header(" * ({}) Running {}:".format(format_duration(t0), PROTEIN_CLUSTERING_ALGORITHM)), file=sys.stdout)
     mag_to_genomecluster = dict()
     protein_to_proteincluster = dict()
-    for fp in pv(glob.glob(os.path.join(directories["intermediate"], "*", "genome_clusters.tsv")), "Running {}".format(PROTEIN_CLUSTERING_ALGORITHM)):
+
+    # Index proteins by genome once for partitioning
+    t_partition = time.time()
+    genome_to_protein_index, protein_offsets_by_genome = build_genome_to_protein_index(protein_to_mag)
+    protein_identifiers = protein_to_mag.index.values
+    duration_partitioning = time.time() - t_partition
+    print(" * ({}) Indexed {} proteins from {} genomes in {:.3f} seconds".format(format_duration(t0), protein_identifiers.size, genome_to_protein_index.shape[0], duration_partitioning), file=sys.stdout)
+    protein_clustering_jobs = list()
+    for fp in pv(glob.glob(os.path.join(directories["intermediate"], "*", "genome_clusters.tsv")), "Partitioning proteins"):
         fields = fp.split("/")
         organism_type = fields[-2]
-
         mag_to_genomecluster_within_organism_type = pd.read_csv(fp, sep="\t", index_col=0, header=None).iloc[:,0]
         mag_to_genomecluster.update(mag_to_genomecluster_within_organism_type)
 
         for id_genomecluster, data in mag_to_genomecluster_within_organism_type.groupby(mag_to_genomecluster_within_organism_type):
             genomecluster_directory = os.path.join(directories["intermediate"], organism_type, "clusters", id_genomecluster)
             os.makedirs(genomecluster_directory, exist_ok=True)
-
             # Get MAGs and proteins
             mags = data.index
-            proteins = protein_to_mag[protein_to_mag.map(lambda x: x in mags)].index 
+            t_partition = time.time()
+            protein_offsets = get_genome_cluster_protein_offsets(mags, genome_to_protein_index, protein_offsets_by_genome)
             with open(os.path.join(genomecluster_directory, "genomes.list" ), "w") as f:
                 print(*sorted(mags), sep="\n", file=f)
-            with open(os.path.join(genomecluster_directory, "protein_identifiers.list"), "w") as f:
-                print(*proteins, sep="\n", file=f)
-            write_fasta(protein_to_sequence[proteins], os.path.join(genomecluster_directory, "proteins.faa" ))
+            number_of_proteins = write_genome_cluster_proteins(
+                protein_identifiers=protein_identifiers, 
+                protein_store=protein_store, 
+                protein_offsets=protein_offsets, 
+                identifiers_filepath=os.path.join(genomecluster_directory, "protein_identifiers.list"), 
+                fasta_filepath=os.path.join(genomecluster_directory, "proteins.faa" ),
+                )
+            duration_partitioning += time.time() - t_partition
 
             # Run Clustering
+            threads = get_protein_clustering_threads(number_of_proteins=number_of_proteins, n_jobs=opts.n_jobs, proteins_per_thread=opts.proteins_per_thread)
             name = "{}__{}__{}".format(PROTEIN_CLUSTERING_ALGORITHM.lower(), organism_type, id_genomecluster)
-            description = "[Program = {}] [Organism_Type = {}] [Genome_Cluster = {}]".format(PROTEIN_CLUSTERING_ALGORITHM, organism_type, id_genomecluster)
+            description = "[Program = {}] [Organism_Type = {}] [Genome_Cluster = {}] [Threads = {}]".format(PROTEIN_CLUSTERING_ALGORITHM, organism_type, id_genomecluster, threads)
 
             cmd = Command([
                 os.environ["clustering_wrapper.py"],
@@ -502,7 +662,7 @@ def main(args=None):
                 "--output_directory {}".format(genomecluster_directory),
                 "--no_singletons" if bool(opts.no_singletons) else "",
                 "--algorithm {}".format(opts.protein_clustering_algorithm),
-                "--n_jobs {}".format(opts.n_jobs),
+                "--n_jobs {}".format(threads),
                 "--minimum_identity_threshold {}".format(opts.minimum_identity_threshold),
                 "--minimum_coverage_threshold {}".format(opts.minimum_coverage_threshold),
                 "--mmseqs2_options='{}'" if bool(opts.mmseqs2_options) else "",
@@ -524,24 +684,36 @@ def main(args=None):
                 f_cmds=f_cmds,
                 )
 
-            # Run command
-            cmd.run(
-                checkpoint_message_notexists="[Running ({})] | {}".format(format_duration(t0), description),
-                checkpoint_message_exists="[Loading Checkpoint ({})] | {}".format(format_duration(t0), description),
-                write_stdout=os.path.join(directories["log"], "{}.o".format(name)),
-                write_stderr=os.path.join(directories["log"], "{}.e".format(name)),
-                write_returncode=os.path.join(directories["log"], "{}.returncode".format(name)),
-                checkpoint=os.path.join(directories["checkpoints"], name),
-                )
-            if hasattr(cmd, "returncode_"):
-                if cmd.returncode_ != 0:
-                    print("[Error] | {}".format(description), file=sys.stdout)
-                    print("Check the following files:\ncat {}".format(os.path.join(directories["log"], "{}.*".format(name))), file=sys.stdout)
-                    sys.exit(cmd.returncode_)
-
-            # Get the protein clusters
-            protein_to_proteinluster_within_organism_type = pd.read_csv(os.path.join(genomecluster_directory, "output", "protein_clusters.tsv"), sep="\t", index_col=0, header=None).iloc[:,0]
-            protein_to_proteincluster.update(protein_to_proteinluster_within_organism_type.to_dict())
+            protein_clustering_jobs.append({
+                "cmd":cmd,
+                "name":name,
+                "description":description,
+                "threads":threads,
+                "number_of_proteins":number_of_proteins,
+                "genomecluster_directory":genomecluster_directory,
+                "commands_filepath":os.path.join(directories["log"], "{}.sh".format(name)),
+                "run_kws":dict(
+                    write_stdout=os.path.join(directories["log"], "{}.o".format(name)),
+                    write_stderr=os.path.join(directories["log"], "{}.e".format(name)),
+                    write_returncode=os.path.join(directories["log"], "{}.returncode".format(name)),
+                    checkpoint=os.path.join(directories["checkpoints"], name),
+                    ),
+                })
+    print(" * ({}) Partitioned proteins into {} genome clusters in {:.3f} seconds (excluding {})".format(format_duration(t0), len(protein_clustering_jobs), duration_partitioning, PROTEIN_CLUSTERING_ALGORITHM), file=sys.stdout)
+
+    # Run command
+    t_clustering = time.time()
+    failed_job = run_protein_clustering_jobs(jobs=protein_clustering_jobs, n_jobs=opts.n_jobs, f_cmds=f_cmds, t0=t0)
+    if failed_job is not None:
+        print("[Error] | {}".format(failed_job["description"]), file=sys.stdout)
+        print("Check the following files:\ncat {}".format(os.path.join(directories["log"], "{}.*".format(failed_job["name"]))), file=sys.stdout)
+        sys.exit(getattr(failed_job["cmd"], "returncode_", 1))
+    print(" * ({}) Ran {} on {} genome clusters in {:.3f} seconds".format(format_duration(t0), PROTEIN_CLUSTERING_ALGORITHM, len(protein_clustering_jobs), time.time() - t_clustering), file=sys.stdout)
+
+    # Get the protein clusters
+    for job in protein_clustering_jobs:
+        protein_to_proteinluster_within_organism_type = pd.read_csv(os.path.join(job["genomecluster_directory"], "output", "protein_clusters.tsv"), sep="\t", index_col=0, header=None).iloc[:,0]
+        protein_to_proteincluster.update(protein_to_proteinluster_within_organism_type.to_dict())
     mag_to_genomecluster = pd.Series(mag_to_genomecluster)
     protein_to_proteincluster = pd.Series(protein_to_proteincluster)
 
@@ -640,7 +812,7 @@ def main(args=None):
 
         with open(os.path.join(directories["output"], "representative_sequences.faa"), "w") as f_representatives:
             for id_proteincluster, id_representative in pv(proteincluster_to_representative.items(), description=" * ({}) Writing protein cluster representative sequences".format(format_duration(t0)), unit="sequence", total=proteincluster_to_representative.size):
-                seq = protein_to_sequence[id_representative]
+                seq = get_sequence_from_store(protein_store, id_representative)
                 header = f"{id_proteincluster} {id_representative}"
                 print(f">{header}\n{seq}", file=f_representatives)
     
@@ -672,13 +844,13 @@ def main(args=None):
         if not opts.no_core_sequences:
             with open(os.path.join(directories["pangenome_core_sequences"], f"{id_genomecluster}.faa"), "w") as f_core:
                 for id_proteincluster, id_representative in proteincluster_to_representative[core_proteinclusters].items():
-                    seq = protein_to_sequence[id_representative]
+                    seq = get_sequence_from_store(protein_store, id_representative)
                     header = f"{id_proteincluster} {id_representative}"
                     print(f">{header}\n{seq}", file=f_core)
 
             with open(os.path.join(directories["pangenome_core_sequences"], f"{id_genomecluster}.ffn"), "w") as f_core:
                 for id_proteincluster, id_representative in proteincluster_to_representative[core_proteinclusters].items():
-                    seq = protein_to_cds[id_representative]
+                    seq = get_sequence_from_store(cds_store, id_representative)
                     header = f"{id_proteincluster} {id_representative}"
                     print(f">{header}\n{seq}", file=f_core)
 
@@ -698,6 +870,10 @@ def main(args=None):
     else:
         warnings.warn("No clusters with more than 1 genome so singleton analysis does not apply")
 
+    # Sequences are no longer needed so the sequence stores are removed instead of left in the output directory
+    remove_sequence_store(protein_store, protein_store_filepath)
+    remove_sequence_store(cds_store, cds_store_filepath)
+
     genomecluster_to_corepangenome = pd.Series(genomecluster_to_corepangenome)
     genomecluster_to_singletons = pd.Series(genomecluster_to_singletons)
 
@@ -1,12 +1,14 @@
 #!/usr/bin/env python
-import sys, os, argparse, re, gzip
+import sys, os, argparse, re, gzip, ast
 from collections import defaultdict, OrderedDict
+from itertools import chain
+from multiprocessing import Pool
 import pandas as pd
 import numpy as np
-from soothsayer_utils import read_hmmer, pv, get_file_object, assert_acceptable_arguments, format_header, flatten
+from soothsayer_utils import read_hmmer, pv, get_file_object, assert_acceptable_arguments, format_header, flatten, check_packages
 
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2025.1.15"
+__version__ = "2026.10.18"
 
 DIAMOND_HEADER_FIELDS = "qseqid sseqid stitle pident evalue bitscore qcovhsp scovhsp"
 DIAMOND_COLUMNS = list(filter(bool, DIAMOND_HEADER_FIELDS.split(" ")))
@@ -37,6 +39,41 @@ def parse_uniref(stitle):
     # Print the four fields
     return [field1, field2, field3, field4]
 
+@check_packages(["pyarrow"])
+def read_parquet_with_lists(path):
+    """
+    Read parquet tables (e.g., from convert_annotation_table_to_parquet.py) where list-typed columns 
+    are converted directly from Arrow to Python lists instead of parsing list literals
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    list_fields = [field.name for field in table.schema if pa.types.is_list(field.type)]
+    df = table.drop(list_fields).to_pandas()
+    for field in list_fields:
+        df[field] = table.column(field).to_pylist()
+    # Columns that store the pandas index (e.g., __index_level_0__ for unnamed indexes) are not data columns
+    pandas_metadata = table.schema.pandas_metadata or dict()
+    index_columns = set(filter(lambda x: isinstance(x, str), pandas_metadata.get("index_columns", list()))) | set(df.index.names)
+    return df.loc[:,[field for field in table.schema.names if field not in index_columns]]
+
+def read_annotation_table(path, list_fields):
+    """
+    Read PyHMMSearch/PyKofamSearch tables from tsv (list literals) or parquet (list-typed columns)
+    """
+    if path.endswith(".parquet"):
+        return read_parquet_with_lists(path)
+    df = pd.read_csv(path, sep="\t", index_col=0)
+    if not df.empty:
+        for field in list_fields:
+            df[field] = df[field].map(ast.literal_eval)
+    return df
+
+@check_packages(["pyarrow"])
+def write_annotations_to_parquet(df_annotations, path):
+    df_annotations.to_parquet(path, engine="pyarrow")
+
 def compile_identifiers(df):
     # Organism type
     organism_types = set(df["organism_type"])
@@ -95,6 +132,143 @@ def compile_enzymes(df):
     data = [df.shape[0], len(unique_identifiers), unique_identifiers]
     return data
 
+# ================================
+# Protein cluster consensus engine
+# ================================
+def explode_lists(groups, lists):
+    """
+    Explode a list column once into parallel (group, value) arrays
+    """
+    lengths = np.fromiter(map(len, lists), dtype=int, count=len(lists))
+    values = np.empty(lengths.sum(), dtype=object)
+    values[:] = list(chain.from_iterable(lists))
+    return np.repeat(groups, lengths), values
+
+def group_unique_values(groups, values, number_of_groups, sort_values=False):
+    """
+    Deduplicate (group, value) pairs with hash-based operations and split into one list per group.
+    Values keep their first observed order unless `sort_values=True`.
+    """
+    if number_of_groups == 0:
+        return list()
+    values = np.asarray(values, dtype=object)
+    df = pd.DataFrame({"group":np.asarray(groups, dtype=int), "value":values}).drop_duplicates()
+    if sort_values:
+        df = df.sort_values("value", kind="mergesort")
+    df = df.sort_values("group", kind="mergesort")
+    sizes = np.bincount(df["group"].values, minlength=number_of_groups)
+    return [x.tolist() for x in np.split(df["value"].values, np.cumsum(sizes)[:-1])]
+
+def get_composite_names(df_annotations, composite_name_joiner=";"):
+    """
+    Composite labels for each protein built in bulk from UniRef products, KOfam names, and Pfam names
+    """
+    number_of_proteins = df_annotations.shape[0]
+    positions = np.arange(number_of_proteins)
+    kofam_positions, kofam_names = explode_lists(positions, df_annotations[("KOfam", "names")].values)
+    pfam_positions, pfam_names = explode_lists(positions, df_annotations[("Pfam", "names")].values)
+
+    df = pd.DataFrame({
+        "group":np.concatenate([positions, kofam_positions, pfam_positions]), 
+        "value":np.concatenate([df_annotations[("UniRef", "product")].values.astype(object), kofam_names, pfam_names]),
+    })
+    df = df.loc[df["value"].map(lambda x: isinstance(x, str)).values].drop_duplicates()
+    df = df.sort_values("value", kind="mergesort")
+    protein_to_labels = df.groupby("group", sort=True)["value"].agg(composite_name_joiner.join)
+    protein_to_labels = protein_to_labels.reindex(positions).fillna("")
+    protein_to_labels.index = df_annotations.index
+    return protein_to_labels
+
+def compile_protein_cluster_consensus(df_annotations, composite_name_joiner=";"):
+    """
+    Columnar equivalent of the `compile_*` functions applied to each protein cluster.
+    Returns a list of (id_protein_cluster, fields) sorted by id_protein_cluster.
+    """
+    codes, protein_clusters = pd.factorize(df_annotations[("Identifiers", "id_protein_cluster")], sort=True)
+    number_of_clusters = len(protein_clusters)
+    clustered = codes >= 0
+
+    # Identifiers
+    data_identifiers = list()
+    for field in ["id_genome_cluster", "organism_type"]:
+        groups = group_unique_values(codes[clustered], df_annotations[("Identifiers", field)].values[clustered], number_of_clusters)
+        data_identifiers.append([x[0] if len(x) == 1 else set(x) for x in groups])
+
+    # Diamond
+    data_diamond = dict()
+    for name in ["UniRef", "MIBiG", "VFDB", "CAZy"]:
+        mask = clustered & df_annotations[name].notnull().any(axis=1).values
+        number_of_proteins = np.bincount(codes[mask], minlength=number_of_clusters)
+        identifiers = group_unique_values(codes[mask], df_annotations[(name, "sseqid")].values[mask], number_of_clusters)
+        if name == "UniRef":
+            names = group_unique_values(codes[mask], df_annotations[(name, "product")].values[mask], number_of_clusters)
+            data_diamond[name] = [[int(n), len(ids), ids, x] for n, ids, x in zip(number_of_proteins, identifiers, names)]
+        else:
+            identifiers = [set(ids) for ids in identifiers]
+            data_diamond[name] = [[int(n), len(ids), list(ids)] for n, ids in zip(number_of_proteins, identifiers)]
+
+    # PyHMMSearch, PyKOfamSearch, and Enzymes
+    data_hmms = dict()
+    for name, fields in [("Pfam", ["ids", "names"]), ("NCBIfam-AMR", ["ids"]), ("KOfam", ["ids", "names"]), ("Enzymes", ["ids"]), ("AntiFam", ["ids"])]:
+        mask = clustered & (df_annotations[(name, "number_of_hits")].values > 0)
+        number_of_proteins = np.bincount(codes[mask], minlength=number_of_clusters)
+        groups = list()
+        for field in fields:
+            groups.append(group_unique_values(*explode_lists(codes[mask], df_annotations[(name, field)].values[mask]), number_of_clusters, sort_values=True))
+        data_hmms[name] = [[int(n), len(ids), ids, *x] for n, ids, *x in zip(number_of_proteins, *groups)]
+
+    # Compile
+    output = list()
+    for i, id_protein_cluster in enumerate(protein_clusters):
+        composite_name = data_diamond["UniRef"][i][-1] + data_hmms["KOfam"][i][-1] + data_hmms["Pfam"][i][-1]
+        composite_name = list(filter(lambda x: isinstance(x, str), composite_name))
+        if len(composite_name) > 0:
+            composite_name = composite_name_joiner.join(composite_name)
+        else:
+            composite_name = np.nan
+
+        fields = [
+            data_identifiers[0][i], 
+            data_identifiers[1][i], 
+            composite_name,
+            *data_diamond["UniRef"][i],
+            *data_diamond["MIBiG"][i],
+            *data_diamond["VFDB"][i],
+            *data_diamond["CAZy"][i],
+            *data_hmms["Pfam"][i],
+            *data_hmms["NCBIfam-AMR"][i],
+            *data_hmms["KOfam"][i],
+            *data_hmms["Enzymes"][i],
+            *data_hmms["AntiFam"][i],
+        ]
+        output.append((id_protein_cluster, fields))
+    return output
+
+def format_protein_cluster_consensus(df_annotations, composite_name_joiner=";"):
+    """
+    Tab-delimited output lines from `compile_protein_cluster_consensus`.  
+    Lines are formatted where the sets are built so set-valued fields are not reordered by pickling.
+    """
+    output = list()
+    for id_protein_cluster, fields in compile_protein_cluster_consensus(df_annotations, composite_name_joiner=composite_name_joiner):
+        output.append((id_protein_cluster, "\t".join(map(str, [id_protein_cluster, *fields]))))
+    return output
+
+def format_protein_cluster_consensus_parallel(df_annotations, composite_name_joiner=";", n_jobs=1):
+    """
+    Shard protein clusters by hash and run `format_protein_cluster_consensus` on each shard in a process pool
+    """
+    codes, protein_clusters = pd.factorize(df_annotations[("Identifiers", "id_protein_cluster")], sort=True)
+    cluster_to_shard = pd.util.hash_array(np.asarray(protein_clusters, dtype=object)) % np.uint64(n_jobs)
+    protein_to_shard = np.where(codes >= 0, cluster_to_shard[codes].astype(int), -1)
+
+    shards = [df_annotations.loc[protein_to_shard == i] for i in range(n_jobs)]
+    with Pool(n_jobs) as pool:
+        results = pool.starmap(format_protein_cluster_consensus, [(df, composite_name_joiner) for df in shards])
+
+    protein_cluster_to_line = dict(chain.from_iterable(results))
+    return [(id_protein_cluster, protein_cluster_to_line[id_protein_cluster]) for id_protein_cluster in protein_clusters]
+
 
 def main(args=None):
     # Path info
@@ -128,12 +302,20 @@ def main(args=None):
     parser_optional.add_argument("-j", "--composite_name_joiner", type=str, required=False,  default=";", help = "Composite label separator [Default: ; ]")
 
     parser_optional.add_argument("-f","--fasta", type=str, required=False,  help = "path/to/gene_models.faa|ffn of ORFs [Optional]")
+    parser_optional.add_argument("--parquet", action="store_true", help = "Also write annotations.proteins.parquet with list-typed columns (requires pyarrow).  PyHMMSearch/PyKofamSearch inputs ending with .parquet are always read as parquet")
+    parser_optional.add_argument("--n_jobs", type=int, default=1, help = "Number of processes for protein cluster consensus annotations.  Protein clusters are sharded by hash. Use -1 for all available. [Default: 1]")
 
     # Options
     opts = parser.parse_args()
     opts.script_directory  = script_directory
     opts.script_filename = script_filename
 
+    # Threads
+    if opts.n_jobs == -1:
+        from multiprocessing import cpu_count 
+        opts.n_jobs = cpu_count()
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1.  To select all available threads, use -1."
+
     # Make output directories
     os.makedirs(opts.output_directory, exist_ok=True)
     print(" * Output directory:", opts.output_directory, file=sys.stderr)
@@ -229,10 +411,8 @@ def main(args=None):
     # PyHMMSearch
     # ===========
     print(" * Reading PyHMMSearch table [Pfam]: {}".format(opts.pyhmmsearch_pfam), file=sys.stderr)
-    df_hmms_pfam = pd.read_csv(opts.pyhmmsearch_pfam, sep="\t", index_col=0)
+    df_hmms_pfam = read_annotation_table(opts.pyhmmsearch_pfam, list_fields=["ids", "evalues", "scores"])
     if not df_hmms_pfam.empty:
-        for field in ["ids", "evalues", "scores"]:
-            df_hmms_pfam[field] = df_hmms_pfam[field].map(eval)
         protein_to_pfamnames = defaultdict(list)
         for id_protein, hmms in df_hmms_pfam["ids"].items():
             for id_hmm in hmms:
@@ -248,19 +428,15 @@ def main(args=None):
         print(" *!* PyHMMSearch table [Pfam] is empty", file=sys.stderr)
 
     print(" * Reading PyHMMSearch table [AMR]: {}".format(opts.pyhmmsearch_amr), file=sys.stderr)
-    df_hmms_amr = pd.read_csv(opts.pyhmmsearch_amr, sep="\t", index_col=0)
+    df_hmms_amr = read_annotation_table(opts.pyhmmsearch_amr, list_fields=["ids", "evalues", "scores"])
     if not df_hmms_amr.empty:
-        for field in ["ids", "evalues", "scores"]:
-            df_hmms_amr[field] = df_hmms_amr[field].map(eval)
         proteins = proteins | set(df_hmms_amr.index)
     else:
         print(" *!* PyHMMSearch table [AMR] is empty", file=sys.stderr)
 
     print(" * Reading PyHMMSearch table [AntiFam]: {}".format(opts.pyhmmsearch_antifam), file=sys.stderr)
-    df_hmms_antifam = pd.read_csv(opts.pyhmmsearch_antifam, sep="\t", index_col=0)
+    df_hmms_antifam = read_annotation_table(opts.pyhmmsearch_antifam, list_fields=["ids", "evalues", "scores"])
     if not df_hmms_antifam.empty:
-        for field in ["ids", "evalues", "scores"]:
-            df_hmms_antifam[field] = df_hmms_antifam[field].map(eval)
         proteins = proteins | set(df_hmms_antifam.index)
     else:
         print(" *!* PyHMMSearch table [AntiFam] is empty", file=sys.stderr)
@@ -269,24 +445,18 @@ def main(args=None):
     # PyKOfamSearch
     # ===========
     print(" * Reading PyKofamSearch table [KEGG]: {}".format(opts.pykofamsearch), file=sys.stderr)
-    df_hmms_kofam = pd.read_csv(opts.pykofamsearch, sep="\t", index_col=0)
+    df_hmms_kofam = read_annotation_table(opts.pykofamsearch, list_fields=["ids", "names", "evalues", "scores", "enzyme_commissions"])
     # Process enzymes
     df_enzymes = df_hmms_kofam.pop("enzyme_commissions").to_frame("ids")
 
     if not df_hmms_kofam.empty:
-        for field in ["ids", "names", "evalues", "scores"]:
-            df_hmms_kofam[field] = df_hmms_kofam[field].map(eval)
         proteins = proteins | set(df_hmms_kofam.index)
 
     else:
         print(" *!* PyKofamSearch table [KOfam] is empty", file=sys.stderr)
         
-    if not df_enzymes.empty:
-        for field in ["ids"]:
-            df_enzymes[field] = df_enzymes[field].map(eval)
-        # proteins = proteins | set(df_enzymes.index)
-
-    else:
+    # proteins = proteins | set(df_enzymes.index)
+    if df_enzymes.empty:
         print(" *!* PyKofamSearch table [Enzymes] is empty", file=sys.stderr)
 
     # All proteins
@@ -342,31 +512,9 @@ def main(args=None):
     df_annotations.index.name = "id_protein"
 
     # Composite label
-    protein_to_labels = dict()
-    for id_protein, row in pv(df_annotations.iterrows(), total=df_annotations.shape[0]):
-        labels = list()
-
-        name = row["UniRef"]["product"]
-        if name not in labels:
-            labels.append(name)
-
-        kofam_names = row["KOfam"]["names"]
-        for name in kofam_names:
-            if name not in labels:
-                labels.append(name)
-        
-        pfam_names = row["Pfam"]["names"]
-        for name in pfam_names:
-            if name not in labels:
-                labels.append(name)
+    print(" * Building composite names", file=sys.stderr)
+    protein_to_labels = get_composite_names(df_annotations, composite_name_joiner=opts.composite_name_joiner)
 
-        composite_name = sorted(filter(lambda x: isinstance(x,str), labels))
-        protein_to_labels[id_protein] =  opts.composite_name_joiner.join(composite_name)
-    protein_to_labels = pd.Series(protein_to_labels)
-
-    # if not opts.no_merge_composite_labels:
-    # protein_to_labels = protein_to_labels.map(lambda x: opts.composite_name_joiner.join(x))
-    
     df_annotations.insert(loc=0, column=("Consensus", "composite_name"), value=protein_to_labels)
 
     if opts.identifier_mapping:
@@ -375,6 +523,9 @@ def main(args=None):
         df_annotations = pd.concat([df_identifier_mapping, df_annotations], axis=1)
 
     df_annotations.to_csv(os.path.join(opts.output_directory, "annotations.proteins.tsv.gz"), sep="\t")
+    if opts.parquet:
+        print(" * Writing list-typed annotations: {}".format(os.path.join(opts.output_directory, "annotations.proteins.parquet")), file=sys.stderr)
+        write_annotations_to_parquet(df_annotations, os.path.join(opts.output_directory, "annotations.proteins.parquet"))
 
     if opts.identifier_mapping:
         with gzip.open(os.path.join(opts.output_directory, "annotations.protein_clusters.tsv.gz"), "wt") as f:
@@ -410,66 +561,14 @@ def main(args=None):
                 file=f,
                 )
             # Protein clusters
-            protein_to_proteincluster = df_annotations[("Identifiers", "id_protein_cluster")]
-            protein_cluster_annotations = list()
-            for id_protein_cluster, df in pv(df_annotations.groupby(protein_to_proteincluster), description="Compiling consensus annotations for protein clusters", total=protein_to_proteincluster.nunique(), unit=" Protein Clusters"):
-                # Identifiers
-                data_identifiers = compile_identifiers(df["Identifiers"])
-                
-                # UniRef
-                data_uniref = compile_uniref(df["UniRef"])
-                
-                # MIBiG
-                data_mibig = compile_nonuniref_diamond(df["MIBiG"])
-
-                # VFDB
-                data_vfdb = compile_nonuniref_diamond(df["VFDB"])
-
-                # CAZy
-                data_cazy = compile_nonuniref_diamond(df["CAZy"])
-
-                # Pfam
-                data_pfam = compile_pfam(df["Pfam"])
-
-                # NCBIfam-AMR
-                data_amr = compile_nonpfam_pyhmmsearch(df["NCBIfam-AMR"])
-
-                # KOfam
-                data_kofam = compile_pykofamsearch(df["KOfam"])
-                
-                # Enzymes
-                data_enzymes = compile_enzymes(df["Enzymes"])
-                
-                # AntiFam
-                data_antifam = compile_nonpfam_pyhmmsearch(df["AntiFam"])
-
-                # Composite name
-                composite_name = list()
-                composite_name += list(data_uniref[-1]) 
-                composite_name += list(data_kofam[-1]) 
-                composite_name += list(data_pfam[-1]) 
-                composite_name = list(filter(lambda x: isinstance(x, str), composite_name))
-                if len(composite_name) > 0:
-                    composite_name = opts.composite_name_joiner.join(composite_name)
-                else:
-                    composite_name = np.nan
-
-                print(
-                    id_protein_cluster, 
-                    *data_identifiers, 
-                    composite_name, 
-                    *data_uniref,
-                    *data_mibig,
-                    *data_vfdb,
-                    *data_cazy,
-                    *data_pfam,
-                    *data_amr,
-                    *data_kofam,
-                    *data_enzymes,
-                    *data_antifam,
-                    sep="\t", 
-                    file=f,
-                    )
+            print(" * Compiling consensus annotations for protein clusters", file=sys.stderr)
+            if opts.n_jobs > 1:
+                protein_cluster_annotations = format_protein_cluster_consensus_parallel(df_annotations, composite_name_joiner=opts.composite_name_joiner, n_jobs=opts.n_jobs)
+            else:
+                protein_cluster_annotations = format_protein_cluster_consensus(df_annotations, composite_name_joiner=opts.composite_name_joiner)
+
+            for id_protein_cluster, line in pv(protein_cluster_annotations, description="Writing consensus annotations for protein clusters", unit=" Protein Clusters"):
+                print(line, file=f)
                 
 if __name__ == "__main__":
     main()
@@ -1,11 +1,30 @@
 #!/usr/bin/env python
 import sys, os, glob, argparse 
 from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from sparse_utils import read_counts_to_coo, iter_dense_chunks, write_sparse_npz
+
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2022.5.12"
+__version__ = "2026.10.18"
+
+def aggregate_coo_columns(rows:np.ndarray, columns:np.ndarray, data:np.ndarray, column_to_group:pd.Series):
+    """
+    Sum columns by group (i.e., X @ M where M is the column -> group membership indicator) without densifying.
+    Columns without a group are dropped and groups are sorted (as with groupby(..., axis=1).sum()).
+    Returns (rows, columns, data, groups)
+    """
+    codes, groups = pd.factorize(column_to_group.values, sort=True)
+    number_of_groups = len(groups)
+    group_codes = codes[columns]
+    mask = group_codes >= 0
+    linear_index = rows[mask] * number_of_groups + group_codes[mask]
+    linear_index_unique, inverse = np.unique(linear_index, return_inverse=True)
+    data_aggregated = np.bincount(inverse.ravel(), weights=data[mask], minlength=linear_index_unique.size)
+    return linear_index_unique // max(number_of_groups, 1), linear_index_unique % max(number_of_groups, 1), data_aggregated, pd.Index(groups)
+
 
 def main(args=None):
     # Path info
@@ -26,6 +45,9 @@ def main(args=None):
     parser.add_argument("-o","--output_directory", type=str, help = "path/to/output_directory [Default: veba_output/counts]", default="veba_output/counts")
     parser.add_argument("-f","--format", type=str, default="tsv", help = "Output format: {tsv, csv, pickle} [Future will support feather, parquet] [Default: tsv]")
     parser.add_argument("-s","--sparse_dtype", action="store_true", help = "Use sparse dtype for pickle objects")
+    parser.add_argument("--npz", action="store_true", help = "Also write X_contigs.npz, X_mags.npz, and X_slcs.npz.  COO format readable with `scipy.sparse.load_npz` with sample and feature labels in the `index` and `columns` arrays")
+    parser.add_argument("--no_dense_output", action="store_true", help = "Do not write the --format tables (e.g., only write --npz)")
+    parser.add_argument("--chunksize", type=int, default=100, help = "Number of samples per dense chunk written to tsv or csv [Default: 100]")
 
 
     # Options
@@ -44,67 +66,62 @@ def main(args=None):
     mag_to_slc.to_frame().to_csv(os.path.join(opts.output_directory, "mag_to_slc.tsv"), sep="\t", header=None)
 
     # Merge contig counts
-    counts = dict()
-    for fp in tqdm(glob.glob(os.path.join(opts.mapping_directory, "*", "output", "counts.scaffolds.tsv.gz")), "Reading processed featureCounts outputs"):
-        id_sample = fp.split("/")[-3]
-        counts[id_sample] = pd.read_csv(fp, sep="\t", index_col=0).iloc[:,-1]
-
-    X_contigs = pd.DataFrame(counts).T
-    X_contigs.index.name = "id_sample"
-    X_contigs.columns.name = "id_contig"
-
-    X_mags = X_contigs.groupby(contig_to_mag, axis=1).sum() 
-    X_mags.index.name = "id_sample"
-    X_mags.columns.name = "id_mag"
-    
-    X_slcs = X_mags.groupby(mag_to_slc, axis=1).sum()
-    X_slcs.index.name = "id_sample"
-    X_slcs.columns.name = "id_slc"
-
-    if opts.format == "tsv":
-        fp = os.path.join(opts.output_directory, "X_contigs.tsv.gz")
-        print(f"Writing contigs counts table: {fp}")
-        X_contigs.to_csv(fp, sep="\t")
-
-        fp = os.path.join(opts.output_directory, "X_mags.tsv.gz")
-        print(f"Writing MAGs counts table: {fp}")
-        X_mags.to_csv(fp, sep="\t")
-
-        fp = os.path.join(opts.output_directory, "X_slcs.tsv.gz")
-        print(f"Writing SLCs counts table: {fp}")
-        X_slcs.to_csv(fp, sep="\t")
-
-    if opts.format == "csv":
-        fp = os.path.join(opts.output_directory, "X_contigs.csv.gz")
-        print(f"Writing contigs counts table: {fp}")
-        X_contigs.to_csv(fp, sep=",")
-
-        fp = os.path.join(opts.output_directory, "X_mags.csv.gz")
-        print(f"Writing MAGs counts table: {fp}")
-        X_mags.to_csv(fp, sep=",")
-
-        fp = os.path.join(opts.output_directory, "X_slcs.csv.gz")
-        print(f"Writing SLCs counts table: {fp}")
-        X_slcs.to_csv(fp, sep=",")
+    filepaths = glob.glob(os.path.join(opts.mapping_directory, "*", "output", "counts.scaffolds.tsv.gz"))
+    sample_ids = list(map(lambda fp: fp.split("/")[-3], filepaths))
+    rows, columns, data, contigs = read_counts_to_coo(
+        filepaths=filepaths, 
+        sample_ids=sample_ids, 
+        read_function=lambda fp: pd.read_csv(fp, sep="\t", index_col=0).iloc[:,-1], 
+        keep_zeros=True,
+        )
+    samples = pd.Index(sample_ids, name="id_sample")
+    contigs.name = "id_contig"
+
+    # Contigs missing from a sample are NaN (and summed as 0) as with pd.DataFrame(counts).T
+    missing_values = data.size < len(samples) * len(contigs)
+    integer_counts = (not missing_values) and np.allclose(data, data.astype(int))
+
+    # Aggregate with the membership indicators
+    rows_mags, columns_mags, data_mags, mags = aggregate_coo_columns(rows, columns, np.nan_to_num(data), contig_to_mag.reindex(contigs))
+    mags.name = "id_mag"
+    rows_slcs, columns_slcs, data_slcs, slcs = aggregate_coo_columns(rows_mags, columns_mags, data_mags, mag_to_slc.reindex(mags))
+    slcs.name = "id_slc"
+
+    tables = [
+        ("contigs", "X_contigs", rows, columns, data, contigs, np.nan),
+        ("MAGs", "X_mags", rows_mags, columns_mags, data_mags, mags, 0),
+        ("SLCs", "X_slcs", rows_slcs, columns_slcs, data_slcs, slcs, 0),
+    ]
+
+    if opts.npz:
+        for label, name, rows_, columns_, data_, features, fill_value in tables:
+            fp = os.path.join(opts.output_directory, "{}.npz".format(name))
+            print(f"Writing {label} sparse counts: {fp}")
+            write_sparse_npz(fp, rows=rows_, columns=columns_, data=data_, index=samples, features=features)
+
+    if opts.no_dense_output:
+        return
+
+    if opts.format in {"tsv", "csv"}:
+        sep = {"tsv":"\t", "csv":","}[opts.format]
+        for label, name, rows_, columns_, data_, features, fill_value in tables:
+            fp = os.path.join(opts.output_directory, "{}.{}.gz".format(name, opts.format))
+            print(f"Writing {label} counts table: {fp}")
+            for i, X in enumerate(iter_dense_chunks(rows_, columns_, data_, index=samples, features=features, fill_value=fill_value, chunksize=opts.chunksize)):
+                if integer_counts:
+                    X = X.astype(int)
+                X.to_csv(fp, sep=sep, header=i == 0, mode="w" if i == 0 else "a")
 
     if opts.format == "pickle":
-        fp = os.path.join(opts.output_directory, "X_contigs.pkl")
-        print(f"Writing contigs counts table: {fp}")
-        if opts.sparse_dtype:
-            X_contigs = X_contigs.astype(pd.SparseDtype("int", 0))
-        X_contigs.to_pickle(fp)
-
-        fp = os.path.join(opts.output_directory, "X_mags.pkl")
-        print(f"Writing MAGs counts table: {fp}")
-        if opts.sparse_dtype:
-            X_mags = X_mags.astype(pd.SparseDtype("int", 0))
-        X_mags.to_pickle(fp)
-
-        fp = os.path.join(opts.output_directory, "X_slcs.pkl")
-        print(f"Writing SLCs counts table: {fp}")
-        if opts.sparse_dtype:
-            X_slcs = X_slcs.astype(pd.SparseDtype("int", 0))
-        X_slcs.to_pickle(fp)
+        for label, name, rows_, columns_, data_, features, fill_value in tables:
+            fp = os.path.join(opts.output_directory, "{}.pkl".format(name))
+            print(f"Writing {label} counts table: {fp}")
+            X = pd.concat(iter_dense_chunks(rows_, columns_, data_, index=samples, features=features, fill_value=fill_value, chunksize=opts.chunksize), axis=0)
+            if integer_counts:
+                X = X.astype(int)
+            if opts.sparse_dtype:
+                X = X.astype(pd.SparseDtype("int", 0))
+            X.to_pickle(fp)
 
     # if opts.format == "feather":
     #     fp = os.path.join(opts.output_directory, "X_contigs.feather")
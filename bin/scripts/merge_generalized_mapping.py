@@ -5,8 +5,10 @@ import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from sparse_utils import read_counts_to_coo, iter_dense_chunks, write_sparse_npz
+
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2023.10.26"
+__version__ = "2026.10.18"
 
 def main(args=None):
     # Path info
@@ -31,6 +33,9 @@ def main(args=None):
     parser.add_argument("-a", "--allow_missing_values", action="store_true", help = "Allow missing values instead of filling with zeros")
     parser.add_argument("-e", "--remove_empty_features", action="store_true", help = "Remove empty features")
     parser.add_argument("--pickle", type=str, help = "path/to/pandas.pkl output")
+    parser.add_argument("--npz", type=str, help = "path/to/sparse_counts.npz output.  COO format readable with `scipy.sparse.load_npz` with sample and feature labels in the `index` and `columns` arrays")
+    parser.add_argument("--no_dense_output", action="store_true", help = "Do not write --output or --pickle (e.g., only write --npz)")
+    parser.add_argument("--chunksize", type=int, default=100, help = "Number of samples per dense chunk written to --output [Default: 100]")
     parser.add_argument("--comment", type=str, default="#", help = "Comments prefixed with this character [Default: #]")
 
 
@@ -43,30 +48,44 @@ def main(args=None):
         opts.output = sys.stdout
 
     # Merge feature counts
-    output = dict()
-    for fp in tqdm(opts.files, "Reading processed featureCounts outputs"):
-        id_sample = fp.split("/")[opts.sample_index]
-        counts = pd.read_csv(fp, sep="\t", index_col=0, header=None, comment=opts.comment).iloc[:,-1]
-        if opts.remove_empty_features:
-            counts = counts[counts > 0]
-        output[id_sample] = counts
-    X = pd.DataFrame(output).T
+    sample_ids = list(map(lambda fp: fp.split("/")[opts.sample_index], opts.files))
+    rows, columns, data, features = read_counts_to_coo(
+        filepaths=opts.files, 
+        sample_ids=sample_ids, 
+        read_function=lambda fp: pd.read_csv(fp, sep="\t", index_col=0, header=None, comment=opts.comment).iloc[:,-1],
+        remove_empty_features=opts.remove_empty_features,
+        keep_zeros=opts.allow_missing_values,
+        )
+    index = pd.Index(sample_ids, name=opts.sample_column_label)
+    features.name = opts.feature_row_label
 
-    if not opts.allow_missing_values:
-        X = X.fillna(0)
+    if opts.npz:
+        print("Writing sparse counts: {}".format(opts.npz), file=sys.stderr)
+        write_sparse_npz(opts.npz, rows=rows, columns=columns, data=data, index=index, features=features)
 
-    if np.allclose(X, X.astype(int), rtol=1e-05, atol=1e-08, equal_nan=True):
-        X = X.astype(int)
-        
-    X.index.name = opts.sample_column_label
-    X.columns.name = opts.feature_row_label
-    X.to_csv(opts.output, sep=opts.sep)
+    if not opts.no_dense_output:
+        fill_value = np.nan if opts.allow_missing_values else 0
+        integer_counts = np.allclose(data, data.astype(int), rtol=1e-05, atol=1e-08, equal_nan=True)
+        missing_values = opts.allow_missing_values and (data.size < len(index) * len(features))
+        dense_chunks = list()
+        for i, X in enumerate(iter_dense_chunks(rows, columns, data, index=index, features=features, fill_value=fill_value, chunksize=opts.chunksize)):
+            if integer_counts:
+                X = X.astype("Int64" if missing_values else int)
+            X.index.name = opts.sample_column_label
+            X.columns.name = opts.feature_row_label
+            X.to_csv(opts.output, sep=opts.sep, header=i == 0, mode="w" if i == 0 else "a")
+            if opts.pickle:
+                dense_chunks.append(X)
 
-    if opts.pickle:
-        X.to_pickle(opts.pickle)
+        if opts.pickle:
+            pd.concat(dense_chunks, axis=0).to_pickle(opts.pickle)
 
-    sparsity = (X.values == 0).ravel().mean() * 100
-    print("There are n={} samples and m={} features in the concatenated output table ({}% sparse).".format(*X.shape, sparsity), file=sys.stderr)
+    if opts.allow_missing_values:
+        number_of_zeros = np.sum(data == 0)
+    else:
+        number_of_zeros = len(index) * len(features) - data.size
+    sparsity = number_of_zeros / max(len(index) * len(features), 1) * 100
+    print("There are n={} samples and m={} features in the concatenated output table ({}% sparse).".format(len(index), len(features), sparsity), file=sys.stderr)
     
 if __name__ == "__main__":
     main()
@@ -1,11 +1,57 @@
 #!/usr/bin/env python
-import sys, os, glob, argparse 
+import sys, os, glob, argparse, gzip
+import numpy as np
 import pandas as pd
 from Bio.SeqIO.FastaIO import SimpleFastaParser
 from tqdm import tqdm
 
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2022.6.21"
+__version__ = "2026.10.18"
+
+GAP = ord("-")
+
+def read_msa(filepath:str):
+    """
+    Read a MSA fasta file as ([id_genome, ...], uint8 array of shape (n = sequences, m = alignment length)).
+    If the sequences are not the same length then the array is None.
+    """
+    msa = dict()
+    with open(filepath, "r") as f:
+        for header, seq in SimpleFastaParser(f):
+            id = header.split(" ")[0]
+            msa[id] = seq
+    ids = list(msa)
+    lengths = set(map(len, msa.values()))
+    if len(lengths) > 1:
+        return ids, None
+    length = lengths.pop() if lengths else 0
+    X = np.frombuffer("".join(msa.values()).encode("latin-1"), dtype=np.uint8).reshape(len(ids), length)
+    return ids, X
+
+def open_table(filepath:str):
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, "wt")
+    else:
+        return open(filepath, "w")
+
+def write_alignment_table(filepath:str, genomes:pd.Index, markers:list, marker_to_msa:dict, rows:np.ndarray, fill_missing:bool):
+    """
+    Stream (n = genomes, m = markers) table where each i,j is a MSA.  Missing alignments are either empty or gaps.
+    Markers with sequences of different lengths (no array) are written as empty cells.
+    """
+    with open_table(filepath) as f:
+        print("", *markers, sep="\t", file=f)
+        for i, id_genome in enumerate(genomes):
+            fields = [id_genome]
+            for j, id_marker in enumerate(markers):
+                X = marker_to_msa[id_marker]
+                if X is None:
+                    fields.append("")
+                elif rows[i,j] >= 0:
+                    fields.append(X[rows[i,j]].tobytes().decode("latin-1"))
+                else:
+                    fields.append("-"*X.shape[1] if fill_missing else "")
+            print(*fields, sep="\t", file=f)
 
 def main(args=None):
     # Path info
@@ -29,6 +75,8 @@ def main(args=None):
     parser.add_argument("--boolean_prefiltered_alignment_table", type=str,  help = "Alignment table output of (n = genomes, m = markers) where each i,j is in {0,1} as a (gzipped) tab-separated file")
     parser.add_argument("--alignment_table", type=str,  help = "Alignment table output of (n = genomes, m = markers) where each i,j is a MSA as a (gzipped) tab-separated file")
     parser.add_argument("--boolean_alignment_table", type=str,  help = "Alignment table output of (n = genomes, m = markers) where each i,j is in {0,1} as a (gzipped) tab-separated file")
+    parser.add_argument("--partition", type=str,  help = "Partition file output with marker boundaries in the merged MSA (RAxML-style, can be used with IQ-TREE -p/-q).  Format: [model], [id_marker] = [start]-[end]")
+    parser.add_argument("--partition_model", type=str, default="AA", help = "Model (or data type) for each partition in --partition [Default: AA]")
 
     # Options
     opts = parser.parse_args()
@@ -39,99 +87,89 @@ def main(args=None):
 
     # Open output file
     if opts.output == "stdout":
-        f_out = sys.stdout 
+        f_out = sys.stdout
     else:
         f_out = open(opts.output, "w")
 
-    # Get MSA for markers
+    # Get MSA for markers as uint8 arrays
     marker_to_msa = dict()
-    prefiltered_genomes = set()
+    marker_to_genomes = dict()
     for fp in tqdm(glob.glob(os.path.join(opts.msa_directory, "*.{}".format(opts.ext))), "Reading MSA files from {}".format(opts.msa_directory), unit=" files"):
         id_marker = fp.split("/")[-1][:-(len(opts.ext)+1)]
+        marker_to_genomes[id_marker], marker_to_msa[id_marker] = read_msa(fp)
+    markers = list(marker_to_msa)
 
-        msa = dict() 
-        with open(fp, "r") as f:
-            for header, seq in SimpleFastaParser(f):
-                id = header.split(" ")[0]
-                msa[id] = seq 
-        # msa = syu.read_fasta(fp, description=False)
-        msa = pd.Series(msa)
-        prefiltered_genomes |= set(msa.index)
-        marker_to_msa[id_marker] = msa
-
-
-    
-    # number_of_genomes = len(genomes)
-    # number_of_markers = len(marker_to_msa)
-    # minimum_genomes_aligned = int(opts.minimum_genomes_aligned_ratio * number_of_genomes)
-    # minimum_markers_aligned = int(opts.minimum_markers_aligned_ratio * number_of_markers)
+    # Row of each genome in each marker alignment (-1 if missing)
+    prefiltered_genomes = pd.Index(sorted(set.union(set(), *map(set, marker_to_genomes.values()))))
+    rows = np.full((len(prefiltered_genomes), len(markers)), -1, dtype=np.int64)
+    for j, id_marker in enumerate(markers):
+        genomes = marker_to_genomes[id_marker]
+        rows[prefiltered_genomes.get_indexer(genomes), j] = np.arange(len(genomes))
+    del marker_to_genomes
 
-    df_prefiltered_markers = pd.DataFrame(marker_to_msa)
     if opts.prefiltered_alignment_table:
-        df_prefiltered_markers.to_csv(opts.prefiltered_alignment_table, sep="\t")
+        write_alignment_table(opts.prefiltered_alignment_table, prefiltered_genomes, markers, marker_to_msa, rows, fill_missing=False)
     if opts.boolean_prefiltered_alignment_table:
-        df_prefiltered_markers.notnull().astype(int).to_csv(opts.boolean_prefiltered_alignment_table, sep="\t")
+        pd.DataFrame((rows >= 0).astype(int), index=prefiltered_genomes, columns=markers).to_csv(opts.boolean_prefiltered_alignment_table, sep="\t")
 
-    df_bool = df_prefiltered_markers.notnull()
-    index_genomes_filtered = df_bool.index[df_bool.mean(axis=1) >= opts.minimum_markers_aligned_ratio]
+    # Remove genomes with few markers and then markers that are under represented
+    X_bool = rows >= 0
+    mask_genomes = X_bool.mean(axis=1) >= opts.minimum_markers_aligned_ratio
     print(
-        "Removing the following genomes based on --minimum_markers_aligned_ratio {}:\n".format(opts.minimum_markers_aligned_ratio), 
-        *sorted(prefiltered_genomes - set(index_genomes_filtered)),  
+        "Removing the following genomes based on --minimum_markers_aligned_ratio {}:\n".format(opts.minimum_markers_aligned_ratio),
+        *prefiltered_genomes[~mask_genomes],
     sep="\n",
     file=sys.stderr,
     )
 
-    df_bool = df_bool.loc[index_genomes_filtered]
-    index_markers_filtered = df_bool.columns[df_bool.mean(axis=0) >= opts.minimum_genomes_aligned_ratio]
+    mask_markers = X_bool[mask_genomes].mean(axis=0) >= opts.minimum_genomes_aligned_ratio
     print(
-        "Removing the following markers based on --minimum_genomes_aligned_ratio {}:\n".format(opts.minimum_genomes_aligned_ratio), 
-        *sorted(set(marker_to_msa.keys()) - set(index_markers_filtered)),  
+        "Removing the following markers based on --minimum_genomes_aligned_ratio {}:\n".format(opts.minimum_genomes_aligned_ratio),
+        *sorted(np.asarray(markers)[~mask_markers]),
         sep="\n",
         file=sys.stderr,
     )
 
-    genomes = pd.Index(sorted(df_bool.index))
-    markers = pd.Index(sorted(df_bool.columns))
-
-    number_of_genomes = len(genomes)
-    number_of_markers = len(markers)
-
-    marker_to_msa = df_prefiltered_markers.loc[index_genomes_filtered, index_markers_filtered].to_dict()
-        
-    # # Remove low prevalence markers
-    # for id_marker, msa in tqdm(list(marker_to_msa.items()), "Removing low prevalence markers", unit = " markers"):
-    #     if len(msa) < minimum_genomes_aligned:
-    #         print("Removing marker {} because it includes only {} genomes out of the total {} genomes included in the union of all alignments. Missing the following: {}".format(id_marker, len(msa), number_of_genomes, sorted(set(genomes) - set(msa.index))), file=sys.stderr)
-    #         del marker_to_msa[id_marker]
-
-    # Fill in missing genomes for markers
-    for id_marker, msa in tqdm(marker_to_msa.items(), "Filling in missing genomes from alignment", unit = " markers"):
-        msa = pd.Series(msa).dropna()
-        lengths = msa.map(len)
-        assert lengths.nunique() == 1, "MSA fasta alignments should all be the same length: {}".format(id_marker)
-        n =  lengths.values[0]
-        marker_to_msa[id_marker] = msa.reindex(genomes).fillna("-"*n)
+    genomes = prefiltered_genomes[mask_genomes]
+    markers = [id_marker for id_marker, keep in zip(markers, mask_markers) if keep]
+    rows = rows[mask_genomes][:,mask_markers]
+    for id_marker in list(marker_to_msa):
+        if id_marker not in markers:
+            del marker_to_msa[id_marker]
+        else:
+            assert marker_to_msa[id_marker] is not None, "MSA fasta alignments should all be the same length: {}".format(id_marker)
+
+    # Marker boundaries in the merged MSA
+    lengths = np.asarray([marker_to_msa[id_marker].shape[1] for id_marker in markers], dtype=np.int64)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    if opts.partition:
+        with open(opts.partition, "w") as f_partition:
+            for id_marker, start, end in zip(markers, starts, ends):
+                print("{}, {} = {}-{}".format(opts.partition_model, id_marker, start + 1, end), file=f_partition)
 
     # Organize MSA by markers
-    print("Merging MSA from {} markers".format(len(marker_to_msa)), file=sys.stderr)
-    df_markers = pd.DataFrame(marker_to_msa)
+    print("Merging MSA from {} markers".format(len(markers)), file=sys.stderr)
     if opts.alignment_table:
-        df_markers.to_csv(opts.alignment_table, sep="\t")
+        write_alignment_table(opts.alignment_table, genomes, markers, marker_to_msa, rows, fill_missing=True)
     if opts.boolean_alignment_table:
-        df_markers.notnull().astype(int).to_csv(opts.boolean_alignment_table, sep="\t")
-    # Merge MSA
-    msa_concatenated = df_markers.apply(lambda x: "".join(x), axis=1)
+        pd.DataFrame(np.ones((len(genomes), len(markers)), dtype=int), index=genomes, columns=markers).to_csv(opts.boolean_alignment_table, sep="\t")
 
-    # Output
+    # Merge MSA into a preallocated buffer for each genome (missing markers are gaps) and write as they are completed
     print("Writing merged MSA", file=sys.stderr)
-    f_out.writelines(">{}\n{}\n".format(id, seq) for id, seq in msa_concatenated.items())
-
-    if f_out is not sys.stdout: 
+    msas = [marker_to_msa[id_marker] for id_marker in markers]
+    buffer = np.empty(ends[-1] if len(ends) else 0, dtype=np.uint8)
+    for i, id_genome in enumerate(genomes):
+        buffer[:] = GAP
+        for j, X in enumerate(msas):
+            if rows[i,j] >= 0:
+                buffer[starts[j]:ends[j]] = X[rows[i,j]]
+        f_out.write(">{}\n{}\n".format(id_genome, buffer.tobytes().decode("latin-1")))
+
+    if f_out is not sys.stdout:
         f_out.close()
-    
+
 
 if __name__ == "__main__":
     main()
-    
-                
-
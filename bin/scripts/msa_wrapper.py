@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys, os, argparse, time, subprocess, threading, math
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing import cpu_count
+
+__program__ = os.path.split(sys.argv[0])[-1]
+__version__ = "2026.10.18"
+
+def read_markers(filepath:str):
+    """
+    Read unique marker identifiers from the first column of markers.tsv (No header)
+    """
+    markers = OrderedDict()
+    with open(filepath, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                markers[line.split("\t")[0]] = None
+    return list(markers)
+
+def get_alignment_cost(filepath:str):
+    """
+    Estimate the relative cost of aligning a fasta file as the number of sequences × the number of residues
+    """
+    number_of_sequences = 0
+    number_of_residues = 0
+    with open(filepath, "r") as f:
+        for line in f:
+            if line.startswith(">"):
+                number_of_sequences += 1
+            else:
+                number_of_residues += len(line.rstrip())
+    return number_of_sequences * number_of_residues
+
+def get_threads(marker_to_cost:OrderedDict, n_jobs:int):
+    """
+    Markers that cost more than a single thread's share of the total (total / n_jobs) get enough threads to finish within that share (up to n_jobs).  All other markers use 1 thread.
+    """
+    total_cost = sum(marker_to_cost.values())
+    marker_to_threads = OrderedDict()
+    for id_marker, cost in marker_to_cost.items():
+        if total_cost > 0:
+            marker_to_threads[id_marker] = min(n_jobs, max(1, math.ceil(n_jobs * cost / total_cost)))
+        else:
+            marker_to_threads[id_marker] = 1
+    return marker_to_threads
+
+def run_marker(id_marker:str, n_threads:int, opts):
+    """
+    Align a marker with MUSCLE and trim the alignment with ClipKIT as soon as it finishes.  Returns (id_marker, returncode, output, duration).
+    """
+    cmd = "{} -{} {} -output {} {} -threads {} && {} {} -m {} -o {} {}".format(
+        opts.muscle_executable,
+        opts.alignment_algorithm,
+        os.path.join(opts.input_directory, "{}.faa".format(id_marker)),
+        os.path.join(opts.output_directory, "{}.msa".format(id_marker)),
+        opts.muscle_options,
+        n_threads,
+        opts.clipkit_executable,
+        os.path.join(opts.output_directory, "{}.msa".format(id_marker)),
+        opts.clipkit_mode,
+        os.path.join(opts.output_directory, "{}.msa.clipkit".format(id_marker)),
+        opts.clipkit_options,
+    )
+    start_time = time.time()
+    process = subprocess.run(cmd, shell=True, executable="/bin/bash", stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    duration = time.time() - start_time
+    return id_marker, process.returncode, "{}\n{}".format(cmd, process.stdout.decode(errors="replace")), duration
+
+def main(args=None):
+    # Path info
+    script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
+    script_filename = __program__
+    # Path info
+    description = """
+    Running: {} v{} via Python v{} | {}""".format(__program__, __version__, sys.version.split(" ")[0], sys.executable)
+    usage = "{} -i <markers.tsv> -a <marker_directory> -o <output_directory> -p <n_jobs>".format(__program__)
+    epilog = "Copyright 2021 Josh L. Espinoza (jespinoz@jcvi.org)"
+
+    # Parser
+    parser = argparse.ArgumentParser(description=description, usage=usage, epilog=epilog, formatter_class=argparse.RawTextHelpFormatter)
+    # Pipeline
+    parser_io = parser.add_argument_group('Required I/O arguments')
+    parser_io.add_argument("-i","--markers", type=str, required=True, help = "path/to/markers.tsv with [id_marker] as the first column (No header)")
+    parser_io.add_argument("-a","--input_directory", type=str, required=True, help = "path/to/marker_directory with [id_marker].faa files")
+    parser_io.add_argument("-o","--output_directory", type=str, required=True, help = "path/to/output_directory for [id_marker].msa and [id_marker].msa.clipkit files.  Markers that fail are reported and skipped.  Exits with an error only if all markers fail")
+
+    parser_utility = parser.add_argument_group('Utility arguments')
+    parser_utility.add_argument("-p","--n_jobs", type=int, default=1, help = "Number of threads in total.  Markers are aligned concurrently (largest first) and large markers are given more threads.  Use -1 for all available threads [Default: 1]")
+
+    parser_muscle = parser.add_argument_group('MUSCLE arguments')
+    parser_muscle.add_argument("--muscle_executable", type=str, default="muscle", help = "MUSCLE executable [Default: muscle]")
+    parser_muscle.add_argument("-A", "--alignment_algorithm", type=str,  default="align", choices={"align","super5"}, help = "MUSCLE alignment algorithm [Default: align]")
+    parser_muscle.add_argument("--muscle_options", type=str, default="", help="MUSCLE | More options (e.g. --arg 1 ) [Default: '']")
+
+    parser_clipkit = parser.add_argument_group('ClipKIT arguments')
+    parser_clipkit.add_argument("--clipkit_executable", type=str, default="clipkit", help = "ClipKIT executable [Default: clipkit]")
+    parser_clipkit.add_argument("--clipkit_mode", type=str, default="smart-gap", help="ClipKIT | Trimming mode [Default: smart-gap]")
+    parser_clipkit.add_argument("--clipkit_options", type=str, default="", help="ClipKIT | More options (e.g. --arg 1 ) [Default: '']")
+
+    # Options
+    opts = parser.parse_args()
+    opts.script_directory  = script_directory
+    opts.script_filename = script_filename
+
+    if opts.n_jobs == -1:
+        opts.n_jobs = cpu_count()
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1 (or -1 to use all available threads)"
+
+    os.makedirs(opts.output_directory, exist_ok=True)
+
+    # Markers (largest first so the longest alignments are not left until the end)
+    marker_to_cost = OrderedDict()
+    for id_marker in read_markers(opts.markers):
+        marker_to_cost[id_marker] = get_alignment_cost(os.path.join(opts.input_directory, "{}.faa".format(id_marker)))
+    marker_to_cost = OrderedDict(sorted(marker_to_cost.items(), key=lambda x: x[1], reverse=True))
+    marker_to_threads = get_threads(marker_to_cost, opts.n_jobs)
+    print(" * Aligning {} markers with {} threads in total ({} markers with > 1 thread)".format(len(marker_to_threads), opts.n_jobs, sum(n_threads > 1 for n_threads in marker_to_threads.values())), file=sys.stdout, flush=True)
+
+    # Markers are started in order once enough threads are available
+    available_threads = [opts.n_jobs]
+    condition = threading.Condition()
+    print_lock = threading.Lock()
+    failed = list()
+
+    def run_marker_with_threads(id_marker, n_threads):
+        try:
+            id_marker, returncode, output, duration = run_marker(id_marker, n_threads, opts)
+        finally:
+            with condition:
+                available_threads[0] += n_threads
+                condition.notify_all()
+        with print_lock:
+            if returncode == 0:
+                print("[Completed] [MUSCLE → ClipKIT] {} ({} threads, {} seconds)".format(id_marker, n_threads, int(duration)), file=sys.stdout, flush=True)
+            else:
+                print("[Failed] [MUSCLE → ClipKIT] {} (returncode={})\n{}".format(id_marker, returncode, output), file=sys.stdout, flush=True)
+                failed.append(id_marker)
+                # Remove partial output so the marker is not merged
+                filepath = os.path.join(opts.output_directory, "{}.msa.clipkit".format(id_marker))
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=opts.n_jobs) as executor:
+        futures = list()
+        for id_marker, n_threads in marker_to_threads.items():
+            with condition:
+                condition.wait_for(lambda: available_threads[0] >= n_threads)
+                available_threads[0] -= n_threads
+            futures.append(executor.submit(run_marker_with_threads, id_marker, n_threads))
+        for future in as_completed(futures):
+            future.result()
+    print(" * Completed {} markers in {} seconds".format(len(marker_to_threads) - len(failed), int(time.time() - start_time)), file=sys.stdout)
+
+    # Markers that failed are excluded and the remaining markers are merged.  Only exit with an error if there is nothing to merge.
+    if failed:
+        print(" * MUSCLE or ClipKIT failed for the following {} markers which will not be merged: {}".format(len(failed), ", ".join(failed)), file=sys.stderr)
+        if len(failed) == len(marker_to_threads):
+            print(" * MUSCLE or ClipKIT failed for all markers", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,138 @@
 #!/usr/bin/env python
 import sys, os, glob, argparse, gzip
-from collections import defaultdict
-import pandas as pd
+from collections import OrderedDict
+from multiprocessing import Pool
 
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2022.11.07"
+__version__ = "2026.10.18"
+
+OUTPUT_FILENAMES = {
+    "gff":("gene_models.gff", "{}.gff"),
+    "cds":("gene_models.ffn", "{}.ffn"),
+    "protein":("gene_models.faa", "{}.faa"),
+    "genome":("genome.fa", "{}.fa"),
+}
+
+def read_scaffolds_to_bins(filepath:str):
+    scaffold_to_bin = dict()
+    bins = OrderedDict()
+    with open(filepath) as f_scaffoldstobins:
+        for line in f_scaffoldstobins:
+            line = line.strip()
+            if line:
+                id_scaffold, id_bin = line.split("\t")
+                scaffold_to_bin[id_scaffold] = id_bin
+                bins[id_bin] = None
+    return scaffold_to_bin, list(bins)
+
+def get_output_filepath(output_directory:str, id_bin:str, filetype:str, separate:bool=False):
+    filename_separate, filename = OUTPUT_FILENAMES[filetype]
+    if separate:
+        return os.path.join(output_directory, id_bin, filename_separate)
+    else:
+        return os.path.join(output_directory, filename.format(id_bin))
+
+def write_to_file(handles:OrderedDict, filepath:str, text:str, max_open_files:int):
+    """
+    Append text to filepath using an LRU-bounded pool of open file handles
+    """
+    f = handles.pop(filepath, None)
+    if f is None:
+        if len(handles) >= max_open_files:
+            _, f_lru = handles.popitem(last=False)
+            f_lru.close()
+        f = open(filepath, "a")
+    handles[filepath] = f
+    f.write(text)
+
+def add_to_buffer(buffers:dict, handles:OrderedDict, filepath:str, text:str, buffer_size:int, max_open_files:int):
+    """
+    Buffer writes for each output file and flush through the file handle pool once `buffer_size` characters are reached
+    """
+    buffer = buffers.get(filepath)
+    if buffer is None:
+        buffer = buffers[filepath] = [list(), 0]
+    buffer[0].append(text)
+    buffer[1] += len(text)
+    if buffer[1] >= buffer_size:
+        write_to_file(handles, filepath, "".join(buffer[0]), max_open_files)
+        del buffers[filepath]
+
+def flush_buffers(buffers:dict, handles:OrderedDict, max_open_files:int):
+    for filepath, (texts, size) in buffers.items():
+        write_to_file(handles, filepath, "".join(texts), max_open_files)
+    buffers.clear()
+    for f in handles.values():
+        f.close()
+    handles.clear()
+
+def open_file(filepath:str):
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, "rt")
+    else:
+        return open(filepath, "r")
+
+def partition_gff(filepath:str, scaffolds_to_bins:str, output_directory:str, separate:bool, include_unbinned:bool, include_header:bool, buffer_size:int, max_open_files:int):
+    """
+    Partition GFF records by bin and stream the identifier mapping to disk
+    """
+    scaffold_to_bin, bins = read_scaffolds_to_bins(scaffolds_to_bins)
+    buffers = dict()
+    handles = OrderedDict()
+    genes = set()
+    number_of_records = 0
+    with open_file(filepath) as f_gff, open(os.path.join(output_directory,"gff_comments.txt"), "w") as f_comments, open(os.path.join(output_directory, "identifier_mapping.tsv"), "w") as f_identifiers:
+        if include_header:
+            print("id_orf", "id_contig", "id_mag", sep="\t", file=f_identifiers)
+        for line in f_gff:
+            line = line.strip()
+            if  line.startswith("#"):
+                print(line, file=f_comments)
+            else:
+                id_scaffold = line.split("\t")[0]
+                # id_gene = line.split("gene_id=")[1].replace(";","")
+                id_gene = "_".join([
+                    id_scaffold,
+                    line.split("ID=")[1].split(";")[0].split("_")[-1],
+                ])
+                id_bin = scaffold_to_bin.get(id_scaffold)
+                if id_gene not in genes:
+                    genes.add(id_gene)
+                    if id_bin is not None:
+                        print(id_gene, id_scaffold, id_bin, sep="\t", file=f_identifiers)
+                    elif include_unbinned:
+                        print(id_gene, id_scaffold, "", sep="\t", file=f_identifiers)
+                if id_bin is not None:
+                    add_to_buffer(buffers, handles, get_output_filepath(output_directory, id_bin, "gff", separate), line + "\n", buffer_size, max_open_files)
+                    number_of_records += 1
+    flush_buffers(buffers, handles, max_open_files)
+    return "gff", number_of_records
+
+def partition_fasta(filepath:str, filetype:str, scaffolds_to_bins:str, output_directory:str, separate:bool, use_mag_as_description:bool, buffer_size:int, max_open_files:int):
+    """
+    Partition CDS, protein, or genome fasta records by bin.  Gene identifiers are [id_scaffold]_[gene_number].
+    """
+    from Bio.SeqIO.FastaIO import SimpleFastaParser
+
+    scaffold_to_bin, bins = read_scaffolds_to_bins(scaffolds_to_bins)
+    buffers = dict()
+    handles = OrderedDict()
+    number_of_records = 0
+    with open_file(filepath) as f_fasta:
+        for header, seq in SimpleFastaParser(f_fasta):
+            id = header.split(" ")[0]
+            if filetype == "genome":
+                id_scaffold = id
+            else:
+                id_scaffold = "_".join(id.split("_")[:-1])
+            id_bin = scaffold_to_bin.get(id_scaffold)
+            if id_bin is not None:
+                if filetype == "genome" and use_mag_as_description:
+                    header = "{} {}".format(id_scaffold, id_bin)
+                add_to_buffer(buffers, handles, get_output_filepath(output_directory, id_bin, filetype, separate), ">{}\n{}\n".format(header, seq), buffer_size, max_open_files)
+                number_of_records += 1
+    flush_buffers(buffers, handles, max_open_files)
+    return filetype, number_of_records
 
 def main(args=None):
     # Path info
@@ -29,150 +157,59 @@ def main(args=None):
     parser.add_argument("--include_unbinned", action="store_true", help = "Include unbinned contigs from identifier_mapping.tsv")
     parser.add_argument("--include_header", action="store_true", help = "Include headers on output tables")
     parser.add_argument("-M", "--use_mag_as_description", action="store_true", help = "Include MAG identifier for each contig in fasta header description")
-
+    parser.add_argument("-p", "--n_jobs", type=int, default=4, help = "Number of input files (GFF, CDS, protein, and assembly) to partition concurrently [Default: 4]")
+    parser.add_argument("--max_open_files", type=int, default=256, help = "Maximum number of output files open at once.  Least recently used files are closed and reopened in append mode as needed [Default: 256]")
+    parser.add_argument("--buffer_size", type=int, default=65536, help = "Number of characters buffered for each output file before writing [Default: 65536]")
 
     # Options
     opts = parser.parse_args()
     opts.script_directory  = script_directory
     opts.script_filename = script_filename
 
-    # Import fasta parser
-    if opts.cds or opts.protein:
-        from Bio.SeqIO.FastaIO import SimpleFastaParser
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1"
+    assert opts.max_open_files >= 1, "--max_open_files must be ≥ 1"
 
     # Parse scaffolds to bins
-    scaffold_to_bin = dict()
-    bins = set()
     print("Parsing scaffolds to bins file: {}".format(opts.scaffolds_to_bins), file=sys.stderr)
-    with open(opts.scaffolds_to_bins) as f_scaffoldstobins:
-        for line in f_scaffoldstobins.readlines():
-            line = line.strip()
-            if line:
-                id_scaffold, id_bin = line.split("\t")
-                scaffold_to_bin[id_scaffold] = id_bin
-                bins.add(id_bin)
-
-    # Make directories and file objects
-    os.makedirs(opts.output_directory, exist_ok=True)
+    scaffold_to_bin, bins = read_scaffolds_to_bins(opts.scaffolds_to_bins)
 
-    file_objects = defaultdict(dict)
-    if opts.separate:
-        for id_bin in bins:
-            os.makedirs(os.path.join(opts.output_directory,id_bin), exist_ok=True)
-            file_objects[id_bin]["gff"] = open(os.path.join(opts.output_directory,id_bin, "gene_models.gff"),"w")
-
-            if opts.cds:
-                file_objects[id_bin]["cds"] = open(os.path.join(opts.output_directory,id_bin, "gene_models.ffn"),"w")
-            if opts.protein:
-                file_objects[id_bin]["protein"] = open(os.path.join(opts.output_directory,id_bin, "gene_models.faa"),"w")
-            if opts.fasta:
-                file_objects[id_bin]["genome"] = open(os.path.join(opts.output_directory,id_bin, "genome.fa"),"w")
-    else:
-        for id_bin in bins:
-            file_objects[id_bin]["gff"] = open(os.path.join(opts.output_directory, "{}.gff".format(id_bin)),"w")
-            if opts.cds:
-                file_objects[id_bin]["cds"] = open(os.path.join(opts.output_directory, "{}.ffn".format(id_bin)),"w")
-            if opts.protein:
-                file_objects[id_bin]["protein"] = open(os.path.join(opts.output_directory, "{}.faa".format(id_bin)),"w")
-            if opts.fasta:
-                file_objects[id_bin]["genome"] = open(os.path.join(opts.output_directory, "{}.fa".format(id_bin)),"w")
-
-    # ===
-    # GFF
-    # ===
-    print("Parsing GFF file: {}".format(opts.gff), file=sys.stderr)
-    # Parse
-    f_comments = open(os.path.join(opts.output_directory,"gff_comments.txt"), "w")
-    identifier_mapping = defaultdict(dict)
-    with open(opts.gff, "r") as f_gff:
-        for line in f_gff:
-            line = line.strip()
-            if  line.startswith("#"):
-                print(line, file=f_comments)
-            else:
-                id_scaffold = line.split("\t")[0]
-                # id_gene = line.split("gene_id=")[1].replace(";","")
-                id_gene = "_".join([ 
-                    id_scaffold,
-                    line.split("ID=")[1].split(";")[0].split("_")[-1],
-                ])
-                identifier_mapping[id_gene]["id_contig"] = id_scaffold
-                if id_scaffold in scaffold_to_bin:
-                    id_bin = scaffold_to_bin[id_scaffold]
-                    identifier_mapping[id_gene]["id_mag"] = id_bin
-                    print(line, file=file_objects[id_bin]["gff"])
-    df_identifiers = pd.DataFrame(identifier_mapping).T
-    df_identifiers.index.name = "id_orf"
-
-    if not opts.include_unbinned:
-        df_identifiers = df_identifiers.dropna(how="any", axis=0)
-
-    df_identifiers.to_csv(os.path.join(opts.output_directory, "identifier_mapping.tsv"), sep="\t", header=bool(opts.include_header))
-
-    # Close
-    f_comments.close()
-    for id_bin, files in file_objects.items():
-        files["gff"].close()
-        
-    # ===
-    # CDS
-    # ===
+    # Inputs
+    filetype_to_filepath = OrderedDict([("gff", opts.gff)])
     if opts.cds:
-        print("Parsing CDS file: {}".format(opts.cds), file=sys.stderr)
-        # Parse
-        with open(opts.cds, "r") as f_cds:
-            for header, seq in SimpleFastaParser(f_cds):
-                id_gene = header.split(" ")[0]
-                id_scaffold = "_".join(id_gene.split("_")[:-1])
-                if id_scaffold in scaffold_to_bin:
-                    id_bin = scaffold_to_bin[id_scaffold]
-                    print(">{}\n{}".format(header, seq), file=file_objects[id_bin]["cds"])
-        # Close
-        for id_bin, files in file_objects.items():
-            files["cds"].close()
-
-    # ===
-    # Protein
-    # ===
+        filetype_to_filepath["cds"] = opts.cds
     if opts.protein:
-        print("Parsing protein file: {}".format(opts.protein), file=sys.stderr)
-        # Parse
-        with open(opts.protein, "r") as f_protein:
-            for header, seq in SimpleFastaParser(f_protein):
-                id_gene = header.split(" ")[0]
-                id_scaffold = "_".join(id_gene.split("_")[:-1])
-                if id_scaffold in scaffold_to_bin:
-                    id_bin = scaffold_to_bin[id_scaffold]
-                    print(">{}\n{}".format(header, seq), file=file_objects[id_bin]["protein"])
-        # Close
-        for id_bin, files in file_objects.items():
-            files["protein"].close()
-
-    # ===
-    # Fasta
-    # ===
+        filetype_to_filepath["protein"] = opts.protein
     if opts.fasta:
-        print("Parsing assembly file: {}".format(opts.fasta), file=sys.stderr)
-        # Parse
-        with open(opts.fasta, "r") as f_assembly:
-            if opts.use_mag_as_description:
-                for header, seq in SimpleFastaParser(f_assembly):
-                    id_scaffold = header.split(" ")[0]
-                    if id_scaffold in scaffold_to_bin:
-                        id_bin = scaffold_to_bin[id_scaffold]
-                        print(">{} {}\n{}".format(id_scaffold, id_bin, seq), file=file_objects[id_bin]["genome"])
-            else:
-                for header, seq in SimpleFastaParser(f_assembly):
-                    id_scaffold = header.split(" ")[0]
-                    if id_scaffold in scaffold_to_bin:
-                        id_bin = scaffold_to_bin[id_scaffold]
-                        print(">{}\n{}".format(header, seq), file=file_objects[id_bin]["genome"])
-        # Close
-        for id_bin, files in file_objects.items():
-            files["genome"].close()
+        filetype_to_filepath["genome"] = opts.fasta
+
+    # Make directories and empty output files so bins without any records still have outputs
+    os.makedirs(opts.output_directory, exist_ok=True)
+    for id_bin in bins:
+        if opts.separate:
+            os.makedirs(os.path.join(opts.output_directory,id_bin), exist_ok=True)
+        for filetype in filetype_to_filepath:
+            open(get_output_filepath(opts.output_directory, id_bin, filetype, opts.separate), "w").close()
+
+    # Partition
+    n_jobs = min(opts.n_jobs, len(filetype_to_filepath))
+    max_open_files = max(1, opts.max_open_files // n_jobs)
+    jobs = list()
+    for filetype, filepath in filetype_to_filepath.items():
+        print("Parsing {} file: {}".format({"gff":"GFF", "cds":"CDS", "protein":"protein", "genome":"assembly"}[filetype], filepath), file=sys.stderr)
+        if filetype == "gff":
+            jobs.append((partition_gff, (filepath, opts.scaffolds_to_bins, opts.output_directory, opts.separate, opts.include_unbinned, opts.include_header, opts.buffer_size, max_open_files)))
+        else:
+            jobs.append((partition_fasta, (filepath, filetype, opts.scaffolds_to_bins, opts.output_directory, opts.separate, opts.use_mag_as_description, opts.buffer_size, max_open_files)))
+
+    if n_jobs == 1:
+        results = [func(*args) for func, args in jobs]
+    else:
+        with Pool(n_jobs) as pool:
+            results = [pool.apply_async(func, args) for func, args in jobs]
+            results = [result.get() for result in results]
 
+    for filetype, number_of_records in results:
+        print(" * Partitioned {} {} records into {} bins".format(number_of_records, filetype, len(bins)), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
-    
-                
@@ -6,7 +6,34 @@ from Bio.SeqIO.FastaIO import SimpleFastaParser
 from tqdm import tqdm
 
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.6.7"
+__version__ = "2026.10.18"
+
+def get_best_hits(df_hits:pd.DataFrame):
+    """
+    Select the hit with the lowest e-value for each (organism, marker) pair (first hit is kept for ties). 
+    Selected hits are ordered by the first appearance of each organism and then each of its markers.
+    """
+    df_hits = df_hits.copy()
+    df_hits["organism_order"] = pd.factorize(df_hits["id_organism"])[0]
+    df_hits["pair_order"] = df_hits.groupby(["id_organism", "id_marker"], sort=False).ngroup()
+    df_best = df_hits.sort_values("evalue", kind="mergesort").drop_duplicates(["id_organism", "id_marker"], keep="first")
+    return df_best.sort_values(["organism_order", "pair_order"], kind="mergesort").loc[:,["id_organism", "id_marker", "id_query", "evalue"]]
+
+def get_sequences(filepath:str, keys:set):
+    """
+    Get sequences for [id_organism]<sep>[id_protein] keys from a single streaming pass where only the selected sequences are kept in memory
+    """
+    sequences = dict()
+    if filepath.endswith(".gz"):
+        f_proteins = gzip.open(filepath, "rt")
+    else:
+        f_proteins = open(filepath, "r")
+    for header, seq in SimpleFastaParser(f_proteins):
+        id = header.split(" ")[0]
+        if id in keys:
+            sequences[id] = seq
+    f_proteins.close()
+    return sequences
 
 def main(args=None):
     # Path info
@@ -40,92 +67,51 @@ def main(args=None):
 
 
     # Get marker to query protein
-    organism_to_marker_to_evalue = defaultdict(dict)
-    organism_to_marker_to_query = defaultdict(dict)
-    markers = list()
-    
     print(" * Compiling organism query markers from PyHMMSearch results: {}".format(opts.pyhmmsearch_results), file=sys.stderr)
-    if opts.pyhmmsearch_results.endswith(".gz"):
-        f_in = gzip.open(opts.pyhmmsearch_results, "rt")
-    else:
-        f_in = open(opts.pyhmmsearch_results, "r")
-
-    if not opts.no_header:
-        next(f_in)
-    
-    for line in tqdm(f_in):
-        line = line.strip()
-        if line:
-            fields = line.split("\t")
-            id_organism, id_query = fields[0].split(opts.sep)
-            id_marker = fields[1]
-            evalue = eval(fields[7])
-
-            if id_marker not in organism_to_marker_to_query[id_organism]:
-                print(id_organism, "|", id_marker, "-->", id_query, "| E-Value = {:.1e}".format(evalue), file=sys.stdout)
-                organism_to_marker_to_query[id_organism][id_marker] = id_query
-                organism_to_marker_to_evalue[id_organism][id_marker] = evalue
-            else:
-                if evalue < organism_to_marker_to_evalue[id_organism][id_marker]:
-                    print(id_organism, "|", id_marker, "-->", id_query, "| E-Value = {:.1e}".format(evalue), "[Update] [Overriding: {}]".format(organism_to_marker_to_query[id_organism][id_marker]), file=sys.stdout)
-                    organism_to_marker_to_query[id_organism][id_marker] = id_query
-                    organism_to_marker_to_evalue[id_organism][id_marker] = evalue
-            markers.append(id_marker)
-    markers = set(markers)
-
-    f_in.close()
-   
+    try:
+        df_hits = pd.read_csv(opts.pyhmmsearch_results, sep="\t", header=None if opts.no_header else 0, usecols=[0,1,7], dtype={0:str, 1:str})
+    except pd.errors.EmptyDataError:
+        df_hits = pd.DataFrame(columns=[0,1,7])
+    df_hits.columns = ["id", "id_marker", "evalue"]
+
+    # No hits (e.g., header only) so the marker list is empty and there are no marker fasta files
+    if df_hits.empty:
+        print(" * No hits in PyHMMSearch results.  Writing empty marker list: {}".format(os.path.join(opts.output_directory, "markers.tsv")), file=sys.stderr)
+        with open(os.path.join(opts.output_directory, "markers.tsv"), "w") as f:
+            pass
+        return
+
+    df_hits["evalue"] = df_hits["evalue"].astype(float)
+    df_hits[["id_organism", "id_query"]] = df_hits["id"].str.split(opts.sep, n=1, expand=True, regex=False)
+    df_best = get_best_hits(df_hits)
+    print(" * Selected {} proteins for {} markers from {} organisms ({} hits)".format(df_best.shape[0], df_best["id_marker"].nunique(), df_best["id_organism"].nunique(), df_hits.shape[0]), file=sys.stderr)
+    del df_hits
 
     print(" * Writing marker list: {}".format(os.path.join(opts.output_directory, "markers.tsv")), file=sys.stderr)
-    marker_to_organisms = defaultdict(list)
-    marker_to_queries = defaultdict(list)
-    for id_organism, marker_to_query in organism_to_marker_to_query.items():
-        for id_marker, id_query in marker_to_query.items():
-            marker_to_organisms[id_marker].append(id_organism)
-            marker_to_queries[id_marker].append(id_query)
-    df_markers = pd.concat([ 
-        pd.Series(marker_to_organisms).to_frame("organisms"),
-        pd.Series(marker_to_queries).to_frame("proteins"),
-    ], axis=1)
+    df_markers = df_best.groupby("id_marker", sort=False).agg(organisms=("id_organism", list), proteins=("id_query", list))
+    df_markers.index.name = None
     df_markers.to_csv(os.path.join(opts.output_directory, "markers.tsv"), sep="\t", header=None)
 
-    # Create file objects
-    print(" * Creating fasta file objects for N = {} markers".format(len(markers)), file=sys.stderr)
-    files = dict()
-    if opts.gzip:
-        for id_marker in markers:
-            files[id_marker] = gzip.open(os.path.join(opts.output_directory, "{}.faa.gz".format(id_marker)), "wt")
-    else:
-        for id_marker in markers:
-            files[id_marker] = open(os.path.join(opts.output_directory, "{}.faa".format(id_marker)), "w")
-
     # Protein sequences 
     print(" * Getting query protein sequences: {}".format(opts.proteins), file=sys.stderr)
-    # organism_to_query_to_seq = defaultdict(dict) 
-    sequences = dict()
-    if opts.proteins.endswith(".gz"):
-        f_proteins = gzip.open(opts.proteins, "rt")
-    else:
-        f_proteins = open(opts.proteins, "r")
-    for header, seq in SimpleFastaParser(f_proteins):
-        header = header.split(" ")[0]
-        id_organism, id_query = header.split(opts.sep)
-        if id_query in organism_to_marker_to_query[id_organism].values():
-            sequences[(id_organism, id_query)] = seq
-            # organism_to_query_to_seq[id_organism][id_query] = seq 
-    f_proteins.close()
-
-    # Write sequences 
-    print(" * Writing protein sequences for each marker: {}".format(opts.output_directory), file=sys.stderr)
-    for id_organism, marker_to_query in organism_to_marker_to_query.items():
-        for id_marker, id_query in marker_to_query.items():
-            # seq = organism_to_query_to_seq[id_organism][id_query]
-            seq = sequences[(id_organism, id_query)]
-            header = "{}  {} {}".format(id_organism, id_marker, id_query)
-            print(">{}\n{}".format(header,seq), file=files[id_marker])
-
-    # Close files
-    for id_marker, f in files.items():
+    ids = df_best["id_organism"] + opts.sep + df_best["id_query"]
+    sequences = get_sequences(opts.proteins, set(ids))
+    missing_ids = sorted(set(ids) - set(sequences))
+    assert not missing_ids, "The following proteins are missing from --proteins: {}".format(", ".join(missing_ids[:10]))
+
+    # Write sequences (each marker fasta is buffered and written at once)
+    print(" * Writing protein sequences for N = {} markers: {}".format(df_markers.shape[0], opts.output_directory), file=sys.stderr)
+    marker_to_records = defaultdict(list)
+    for id, id_organism, id_marker, id_query in zip(ids, df_best["id_organism"], df_best["id_marker"], df_best["id_query"]):
+        header = "{}  {} {}".format(id_organism, id_marker, id_query)
+        marker_to_records[id_marker].append(">{}\n{}\n".format(header, sequences[id]))
+
+    for id_marker, records in tqdm(marker_to_records.items(), "Writing marker fasta files", unit=" markers"):
+        if opts.gzip:
+            f = gzip.open(os.path.join(opts.output_directory, "{}.faa.gz".format(id_marker)), "wt")
+        else:
+            f = open(os.path.join(opts.output_directory, "{}.faa".format(id_marker)), "w")
+        f.write("".join(records))
         f.close()
 
 if __name__ == "__main__":
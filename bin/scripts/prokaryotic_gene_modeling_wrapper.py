@@ -12,7 +12,7 @@ from soothsayer_utils import *
 
 # from tqdm import tqdm
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.8.29"
+__version__ = "2026.10.18"
 
 # Pyrodigal
 def get_pyrodigal_cmd(input_filepaths, output_filepaths, output_directory, directories, opts):
@@ -122,163 +122,78 @@ done
 
 # Pyrodigal
 def get_pyrodigal_cmd(input_filepaths, output_filepaths, output_directory, directories, opts, genetic_code):
-
+    # Genes are called in-process with gene_id attributes added and partitioned by genome in a single pass
     cmd = [
-        "cat",
-        opts.fasta,
-        "|",
-        os.environ["seqkit"],
-        "grep",
-        "-f {}".format(input_filepaths[0]),
-        ">",
-        os.path.join(directories["tmp"], "tmp.fasta"),
-
-            "&&",
-
-        # Placeholder
-        "OUTPUT_DIRECTORY={};  for ID in $(cat {}); do >$OUTPUT_DIRECTORY/$ID.faa; >$OUTPUT_DIRECTORY/$ID.ffn; >$OUTPUT_DIRECTORY/$ID.gff; done".format(output_directory, input_filepaths[1]),
-
-            "&&",
-
-        # Run analysis
-        os.environ["pyrodigal"],
-        "-p meta",
-        "-i {}".format(os.path.join(directories["tmp"], "tmp.fasta")),
-        "-g {}".format(genetic_code),
-        "-f gff",
-        "-d {}".format(os.path.join(output_directory, "{}.ffn".format(opts.basename))),
-        "-a {}".format(os.path.join(output_directory, "{}.faa".format(opts.basename))),
-        "--min-gene {}".format(opts.pyrodigal_minimum_gene_length),
-        "--min-edge-gene {}".format(opts.pyrodigal_minimum_edge_gene_length),
-        "--max-overlap {}".format(opts.pyrodigal_maximum_gene_overlap_length),
-        # "-j {}".format(opts.n_jobs),
-        ">",
-        os.path.join(directories["tmp"], "tmp.gff"),
-
-            "&&",
-
-        "cat",
-        os.path.join(directories["tmp"], "tmp.gff"),
-        "|",
-        os.environ["append_geneid_to_prodigal_gff.py"],
-        "-a gene_id",
-        ">",
-        os.path.join(output_directory, "{}.gff".format(opts.basename)),
-
-            "&&",
+        os.environ["pyrodigal_gene_calling.py"],
+        "--fasta {}".format(opts.fasta),
+        "--contigs {}".format(input_filepaths[0]),
+        "--genomes {}".format(input_filepaths[1]),
+        "--output_directory {}".format(output_directory),
+        "--n_jobs {}".format(opts.n_jobs),
+        "--mode {}".format(opts.pyrodigal_mode),
+        "--genetic_code {}".format(genetic_code),
+        "--minimum_gene_length {}".format(opts.pyrodigal_minimum_gene_length),
+        "--minimum_edge_gene_length {}".format(opts.pyrodigal_minimum_edge_gene_length),
+        "--maximum_gene_overlap_length {}".format(opts.pyrodigal_maximum_gene_overlap_length),
+        ]
 
-        "rm -rf",
-        os.path.join(directories["tmp"], "tmp.*"),
+    if opts.pyrodigal_mode == "single":
+        cmd += [
+        "--training_cache {}".format(os.path.join(output_directory, "training_cache")),
         ]
-    
+
     if opts.scaffolds_to_bins:
         cmd += [
-        # Partition the gene models and genomes
-            "&&",
-
-        os.environ["partition_gene_models.py"],
-        "-i {}".format(opts.scaffolds_to_bins),
-        # "-f {}".format(opts.fasta),
-        "-g {}".format(os.path.join(output_directory, "{}.gff".format(opts.basename))),
-        "-d {}".format(os.path.join(output_directory, "{}.ffn".format(opts.basename))),
-        "-a {}".format(os.path.join(output_directory, "{}.faa".format(opts.basename))),
-        "-o {}".format(os.path.join(output_directory)),
-        "--use_mag_as_description",
-
-            "&&",
-
-        "rm -rf",
-        os.path.join(output_directory, "{}.*".format(opts.basename)),
-
+        "--scaffolds_to_bins {}".format(opts.scaffolds_to_bins),
+        ]
+    else:
+        cmd += [
+        "--name {}".format(opts.basename),
         ]
 
     return cmd
 
 # barrnap
-def get_barrnap_cmd(input_filepaths, output_filepaths, output_directory, directories, opts):
+def get_barrnap_cmd(input_filepaths, output_filepaths, output_directory, directories, opts, kingdom=None):
+    # Genomes are run concurrently and genomes with existing non-empty rRNA fasta are skipped
     cmd = [
-        "cat",
-        input_filepaths[0],
-        ">",
-        os.path.join(directories["tmp"], "genomes_to_domain.tsv"),
-
-"""
-OUTPUT_DIRECTORY={}
-FP={} 
-for DOMAIN in $(cut -f2 $FP | sort -u); 
-do 
-    DOMAIN_ABBREVIATION=$(echo $DOMAIN | python -c 'import sys; print(sys.stdin.read().lower()[:3])')
-    
-    # Get MAGs for each domain (not all will have passed QC)
-    for ID in $(cat $FP | grep $DOMAIN | cut -f1)
-    do 
-        GENOME_FASTA=$(ls {}) || GENOME_FASTA=""
-        if [ -e "$GENOME_FASTA" ]; then
-            >$OUTPUT_DIRECTORY/$ID.rRNA
-            >$OUTPUT_DIRECTORY/$ID.rRNA.gff
-            {} --kingdom $DOMAIN_ABBREVIATION --threads {} --lencutoff {} --reject {} --evalue {} --outseq $OUTPUT_DIRECTORY/$ID.rRNA $GENOME_FASTA  | {} > $OUTPUT_DIRECTORY/$ID.rRNA.gff
-            rm $GENOME_FASTA.fai
-        fi
-    done
-done
-
-rm -f {}
-""".format(
-        output_directory,
-        os.path.join(directories["tmp"], "genomes_to_domain.tsv"),
-        os.path.join(os.path.split(input_filepaths[1])[0],"$ID.fa"),
-        os.environ["barrnap"],
-        opts.n_jobs,
-        opts.barrnap_length_cutoff, 
-        opts.barrnap_reject, 
-        opts.barrnap_evalue,
-        os.environ["append_geneid_to_barrnap_gff.py"],
-        os.path.join(directories["tmp"], "genomes_to_domain.tsv"),
-    ),
+        os.environ["rna_gene_detection_wrapper.py"],
+        "--program barrnap",
+        "--executable {}".format(os.environ["barrnap"]),
+        "--genomes {}".format(input_filepaths[0]),
+        "--genome_directory {}".format(os.path.split(input_filepaths[1])[0]),
+        "--output_directory {}".format(output_directory),
+        "--n_jobs {}".format(opts.n_jobs),
+        "--n_jobs_per_genome {}".format(opts.rna_n_jobs_per_genome),
+        "--options '--lencutoff {} --reject {} --evalue {}'".format(
+            opts.barrnap_length_cutoff, 
+            opts.barrnap_reject, 
+            opts.barrnap_evalue,
+        ),
+        "--barrnap_gff_formatter {}".format(os.environ["append_geneid_to_barrnap_gff.py"]),
+        "--remove_fai",
     ]
+    if kingdom:
+        cmd += ["--kingdom {}".format(kingdom)]
     return cmd
 
 # tRNAscan-SE
-def get_trnascan_cmd(input_filepaths, output_filepaths, output_directory, directories, opts):
+def get_trnascan_cmd(input_filepaths, output_filepaths, output_directory, directories, opts, search_mode=None, trnascan_options=None):
+    # Genomes are run concurrently and genomes with existing non-empty tRNA fasta are skipped
     cmd = [
-        "cat",
-        input_filepaths[0],
-        ">",
-        os.path.join(directories["tmp"], "genomes_to_domain.tsv"),
-
-
-"""
-OUTPUT_DIRECTORY={}
-FP={} 
-for DOMAIN in $(cut -f2 $FP | sort -u); 
-do 
-    DOMAIN_ABBREVIATION=$(echo $DOMAIN | python -c 'import sys; print(sys.stdin.read().upper()[:1])')
-    
-    # Get MAGs for each domain (not all will have passed QC)
-    for ID in $(cat $FP | grep $DOMAIN | cut -f1)
-    do 
-        GENOME_FASTA=$(ls {}) || GENOME_FASTA=""
-        if [ -e "$GENOME_FASTA" ]; then
-            >$OUTPUT_DIRECTORY/$ID.tRNA
-            >$OUTPUT_DIRECTORY/$ID.tRNA.gff
-            >$OUTPUT_DIRECTORY/$ID.tRNA.struct
-            >$OUTPUT_DIRECTORY/$ID.tRNA.txt
-            {} -$DOMAIN_ABBREVIATION --forceow --progress --threads {} --fasta $OUTPUT_DIRECTORY/$ID.tRNA --gff $OUTPUT_DIRECTORY/$ID.tRNA.gff --struct $OUTPUT_DIRECTORY/$ID.tRNA.struct {} $GENOME_FASTA > $OUTPUT_DIRECTORY/$ID.tRNA.txt
-        fi
-    done
-done
-
-rm -f {}
-""".format(
-        output_directory,
-        os.path.join(directories["tmp"], "genomes_to_domain.tsv"),
-        os.path.join(os.path.split(input_filepaths[1])[0],"$ID.fa"),
-        os.environ["tRNAscan-SE"],
-        opts.n_jobs,
-        opts.trnascan_options,
-        os.path.join(directories["tmp"], "genomes_to_domain.tsv"),
-    )
+        os.environ["rna_gene_detection_wrapper.py"],
+        "--program tRNAscan-SE",
+        "--executable {}".format(os.environ["tRNAscan-SE"]),
+        "--genomes {}".format(input_filepaths[0]),
+        "--genome_directory {}".format(os.path.split(input_filepaths[1])[0]),
+        "--output_directory {}".format(output_directory),
+        "--n_jobs {}".format(opts.n_jobs),
+        "--n_jobs_per_genome {}".format(opts.rna_n_jobs_per_genome),
     ]
+    if search_mode:
+        cmd += ["--search_mode='{}'".format(search_mode)]
+    if trnascan_options:
+        cmd += ["--options '{}'".format(trnascan_options)]
     return cmd
 
 def get_symlink_cmd(input_filepaths, output_filepaths, output_directory, directories, opts):
@@ -1223,6 +1138,8 @@ def add_executables_to_environment(opts):
         "partition_organelle_sequences.py",
         "append_geneid_to_prodigal_gff.py",
         "append_geneid_to_barrnap_gff.py",
+        "rna_gene_detection_wrapper.py",
+        "pyrodigal_gene_calling.py",
     }
 
     required_executables={
@@ -1330,6 +1247,7 @@ def main(args=None):
 
     # Pyrodigal
     parser_pyrodigal = parser.add_argument_group('Pyrodigal arguments (Mitochondria)')
+    parser_pyrodigal.add_argument("--pyrodigal_mode", type=str, choices={"meta", "single"}, default="meta", help="Pyrodigal | meta uses the pre-trained metagenomic models and single trains a model for each genome (cached for each genetic code) [Default: meta]")
     parser_pyrodigal.add_argument("--pyrodigal_minimum_gene_length", type=int, default=90, help="Pyrodigal | Minimum gene length [Default: 90]")
     parser_pyrodigal.add_argument("--pyrodigal_minimum_edge_gene_length", type=int, default=60, help="Pyrodigal | Minimum edge gene length [Default: 60]")
     parser_pyrodigal.add_argument("--pyrodigal_maximum_gene_overlap_length", type=int, default=60, help="Pyrodigal | Maximum gene overlap length [Default: 60]")
@@ -1337,6 +1255,9 @@ def main(args=None):
     parser_pyrodigal.add_argument("--pyrodigal_plastid_genetic_code", type=int, default=11, help="Pyrodigal -g translation table (https://www.ncbi.nlm.nih.gov/Taxonomy/Utils/wprintgc.cgi/) [Default: 11] (The Bacterial, Archaeal and Plant Plastid Code))")
 
     # rRNA
+    parser_rna = parser.add_argument_group('RNA gene detection arguments')
+    parser_rna.add_argument("--rna_n_jobs_per_genome", type=int, default=1,  help="barrnap and tRNAscan-SE | Number of threads for each genome.  Genomes are run concurrently with --n_jobs // --rna_n_jobs_per_genome genomes at a time [Default: 1]")
+
     parser_barrnap = parser.add_argument_group('barrnap arguments')
     parser_barrnap.add_argument("--barrnap_length_cutoff", type=float, default=0.8,  help="barrnap | Proportional length threshold to label as partial [Default: 0.8]")
     parser_barrnap.add_argument("--barrnap_reject", type=float, default=0.25,  help="barrnap | Proportional length threshold to reject prediction [Default: 0.25]")
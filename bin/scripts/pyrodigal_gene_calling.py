@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys, os, argparse, gzip, re, io, time, hashlib
+from collections import OrderedDict
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+
+__program__ = os.path.split(sys.argv[0])[-1]
+__version__ = "2026.10.18"
+
+def read_fasta(filepath:str, contigs:set=None, minimum_contig_length:int=1):
+    """
+    Yield (id_contig, seq) for contigs in `contigs` (if provided) with length ≥ `minimum_contig_length`
+    """
+    f = gzip.open(filepath, "rt") if filepath.endswith(".gz") else open(filepath, "r")
+    with f:
+        for header, seq in SimpleFastaParser(f):
+            id_contig = header.split(" ")[0]
+            if contigs is not None and id_contig not in contigs:
+                continue
+            if len(seq) >= minimum_contig_length:
+                yield id_contig, seq
+
+def get_gene_finder(opts, training_info=None, meta:bool=True):
+    import pyrodigal
+    return pyrodigal.GeneFinder(
+        training_info=training_info,
+        meta=meta,
+        min_gene=opts.minimum_gene_length,
+        min_edge_gene=opts.minimum_edge_gene_length,
+        max_overlap=opts.maximum_gene_overlap_length,
+    )
+
+def get_training_hash(sequences:list, opts):
+    """
+    MD5 of the genome sequences (in order) and the options used for training so cached training is only reused for the same inputs
+    """
+    import pyrodigal
+    hasher = hashlib.md5()
+    for seq in sequences:
+        hasher.update(seq.encode())
+        hasher.update(b"\n")
+    hasher.update("\t".join([
+        "pyrodigal={}".format(pyrodigal.__version__),
+        "genetic_code={}".format(opts.genetic_code),
+        "minimum_gene_length={}".format(opts.minimum_gene_length),
+        "minimum_edge_gene_length={}".format(opts.minimum_edge_gene_length),
+        "maximum_gene_overlap_length={}".format(opts.maximum_gene_overlap_length),
+    ]).encode())
+    return hasher.hexdigest()
+
+def get_trained_gene_finder(id_genome:str, sequences:list, opts):
+    """
+    Train (or load from --training_cache) a single-mode gene finder for a genome.
+    Genomes shorter than pyrodigal.MIN_SINGLE_GENOME fall back to metagenomic mode.
+    """
+    import pyrodigal
+
+    cache_filepath = None
+    if opts.training_cache:
+        cache_filepath = os.path.join(opts.training_cache, "{}.g{}.{}.trn".format(id_genome, opts.genetic_code, get_training_hash(sequences, opts)))
+        if os.path.exists(cache_filepath):
+            with open(cache_filepath, "rb") as f:
+                return get_gene_finder(opts, training_info=pyrodigal.TrainingInfo.load(f), meta=False)
+
+    if sum(map(len, sequences)) < pyrodigal.MIN_SINGLE_GENOME:
+        print("[Warning] {} is shorter than {} bp and will use metagenomic mode".format(id_genome, pyrodigal.MIN_SINGLE_GENOME), file=sys.stderr)
+        return get_gene_finder(opts)
+
+    gene_finder = get_gene_finder(opts, meta=False)
+    training_info = gene_finder.train(*sequences, translation_table=opts.genetic_code)
+    if cache_filepath:
+        # Write to a temporary file first so an interrupted run does not leave a partial training file in the cache
+        with open(cache_filepath + ".tmp", "wb") as f:
+            training_info.dump(f)
+        os.replace(cache_filepath + ".tmp", cache_filepath)
+    return gene_finder
+
+def find_genes(job):
+    """
+    Run gene finder on a contig and return the formatted (gff, ffn, faa) text.  Sequence numbering is set from the
+    contig position in the input so output is identical regardless of the order threads finish.
+    """
+    seqnum, id_contig, seq, gene_finder = job
+    genes = gene_finder.find_genes(seq)
+
+    f_gff = io.StringIO()
+    f_ffn = io.StringIO()
+    f_faa = io.StringIO()
+    genes.write_gff(f_gff, id_contig)
+    genes.write_genes(f_ffn, id_contig)
+    genes.write_translations(f_faa, id_contig)
+
+    gff = re.sub(r"seqnum=\d+;", "seqnum={};".format(seqnum), f_gff.getvalue())
+    gff = re.sub(r"ID=\d+_", "ID={}_".format(seqnum), gff)
+    ffn = re.sub(r"ID=\d+_", "ID={}_".format(seqnum), f_ffn.getvalue())
+    faa = re.sub(r"ID=\d+_", "ID={}_".format(seqnum), f_faa.getvalue())
+
+    return id_contig, gff, ffn, faa
+
+def add_gene_id_to_gff(gff:str, attribute:str="gene_id"):
+    """
+    Same as append_geneid_to_prodigal_gff.py.  Returns comment lines and feature lines separately
+    """
+    comments = list()
+    features = list()
+    for line in gff.splitlines():
+        line = line.strip()
+        if line.startswith("#"):
+            comments.append(line)
+        elif line:
+            id_contig = line.split("\t")[0]
+            id = line.split("ID=")[1].split(";")[0]
+            features.append("{}contig_id={};{}={}_{};gene_biotype=protein_coding;".format(line, id_contig, attribute, id_contig, id.split("_")[-1]))
+    return comments, features
+
+def main(args=None):
+    # Path info
+    script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
+    script_filename = __program__
+    # Path info
+    description = """
+    Running: {} v{} via Python v{} | {}""".format(__program__, __version__, sys.version.split(" ")[0], sys.executable)
+    usage = "{} -f <scaffolds.fasta> -i <scaffolds_to_bins.tsv> -o <output_directory> -p <n_jobs>".format(__program__)
+    epilog = "Copyright 2021 Josh L. Espinoza (jespinoz@jcvi.org)"
+
+    # Parser
+    parser = argparse.ArgumentParser(description=description, usage=usage, epilog=epilog, formatter_class=argparse.RawTextHelpFormatter)
+    # Pipeline
+    parser_io = parser.add_argument_group('Required I/O arguments')
+    parser_io.add_argument("-f","--fasta", type=str, required=True, help = "path/to/scaffolds.fasta[.gz]")
+    parser_io.add_argument("-i","--scaffolds_to_bins", type=str, required=False,  help = "path/to/scaffolds_to_bins.tsv, [Optional] Format: [id_scaffold]<tab>[id_bin], No header.  Writes [id_bin].gff, [id_bin].ffn, and [id_bin].faa for each bin (Same as partition_gene_models.py)")
+    parser_io.add_argument("-n","--name", type=str, default="gene_models", help = "Basename for output files if --scaffolds_to_bins is not provided [Default: gene_models]")
+    parser_io.add_argument("-o","--output_directory", type=str, required=True, help = "path/to/output_directory")
+    parser_io.add_argument("-c","--contigs", type=str, required=False, help = "path/to/contigs.list with one contig identifier per line to use from --fasta [Default: All contigs]")
+    parser_io.add_argument("-l","--genomes", type=str, required=False, help = "path/to/genomes.list with one genome identifier per line.  Empty outputs are created for genomes without any contigs [Optional]")
+
+    parser_utility = parser.add_argument_group('Utility arguments')
+    parser_utility.add_argument("-p","--n_jobs", type=int, default=1, help = "Number of threads.  Contigs are processed in parallel and output preserves input order.  Use -1 for all available threads [Default: 1]")
+    parser_utility.add_argument("--chunksize", type=int, default=16, help = "Number of contigs sent to each thread at a time [Default: 16]")
+
+    parser_pyrodigal = parser.add_argument_group('Pyrodigal arguments')
+    parser_pyrodigal.add_argument("-m", "--mode", type=str, choices={"meta", "single"}, default="meta", help="Pyrodigal | meta uses the pre-trained metagenomic models and single trains a model for each genome [Default: meta]")
+    parser_pyrodigal.add_argument("-g", "--genetic_code", type=int, default=11, help="Pyrodigal | Translation table used for training in single mode (https://www.ncbi.nlm.nih.gov/Taxonomy/Utils/wprintgc.cgi/) [Default: 11]")
+    parser_pyrodigal.add_argument("--training_cache", type=str, required=False, help="Pyrodigal | Directory to cache single mode training for each genome as [id_genome].g[genetic_code].[md5].trn where md5 is a hash of the genome sequences and training options.  Cached training is only reused when these are unchanged [Optional]")
+    parser_pyrodigal.add_argument("--minimum_gene_length", type=int, default=90, help="Pyrodigal | Minimum gene length [Default: 90]")
+    parser_pyrodigal.add_argument("--minimum_edge_gene_length", type=int, default=60, help="Pyrodigal | Minimum edge gene length [Default: 60]")
+    parser_pyrodigal.add_argument("--maximum_gene_overlap_length", type=int, default=60, help="Pyrodigal | Maximum gene overlap length [Default: 60]")
+    parser_pyrodigal.add_argument("--minimum_contig_length", type=int, default=1, help="Minimum contig length [Default: 1]")
+
+    # Options
+    opts = parser.parse_args()
+    opts.script_directory  = script_directory
+    opts.script_filename = script_filename
+
+    if opts.n_jobs == -1:
+        opts.n_jobs = cpu_count()
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1 (or -1 to use all available threads)"
+
+    os.makedirs(opts.output_directory, exist_ok=True)
+    if opts.training_cache:
+        os.makedirs(opts.training_cache, exist_ok=True)
+
+    # Contigs
+    contigs = None
+    if opts.contigs:
+        with open(opts.contigs, "r") as f:
+            contigs = set(filter(bool, map(str.strip, f)))
+
+    # Scaffolds to bins
+    scaffold_to_bin = OrderedDict()
+    if opts.scaffolds_to_bins:
+        print(" * Parsing scaffolds to bins file: {}".format(opts.scaffolds_to_bins), file=sys.stderr)
+        with open(opts.scaffolds_to_bins, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    id_scaffold, id_bin = line.split("\t")
+                    scaffold_to_bin[id_scaffold] = id_bin
+        genomes = list(OrderedDict.fromkeys(scaffold_to_bin.values()))
+    else:
+        genomes = [opts.name]
+    if opts.genomes:
+        with open(opts.genomes, "r") as f:
+            for id_genome in filter(bool, map(str.strip, f)):
+                if id_genome not in genomes:
+                    genomes.append(id_genome)
+
+    # Output files
+    file_objects = OrderedDict()
+    for id_genome in genomes:
+        file_objects[id_genome] = {
+            "gff":open(os.path.join(opts.output_directory, "{}.gff".format(id_genome)), "w"),
+            "ffn":open(os.path.join(opts.output_directory, "{}.ffn".format(id_genome)), "w"),
+            "faa":open(os.path.join(opts.output_directory, "{}.faa".format(id_genome)), "w"),
+        }
+    if opts.scaffolds_to_bins:
+        f_comments = open(os.path.join(opts.output_directory, "gff_comments.txt"), "w")
+        f_identifiers = open(os.path.join(opts.output_directory, "identifier_mapping.tsv"), "w")
+
+    # Gene finders
+    start_time = time.time()
+    sequences = read_fasta(opts.fasta, contigs=contigs, minimum_contig_length=opts.minimum_contig_length)
+    if opts.mode == "meta":
+        gene_finder = get_gene_finder(opts)
+        jobs = ((i, id_contig, seq, gene_finder) for i, (id_contig, seq) in enumerate(sequences, start=1))
+    if opts.mode == "single":
+        # Training requires all of the contigs for each genome so sequences are loaded into memory.  Unbinned contigs are not written so they are skipped.
+        get_genome = scaffold_to_bin.get if opts.scaffolds_to_bins else lambda id_contig: opts.name
+        sequences = list(sequences)
+        genome_to_sequences = OrderedDict()
+        for id_contig, seq in sequences:
+            id_genome = get_genome(id_contig)
+            if id_genome is not None:
+                genome_to_sequences.setdefault(id_genome, list()).append(seq)
+        print(" * Training single mode gene finders for {} genomes".format(len(genome_to_sequences)), file=sys.stderr)
+        genome_to_gene_finder = dict()
+        for id_genome, genome_sequences in genome_to_sequences.items():
+            genome_to_gene_finder[id_genome] = get_trained_gene_finder(id_genome, genome_sequences, opts)
+        jobs = ((i, id_contig, seq, genome_to_gene_finder[get_genome(id_contig)]) for i, (id_contig, seq) in enumerate(sequences, start=1) if get_genome(id_contig) is not None)
+
+    # Gene calling
+    print(" * Calling genes with {} threads".format(opts.n_jobs), file=sys.stderr)
+    pool = None
+    if opts.n_jobs > 1:
+        pool = ThreadPool(opts.n_jobs)
+        results = pool.imap(find_genes, jobs, chunksize=opts.chunksize)
+    else:
+        results = map(find_genes, jobs)
+
+    number_of_contigs = 0
+    number_of_genes = 0
+    for id_contig, gff, ffn, faa in results:
+        number_of_contigs += 1
+        comments, features = add_gene_id_to_gff(gff)
+        number_of_genes += len(features)
+
+        if opts.scaffolds_to_bins:
+            for line in comments:
+                print(line, file=f_comments)
+            if id_contig in scaffold_to_bin:
+                id_genome = scaffold_to_bin[id_contig]
+                files = file_objects[id_genome]
+                for line in features:
+                    print(line, file=files["gff"])
+                    print(id_contig + "_" + line.split("ID=")[1].split(";")[0].split("_")[-1], id_contig, id_genome, sep="\t", file=f_identifiers)
+                for header, seq in SimpleFastaParser(io.StringIO(ffn)):
+                    print(">{}\n{}".format(header, seq), file=files["ffn"])
+                for header, seq in SimpleFastaParser(io.StringIO(faa)):
+                    print(">{}\n{}".format(header, seq), file=files["faa"])
+        else:
+            files = file_objects[opts.name]
+            for line in comments:
+                print(line, file=files["gff"])
+            for line in features:
+                print(line, file=files["gff"])
+            files["ffn"].write(ffn)
+            files["faa"].write(faa)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    # Close
+    for files in file_objects.values():
+        for f in files.values():
+            f.close()
+    if opts.scaffolds_to_bins:
+        f_comments.close()
+        f_identifiers.close()
+
+    print(" * Called {} genes from {} contigs ({} seconds)".format(number_of_genes, number_of_contigs, int(time.time() - start_time)), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
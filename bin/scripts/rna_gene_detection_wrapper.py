@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys, os, argparse, time, subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing import cpu_count
+
+__program__ = os.path.split(sys.argv[0])[-1]
+__version__ = "2026.10.18"
+
+# Output files for each genome.  The first suffix is the primary output that is written to a temporary path and moved once the run succeeds.
+OUTPUT_SUFFIXES = {
+    "barrnap":["rRNA", "rRNA.gff"],
+    "tRNAscan-SE":["tRNA", "tRNA.gff", "tRNA.struct", "tRNA.txt"],
+}
+
+def read_genomes(filepath:str, default_domain:str=None):
+    """
+    Read [id_genome]<tab>[domain] (or [id_genome] if `default_domain` is provided) and return an OrderedDict of {id_genome:domain}
+    """
+    genome_to_domain = OrderedDict()
+    with open(filepath, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                fields = line.split("\t")
+                if default_domain is None:
+                    assert len(fields) >= 2, "If --kingdom (barrnap) or --search_mode (tRNAscan-SE) is not provided then --genomes must have [id_genome]<tab>[domain]: {}".format(line)
+                    genome_to_domain[fields[0]] = fields[1]
+                else:
+                    genome_to_domain[fields[0]] = default_domain
+    return genome_to_domain
+
+def get_barrnap_cmd(id_genome:str, genome_filepath:str, domain:str, output_prefix:str, opts):
+    kingdom = opts.kingdom if opts.kingdom else domain.lower()[:3]
+    cmd = "set -o pipefail; {} --kingdom {} --threads {} {} --outseq {}.rRNA.incomplete {} | {} > {}.rRNA.gff".format(
+        opts.executable,
+        kingdom,
+        opts.n_jobs_per_genome,
+        opts.options,
+        output_prefix,
+        genome_filepath,
+        opts.barrnap_gff_formatter,
+        output_prefix,
+    )
+    if opts.remove_fai:
+        cmd += " && rm -f {}.fai".format(genome_filepath)
+    return cmd
+
+def get_trnascan_cmd(id_genome:str, genome_filepath:str, domain:str, output_prefix:str, opts):
+    search_mode = opts.search_mode if opts.search_mode else "-{}".format(domain.upper()[:1])
+    cmd = "{} {} --forceow --progress --threads {} --fasta {}.tRNA.incomplete --gff {}.tRNA.gff --struct {}.tRNA.struct {} {} > {}.tRNA.txt".format(
+        opts.executable,
+        search_mode,
+        opts.n_jobs_per_genome,
+        output_prefix,
+        output_prefix,
+        output_prefix,
+        opts.options,
+        genome_filepath,
+        output_prefix,
+    )
+    return cmd
+
+def run_genome(id_genome:str, genome_filepath:str, domain:str, opts):
+    """
+    Run barrnap or tRNAscan-SE on a single genome.  Returns (id_genome, returncode, duration).
+    """
+    output_prefix = os.path.join(opts.output_directory, id_genome)
+    suffixes = OUTPUT_SUFFIXES[opts.program]
+
+    # Create empty outputs so downstream steps can concatenate genomes without any hits
+    for suffix in suffixes:
+        open("{}.{}".format(output_prefix, suffix), "w").close()
+
+    if opts.program == "barrnap":
+        cmd = get_barrnap_cmd(id_genome, genome_filepath, domain, output_prefix, opts)
+    if opts.program == "tRNAscan-SE":
+        cmd = get_trnascan_cmd(id_genome, genome_filepath, domain, output_prefix, opts)
+
+    start_time = time.time()
+    with open("{}.{}.log".format(output_prefix, opts.program), "w") as f_log:
+        print(cmd, file=f_log, flush=True)
+        returncode = subprocess.call(cmd, shell=True, executable="/bin/bash", stdout=f_log, stderr=f_log)
+    duration = time.time() - start_time
+
+    # Only move the primary output into place when the run succeeded so incomplete runs are not skipped on restart
+    filepath_incomplete = "{}.{}.incomplete".format(output_prefix, suffixes[0])
+    if returncode == 0 and os.path.exists(filepath_incomplete):
+        os.rename(filepath_incomplete, "{}.{}".format(output_prefix, suffixes[0]))
+
+    return id_genome, returncode, duration
+
+def main(args=None):
+    # Path info
+    script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
+    script_filename = __program__
+    # Path info
+    description = """
+    Running: {} v{} via Python v{} | {}""".format(__program__, __version__, sys.version.split(" ")[0], sys.executable)
+    usage = "{} -m <barrnap|tRNAscan-SE> -i <genomes_to_domain.tsv> -g <genome_directory> -o <output_directory> -p <n_jobs>".format(__program__)
+    epilog = "Copyright 2021 Josh L. Espinoza (jespinoz@jcvi.org)"
+
+    # Parser
+    parser = argparse.ArgumentParser(description=description, usage=usage, epilog=epilog, formatter_class=argparse.RawTextHelpFormatter)
+    # Pipeline
+    parser_io = parser.add_argument_group('Required I/O arguments')
+    parser_io.add_argument("-i","--genomes", type=str, required=True, help = "path/to/genomes_to_domain.tsv with [id_genome]<tab>[domain] (No header).  Only [id_genome] is required with --kingdom or --search_mode")
+    parser_io.add_argument("-g","--genome_directory", type=str, required=True, help = "path/to/genome_directory with [id_genome].[extension] files.  Genomes that do not exist are skipped (e.g., did not pass QC)")
+    parser_io.add_argument("-o","--output_directory", type=str, required=True, help = "path/to/output_directory")
+    parser_io.add_argument("-x","--extension", type=str, default="fa", help = "Genome fasta extension [Default: fa]")
+
+    parser_utility = parser.add_argument_group('Utility arguments')
+    parser_utility.add_argument("-p","--n_jobs", type=int, default=1, help = "Number of threads in total.  Genomes are run concurrently (largest first) with --n_jobs // --n_jobs_per_genome genomes at a time.  Use -1 for all available threads [Default: 1]")
+    parser_utility.add_argument("--n_jobs_per_genome", type=int, default=1, help = "Number of threads for each genome [Default: 1]")
+    parser_utility.add_argument("--overwrite", action="store_true", help = "Rerun genomes with an existing non-empty output")
+
+    parser_program = parser.add_argument_group('Program arguments')
+    parser_program.add_argument("-m","--program", type=str, required=True, choices={"barrnap", "tRNAscan-SE"}, help = "RNA gene detection program")
+    parser_program.add_argument("-e","--executable", type=str, help = "Executable for --program [Default: --program]")
+    parser_program.add_argument("--options", type=str, default="", help = "More options for --program (e.g. --arg 1 ) [Default: '']")
+    parser_program.add_argument("--kingdom", type=str, help = "barrnap | Kingdom for all genomes instead of the domain column (e.g., bac, arc, euk, mito) [Default: domain.lower()[:3]]")
+    parser_program.add_argument("--search_mode", type=str, help = "tRNAscan-SE | Search mode for all genomes instead of the domain column (e.g., -O) [Default: -domain.upper()[:1]]")
+    parser_program.add_argument("--barrnap_gff_formatter", type=str, default=os.path.join(script_directory, "append_geneid_to_barrnap_gff.py"), help = "barrnap | Executable to add gene_id to barrnap GFF [Default: {}]".format(os.path.join(script_directory, "append_geneid_to_barrnap_gff.py")))
+    parser_program.add_argument("--remove_fai", action="store_true", help = "barrnap | Remove the genome .fai index created by barrnap")
+
+    # Options
+    opts = parser.parse_args()
+    opts.script_directory  = script_directory
+    opts.script_filename = script_filename
+
+    if opts.n_jobs == -1:
+        opts.n_jobs = cpu_count()
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1 (or -1 to use all available threads)"
+    assert opts.n_jobs_per_genome >= 1, "--n_jobs_per_genome must be ≥ 1"
+    opts.n_jobs_per_genome = min(opts.n_jobs_per_genome, opts.n_jobs)
+    if opts.executable is None:
+        opts.executable = opts.program
+
+    os.makedirs(opts.output_directory, exist_ok=True)
+
+    # Genomes
+    genome_to_domain = read_genomes(opts.genomes, default_domain={"barrnap":opts.kingdom, "tRNAscan-SE":opts.search_mode}[opts.program])
+    primary_suffix = OUTPUT_SUFFIXES[opts.program][0]
+    genomes = list()
+    for id_genome, domain in genome_to_domain.items():
+        genome_filepath = os.path.join(opts.genome_directory, "{}.{}".format(id_genome, opts.extension))
+        if not os.path.exists(genome_filepath):
+            continue
+        output_filepath = os.path.join(opts.output_directory, "{}.{}".format(id_genome, primary_suffix))
+        if not opts.overwrite and os.path.exists(output_filepath) and os.stat(output_filepath).st_size > 0:
+            print("[Skipping] [{}] {} because {} exists and is not empty".format(opts.program, genome_filepath, output_filepath), file=sys.stdout)
+            continue
+        genomes.append((id_genome, genome_filepath, domain))
+
+    # Largest genomes first so the longest runs are not left until the end
+    genomes = sorted(genomes, key=lambda x: os.stat(x[1]).st_size, reverse=True)
+    n_genomes_parallel = max(1, opts.n_jobs // opts.n_jobs_per_genome)
+    print(" * Running {} on {} genomes ({} genomes in parallel with {} threads each)".format(opts.program, len(genomes), n_genomes_parallel, opts.n_jobs_per_genome), file=sys.stdout)
+
+    failed = list()
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=n_genomes_parallel) as executor:
+        futures = [executor.submit(run_genome, id_genome, genome_filepath, domain, opts) for id_genome, genome_filepath, domain in genomes]
+        for future in as_completed(futures):
+            id_genome, returncode, duration = future.result()
+            if returncode == 0:
+                print("[Completed] [{}] {} ({} seconds)".format(opts.program, id_genome, int(duration)), file=sys.stdout, flush=True)
+            else:
+                print("[Failed] [{}] {} (returncode={}) See log: {}".format(opts.program, id_genome, returncode, os.path.join(opts.output_directory, "{}.{}.log".format(id_genome, opts.program))), file=sys.stdout, flush=True)
+                failed.append(id_genome)
+    print(" * Completed {} genomes in {} seconds".format(len(genomes) - len(failed), int(time.time() - start_time)), file=sys.stdout)
+
+    if failed:
+        print(" * {} failed for the following {} genomes: {}".format(opts.program, len(failed), ", ".join(failed)), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
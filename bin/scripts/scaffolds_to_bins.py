@@ -1,11 +1,59 @@
 #!/usr/bin/env python
-import sys, os, glob, argparse, gzip, warnings
+import sys, os, glob, argparse, gzip, warnings, re
 from collections import OrderedDict
+from multiprocessing import Pool
 import pandas as pd
 from tqdm import tqdm
+from soothsayer_utils import check_packages
 
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.3.26"
+__version__ = "2026.10.18"
+
+# Header lines at the start of a block of complete lines
+HEADER_PATTERN = re.compile(rb"(?:^|\n)>([^\n]*)")
+
+def scan_headers(filepath:str, compressed:bool=False, keep_description:bool=False, buffer_size:int=16777216):
+    """
+    Read only the header lines of a fasta file using large buffered reads instead of iterating through every sequence line
+    """
+    identifiers = list()
+    f = gzip.open(filepath, "rb") if compressed else open(filepath, "rb")
+    with f:
+        remainder = b""
+        while True:
+            chunk = f.read(buffer_size)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            # Only search complete lines and carry over the partial line
+            i = chunk.rfind(b"\n")
+            if i == -1:
+                remainder = chunk
+                continue
+            remainder = chunk[i + 1:]
+            identifiers += HEADER_PATTERN.findall(chunk, 0, i + 1)
+        if remainder:
+            identifiers += HEADER_PATTERN.findall(remainder)
+    identifiers = [id.decode().rstrip() for id in identifiers]
+    if not keep_description:
+        identifiers = [id.split(" ")[0] for id in identifiers]
+    return identifiers
+
+def scan_genome(args):
+    id_bin, filepath, compressed, keep_description, buffer_size = args
+    return id_bin, filepath, scan_headers(filepath, compressed=compressed, keep_description=keep_description, buffer_size=buffer_size)
+
+@check_packages(["pyarrow"])
+def write_parquet(df, bin_column_name, output):
+    """
+    Write a compact scaffold -> bin index with dictionary-encoded bins (e.g., pd.read_parquet("scaffolds_to_bins.parquet"))
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = df.copy()
+    df[bin_column_name] = df[bin_column_name].astype("category")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), output)
 
 def main(args=None):
     # Path info
@@ -30,12 +78,20 @@ def main(args=None):
     parser.add_argument("--column_order", type=str, default="scaffold,bin", help="Column order.  Specify either 'scaffold,bin' or 'bin,scaffold' [Default:scaffold,bin]")
     parser.add_argument("--bin_prefix", type=str,  help="Bin prefix. Default is to not have a prefix.")
     parser.add_argument("--header", action="store_true", help="Specify if header should be in output")
+    parser.add_argument("-p", "--n_jobs", type=int, default=1, help="Number of genomes to read in parallel.  Use -1 for all available threads [Default: 1]")
+    parser.add_argument("--buffer_size", type=int, default=16777216, help="Number of bytes read at a time when scanning for fasta headers [Default: 16777216]")
+    parser.add_argument("--parquet", type=str, help="path/to/scaffolds_to_bins.parquet to also write a compact scaffold-to-bin index with dictionary-encoded bins (requires pyarrow).\nColumns follow --column_order, --scaffold_column_name, and --bin_column_name")
 
     # Options
     opts = parser.parse_args()
     opts.script_directory  = script_directory
     opts.script_filename = script_filename
 
+    if opts.n_jobs == -1:
+        from multiprocessing import cpu_count
+        opts.n_jobs = cpu_count()
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1 (or -1 to use all available threads)"
+
     # Parse
     assert opts.column_order in {"scaffold,bin", "bin,scaffold"}, "Must choose either 'scaffold,bin' or 'bin,scaffold' for --column_order"
     
@@ -45,6 +101,7 @@ def main(args=None):
         opts.bin_prefix = ""
 
     scaffold_to_bin = OrderedDict()
+    genomes = list()
 
     if opts.binning_directory:
         assert os.path.exists(opts.binning_directory), "{} does not exist".format(opts.binning_directory)
@@ -59,21 +116,7 @@ def main(args=None):
         for filepath in glob.glob(os.path.join(opts.binning_directory, "*.{}".format(opts.extension))):
             id_bin = filepath.split("/")[-1][:-1*(len(opts.extension)+1)]
             id_bin = "{}{}".format(opts.bin_prefix, id_bin)
-
-            if opts.extension.endswith(".gz"):
-                f = gzip.open(filepath, "rt")
-            else:
-                f = open(filepath, "r")
-            for line in tqdm(f, filepath):
-                if opts.header:
-                    if line.startswith(">"):
-                        id_scaffold = line.strip()[1:]
-                        scaffold_to_bin[id_scaffold] = id_bin 
-                else:
-                    if line.startswith(">"):
-                        id_scaffold = line.strip()[1:].split(" ")[0]
-                        scaffold_to_bin[id_scaffold] = id_bin 
-            f.close()
+            genomes.append((id_bin, filepath))
 
     else:
         assert opts.binning_directory is None, "--genomes cannot be used if --binning_directory is selected"
@@ -106,23 +149,23 @@ def main(args=None):
                 
                 df_genomes = pd.Series(bin_to_filepath).to_frame()
 
-            # Read fasta files
             for id_bin, filepath in df_genomes.iloc[:,0].items():
-                if opts.extension.endswith(".gz"):
-                    f = gzip.open(filepath, "rt")
-                else:
-                    f = open(filepath, "r")
-                for line in tqdm(f, filepath):
-                    if opts.header:
-                        if line.startswith(">"):
-                            id_scaffold = line.strip()[1:]
-                            scaffold_to_bin[id_scaffold] = id_bin 
-                    else:
-                        if line.startswith(">"):
-                            id_scaffold = line.strip()[1:].split(" ")[0]
-                            scaffold_to_bin[id_scaffold] = id_bin 
-                f.close()
-        
+                genomes.append((id_bin, filepath))
+
+    # Read fasta headers in parallel.  Results are in the same order as the genomes so the output is the same regardless of --n_jobs
+    args = [(id_bin, filepath, opts.extension.endswith(".gz"), opts.header, opts.buffer_size) for id_bin, filepath in genomes]
+    if opts.n_jobs == 1:
+        results = map(scan_genome, args)
+    else:
+        pool = Pool(opts.n_jobs)
+        results = pool.imap(scan_genome, args)
+    for id_bin, filepath, identifiers in tqdm(results, "Reading fasta headers", total=len(args)):
+        for id_scaffold in identifiers:
+            scaffold_to_bin[id_scaffold] = id_bin
+    if opts.n_jobs > 1:
+        pool.close()
+        pool.join()
+
     df_output = pd.Series(scaffold_to_bin).to_frame(opts.bin_column_name)
     df_output.index.name = opts.scaffold_column_name 
     df_output = df_output.reset_index()
@@ -130,6 +173,10 @@ def main(args=None):
         df_output = df_output.iloc[:,[1,0]]
     df_output.to_csv(sys.stdout, sep=opts.sep, header=opts.header, index=None)
 
+    if opts.parquet:
+        print(" * Writing {} scaffolds from {} bins to {}".format(len(scaffold_to_bin), len(genomes), opts.parquet), file=sys.stderr)
+        write_parquet(df_output, opts.bin_column_name, opts.parquet)
+
 if __name__ == "__main__":
     main()
     
@@ -1,13 +1,85 @@
 #!/usr/bin/env python
-import sys, os, argparse, warnings
+import sys, os, argparse, warnings, gzip
 import hashlib
+from collections import Counter, deque
+from multiprocessing import Pool, cpu_count
 # from collections import OrderedDict
 # import pandas as pd
+from Bio.SeqIO.FastaIO import SimpleFastaParser
 from tqdm import tqdm
 
 __program__ = os.path.split(sys.argv[0])[-1]
-__version__ = "2024.6.11"
-    
+__version__ = "2026.10.18"
+
+HASHLIB_ALGORITHMS = {"md5", "sha1", "sha256", "blake2b"}
+XXHASH_ALGORITHMS = {"xxh64", "xxh3_64", "xxh3_128"}
+
+def get_hash_function(algorithm:str):
+    """
+    Returns a function that converts a sequence (str) to a hexdigest.
+    xxhash digests are non-cryptographic and much faster than md5 but require the `xxhash` package.
+    """
+    if algorithm in HASHLIB_ALGORITHMS:
+        constructor = getattr(hashlib, algorithm)
+        return lambda seq: constructor(seq.encode("utf-8")).hexdigest()
+    if algorithm in XXHASH_ALGORITHMS:
+        try:
+            import xxhash
+        except ImportError:
+            raise ImportError("--algorithm {} requires the `xxhash` package (e.g., pip install xxhash)".format(algorithm))
+        return getattr(xxhash, "{}_hexdigest".format(algorithm))
+    raise ValueError("Unrecognized --algorithm: {}".format(algorithm))
+
+def hash_sequences(sequences:list, algorithm:str="md5"):
+    hash_function = get_hash_function(algorithm)
+    return [hash_function(seq) for seq in sequences]
+
+def read_sequences(f, input_format:str="lines"):
+    if input_format == "fasta":
+        for header, seq in SimpleFastaParser(f):
+            seq = seq.strip()
+            if seq:
+                yield seq
+    if input_format == "lines":
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+def batch_sequences(sequences, case:str="upper", batch_size:int=100000):
+    # Case is applied here so workers only receive the sequences to hash
+    transform = {"upper":str.upper, "lower":str.lower, "insensitive":None}[case]
+    batch = list()
+    for seq in sequences:
+        if transform is not None:
+            seq = transform(seq)
+        batch.append(seq)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = list()
+    if batch:
+        yield batch
+
+def hash_batches(batches, algorithm:str="md5", n_jobs:int=1):
+    """
+    Yields (batch, hashes) in input order.  With n_jobs > 1, batches are hashed on a worker pool 
+    with at most 2 * n_jobs batches in flight so memory stays bounded.
+    """
+    if n_jobs == 1:
+        for batch in batches:
+            yield batch, hash_sequences(batch, algorithm)
+    else:
+        with Pool(n_jobs) as pool:
+            queue = deque()
+            for batch in batches:
+                queue.append((batch, pool.apply_async(hash_sequences, (batch, algorithm))))
+                if len(queue) >= 2*n_jobs:
+                    batch, result = queue.popleft()
+                    yield batch, result.get()
+            while queue:
+                batch, result = queue.popleft()
+                yield batch, result.get()
+
 def main(args=None):
     # Path info
     script_directory  =  os.path.dirname(os.path.abspath( __file__ ))
@@ -21,70 +93,62 @@ def main(args=None):
     # Parser
     parser = argparse.ArgumentParser(description=description, usage=usage, epilog=epilog, formatter_class=argparse.RawTextHelpFormatter)
     # Pipeline
+    parser.add_argument("-i","--input", type=str, default="stdin", help = "path/to/input with one sequence per line or fasta (See --input_format) [Default: stdin]")
+    parser.add_argument("--input_format", type=str, choices={"lines", "fasta"}, default="lines", help = "Input format.  `lines` expects one sequence per line and `fasta` ignores headers and joins multi-line sequences [Default: lines]")
     parser.add_argument("-f","--output_format", type=str, choices={"fasta", "list"}, default="fasta", help = "[Default: fasta]")
     parser.add_argument("-c","--case", type=str, choices={"upper", "lower", "insensitive"}, default="upper", help = "[Default: upper]")
+    parser.add_argument("-a","--algorithm", type=str, choices=HASHLIB_ALGORITHMS | XXHASH_ALGORITHMS, default="md5", help = "Hash algorithm.  {} are non-cryptographic and faster but require `xxhash` [Default: md5]".format(", ".join(sorted(XXHASH_ALGORITHMS))))
+    parser.add_argument("-u","--unique", action="store_true", help = "Only output the first occurrence of each hash")
+    parser.add_argument("--counts", type=str, help = "path/to/counts.tsv[.gz] with [hash]<tab>[count] for each hash in order of first occurrence (No header)")
+    parser.add_argument("-p","--n_jobs", type=int, default=1, help = "Number of threads.  Batches are hashed in parallel and output preserves input order.  Use -1 for all available threads [Default: 1]")
+    parser.add_argument("-b","--batch_size", type=int, default=100000, help = "Number of sequences per batch [Default: 100000]")
 
     # Options
     opts = parser.parse_args()
     opts.script_directory  = script_directory
     opts.script_filename = script_filename
 
-    if opts.output_format == "list":
-        # Insensitive
-        if opts.case == "insensitive":
-            for line in tqdm(sys.stdin):
-                line = line.strip()
-                if line:
-                    seq = line
-                    id_md5 = hashlib.md5(seq.encode('utf-8')).hexdigest()
-                    print(id_md5, file=sys.stdout)
-        # Upper
-        if opts.case == "upper":
-            for line in tqdm(sys.stdin):
-                line = line.strip()
-                if line:
-                    seq = line.upper()
-                    id_md5 = hashlib.md5(seq.encode('utf-8')).hexdigest()
-                    print(id_md5, file=sys.stdout)
-             
-        # Lower       
-        if opts.case == "lower":
-            for line in tqdm(sys.stdin):
-                line = line.strip()
-                if line:
-                    seq = line.lower()
-                    id_md5 = hashlib.md5(seq.encode('utf-8')).hexdigest()
-                    print(id_md5, file=sys.stdout)
-                    
-    if opts.output_format == "fasta":
-        # Insensitive
-        if opts.case == "insensitive":
-            for line in tqdm(sys.stdin):
-                line = line.strip()
-                if line:
-                    seq = line
-                    id_md5 = hashlib.md5(seq.encode('utf-8')).hexdigest()
-                    print(">{}\n{}".format(id_md5, seq), file=sys.stdout)
-        # Upper
-        if opts.case == "upper":
-            for line in tqdm(sys.stdin):
-                line = line.strip()
-                if line:
-                    seq = line.upper()
-                    id_md5 = hashlib.md5(seq.encode('utf-8')).hexdigest()
-                    print(">{}\n{}".format(id_md5, seq), file=sys.stdout)
-             
-        # Lower       
-        if opts.case == "lower":
-            for line in tqdm(sys.stdin):
-                line = line.strip()
-                if line:
-                    seq = line.lower()
-                    id_md5 = hashlib.md5(seq.encode('utf-8')).hexdigest()
-                    print(">{}\n{}".format(id_md5, seq), file=sys.stdout)
-                
+    if opts.n_jobs == -1:
+        opts.n_jobs = cpu_count()
+    assert opts.n_jobs >= 1, "--n_jobs must be ≥ 1 (or -1 to use all available threads)"
+    assert opts.batch_size >= 1, "--batch_size must be ≥ 1"
+
+    # Check the hash algorithm is available before reading any input
+    get_hash_function(opts.algorithm)
+
+    if opts.input == "stdin":
+        f_in = sys.stdin
+    else:
+        f_in = open(opts.input, "r")
+
+    batches = batch_sequences(read_sequences(f_in, input_format=opts.input_format), case=opts.case, batch_size=opts.batch_size)
+
+    hash_to_count = Counter()
+    track_hashes = bool(opts.unique) or bool(opts.counts)
+    with tqdm(unit=" sequences") as pbar:
+        for batch, hashes in hash_batches(batches, algorithm=opts.algorithm, n_jobs=opts.n_jobs):
+            lines = list()
+            for seq, id_hash in zip(batch, hashes):
+                if track_hashes:
+                    hash_to_count[id_hash] += 1
+                    if opts.unique and hash_to_count[id_hash] > 1:
+                        continue
+                if opts.output_format == "fasta":
+                    lines.append(">{}\n{}\n".format(id_hash, seq))
+                if opts.output_format == "list":
+                    lines.append("{}\n".format(id_hash))
+            sys.stdout.write("".join(lines))
+            pbar.update(len(batch))
+
+    if f_in is not sys.stdin:
+        f_in.close()
+
+    if opts.counts:
+        print(" * Writing counts for {} hashes to {}".format(len(hash_to_count), opts.counts), file=sys.stderr)
+        f_counts = gzip.open(opts.counts, "wt") if opts.counts.endswith(".gz") else open(opts.counts, "w")
+        with f_counts:
+            for id_hash, count in hash_to_count.items():
+                print(id_hash, count, sep="\t", file=f_counts)
+
 if __name__ == "__main__":
     main()
-    
-                
-
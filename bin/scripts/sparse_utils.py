@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+__version__ = "2026.10.18"
+
+# Shared sparse helpers for merge_generalized_mapping.py, merge_contig_mapping.py, and compile_protein_cluster_prevalence_table.py
+
+def read_counts_to_coo(filepaths:list, sample_ids:list, read_function, remove_empty_features:bool=False, keep_zeros:bool=False):
+    """
+    Stream per-sample counts into COO arrays (rows=samples, columns=features).  
+    Feature identifiers are integer-encoded once and reused when consecutive files share the same features.
+    Features are in input order if all files share the same features, otherwise sorted (as with pd.DataFrame(dict_of_series)).
+    Returns (rows, columns, data, features)
+    """
+    features = pd.Index([], dtype=object)
+    previous_index = None
+    previous_codes = None
+    same_features = True
+    rows = list()
+    columns = list()
+    data = list()
+    for i, (fp, id_sample) in enumerate(tqdm(zip(filepaths, sample_ids), "Reading processed featureCounts outputs", total=len(filepaths))):
+        counts = read_function(fp)
+        if remove_empty_features:
+            counts = counts[counts > 0]
+        index = counts.index
+        if (previous_index is not None) and index.equals(previous_index):
+            codes = previous_codes
+        else:
+            if previous_index is not None:
+                same_features = False
+            codes = features.get_indexer(index)
+            missing = codes == -1
+            if np.any(missing):
+                codes[missing] = np.arange(len(features), len(features) + missing.sum())
+                features = features.append(index[missing])
+            previous_index = index
+            previous_codes = codes
+
+        values = counts.values.astype(float)
+        if keep_zeros:
+            mask = ~np.isnan(values)
+        else:
+            mask = (values != 0) & ~np.isnan(values)
+        rows.append(np.full(mask.sum(), i, dtype=np.int64))
+        columns.append(codes[mask])
+        data.append(values[mask])
+
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    columns = np.concatenate(columns) if columns else np.zeros(0, dtype=np.int64)
+    data = np.concatenate(data) if data else np.zeros(0, dtype=float)
+
+    if not same_features:
+        try:
+            order = np.argsort(features.values, kind="stable")
+        except TypeError:
+            order = np.arange(len(features))
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(len(order))
+        features = features[order]
+        columns = ranks[columns]
+    return rows, columns, data, features
+
+def iter_dense_chunks(rows:np.ndarray, columns:np.ndarray, data:np.ndarray, index:pd.Index, features:pd.Index, fill_value=0, chunksize:int=100):
+    """
+    Yield dense pd.DataFrame chunks of `chunksize` rows so the full dense table is never held in memory.  Assumes rows are sorted.
+    The dtype is the smallest that holds both data and fill_value (e.g., bool data with fill_value=False stays bool, NaN fill_value is float)
+    """
+    dtype = np.result_type(data.dtype, np.asarray(fill_value).dtype)
+    indptr = np.searchsorted(rows, np.arange(len(index) + 1))
+    for start in range(0, len(index), chunksize):
+        end = min(start + chunksize, len(index))
+        A = np.full((end - start, len(features)), fill_value, dtype=dtype)
+        A[rows[indptr[start]:indptr[end]] - start, columns[indptr[start]:indptr[end]]] = data[indptr[start]:indptr[end]]
+        yield pd.DataFrame(A, index=index[start:end], columns=features)
+
+def write_sparse_npz(filepath, rows:np.ndarray, columns:np.ndarray, data:np.ndarray, index:pd.Index, features:pd.Index):
+    """
+    COO arrays in the layout of `scipy.sparse.save_npz` (readable with `scipy.sparse.load_npz`) 
+    with additional `index` and `columns` arrays for the row and column labels
+    """
+    np.savez_compressed(
+        filepath, 
+        format=np.array("coo".encode("ascii")), 
+        shape=np.array([len(index), len(features)]), 
+        row=rows, 
+        col=columns, 
+        data=data, 
+        index=np.asarray(index, dtype=str), 
+        columns=np.asarray(features, dtype=str),
+        )